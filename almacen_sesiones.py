@@ -0,0 +1,498 @@
+"""
+Almacén del estado de las sesiones: estado del diálogo, contexto, datos de contacto e historial.
+
+- AlmacenSQLite: tablas sesiones e historial_conversacion de la base local (por defecto).
+- AlmacenRedis: servidor clave-valor compartido (Redis o compatible, como Render Key Value) para correr
+  varias instancias detrás del balanceador. Requiere el paquete redis (pip install redis).
+
+Cada sesión lleva un número de versión que aumenta con cada escritura. actualizar recibe la versión que
+se leyó y falla con ConflictoVersion si otro worker o instancia escribió antes (concurrencia optimista):
+nadie bloquea la sesión mientras se arma la respuesta.
+
+Los documentos siguen en SQLite y en el disco de la instancia que los recibió.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class ConflictoVersion(Exception):
+    """Otro proceso actualizó la sesión después de leerla"""
+
+    def __init__(self, session_id: str, esperada: int, actual: Optional[int] = None):
+        super().__init__(f"La sesión {session_id} cambió (versión leída {esperada}, actual {actual})")
+        self.session_id = session_id
+        self.esperada = esperada
+        self.actual = actual
+
+
+class AlmacenSesiones(ABC):
+    """Interfaz de los almacenes de sesiones; un backend incompleto falla al instanciarse"""
+
+    backend = ""
+
+    @abstractmethod
+    def crear(self, session_id: str) -> int:
+        """Crea la sesión en estado inicio; retorna su versión"""
+
+    @abstractmethod
+    def obtener(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """estado, datos_contexto, nombre_usuario, telefono_usuario y version; None si no existe"""
+
+    @abstractmethod
+    def actualizar(self, session_id: str, estado: str, datos_contexto: Dict[str, Any],
+                   version: Optional[int] = None) -> Optional[int]:
+        """Guarda el estado si la versión sigue siendo la leída (sin versión no se comprueba).
+
+        Retorna la nueva versión, o None si la sesión no existe.
+        """
+
+    @abstractmethod
+    def actualizar_contacto(self, session_id: str, nombre: Optional[str],
+                            telefono: Optional[str]) -> Tuple[Dict[str, Optional[str]], Optional[int]]:
+        """Completa los datos de contacto sin borrar los que no se envían; retorna los anteriores y la nueva versión"""
+
+    @abstractmethod
+    def agregar_historial(self, filas: List[tuple]):
+        """Agrega filas (id, sesion_id, mensaje_usuario, respuesta_bot, timestamp) al historial"""
+
+    @abstractmethod
+    def historial(self, session_id: str) -> List[Dict[str, Any]]:
+        """Mensajes de la sesión en orden cronológico"""
+
+    @abstractmethod
+    def eliminar(self, session_id: str):
+        """Elimina la sesión y su historial"""
+
+    @abstractmethod
+    def estadisticas(self) -> Dict[str, int]:
+        """total_sesiones, total_mensajes y sesiones_activas_24h"""
+
+    def comprobar(self) -> Dict[str, Any]:
+        """Comprobación de disponibilidad para /health/listo"""
+        return {"ok": True, "backend": self.backend}
+
+
+class AlmacenSQLite(AlmacenSesiones):
+    """Sesiones en la base SQLite local; conectar permite reutilizar la conexión de un lote"""
+
+    backend = "sqlite"
+
+    def __init__(self, db_path: str = None, conectar: Callable[[], sqlite3.Connection] = None):
+        self.db_path = db_path or Config.get_database_path()
+        self.conectar = conectar or (lambda: sqlite3.connect(self.db_path))
+
+    def crear(self, session_id: str) -> int:
+        conn = self.conectar()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            INSERT INTO sesiones (id, estado, datos_contexto, fecha_creacion, fecha_actualizacion, version)
+            VALUES (?, ?, ?, ?, ?, 1)
+        ''', (session_id, "inicio", json.dumps({}), datetime.now(), datetime.now()))
+
+        conn.commit()
+        conn.close()
+        return 1
+
+    def obtener(self, session_id: str) -> Optional[Dict[str, Any]]:
+        conn = self.conectar()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT estado, datos_contexto, nombre_usuario, telefono_usuario, version FROM sesiones WHERE id = ?
+        ''', (session_id,))
+        result = cursor.fetchone()
+        conn.close()
+
+        if not result:
+            return None
+        return {
+            "estado": result[0],
+            "datos_contexto": json.loads(result[1]) if result[1] else {},
+            "nombre_usuario": result[2],
+            "telefono_usuario": result[3],
+            "version": result[4],
+        }
+
+    def actualizar(self, session_id: str, estado: str, datos_contexto: Dict[str, Any],
+                   version: Optional[int] = None) -> Optional[int]:
+        conn = self.conectar()
+        cursor = conn.cursor()
+
+        try:
+            # La comparación de la versión y la escritura son una sola sentencia: no hay ventana entre ambas
+            cursor.execute('''
+                UPDATE sesiones
+                SET estado = ?, datos_contexto = ?, fecha_actualizacion = ?, version = version + 1
+                WHERE id = ? AND (? IS NULL OR version = ?)
+            ''', (estado, json.dumps(datos_contexto), datetime.now(), session_id, version, version))
+            actualizadas = cursor.rowcount
+            cursor.execute('SELECT version FROM sesiones WHERE id = ?', (session_id,))
+            fila = cursor.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+
+        if actualizadas == 0:
+            if fila is not None:
+                raise ConflictoVersion(session_id, version, fila[0])
+            return None
+        return fila[0]
+
+    def actualizar_contacto(self, session_id: str, nombre: Optional[str],
+                            telefono: Optional[str]) -> Tuple[Dict[str, Optional[str]], Optional[int]]:
+        conn = self.conectar()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('SELECT nombre_usuario, telefono_usuario FROM sesiones WHERE id = ?', (session_id,))
+            result = cursor.fetchone()
+            anteriores = {"nombre_usuario": result[0] if result else None,
+                          "telefono_usuario": result[1] if result else None}
+
+            # Actualizar solo los campos que se proporcionan
+            cursor.execute('''
+                UPDATE sesiones
+                SET nombre_usuario = ?, telefono_usuario = ?, version = version + 1
+                WHERE id = ?
+            ''', (nombre or anteriores["nombre_usuario"], telefono or anteriores["telefono_usuario"], session_id))
+            cursor.execute('SELECT version FROM sesiones WHERE id = ?', (session_id,))
+            fila = cursor.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+
+        return anteriores, fila[0] if fila else None
+
+    def agregar_historial(self, filas: List[tuple]):
+        conn = self.conectar()
+        cursor = conn.cursor()
+
+        cursor.executemany('''
+            INSERT INTO historial_conversacion (id, sesion_id, mensaje_usuario, respuesta_bot, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', filas)
+
+        conn.commit()
+        conn.close()
+
+    def historial(self, session_id: str) -> List[Dict[str, Any]]:
+        conn = self.conectar()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT mensaje_usuario, respuesta_bot, timestamp
+            FROM historial_conversacion
+            WHERE sesion_id = ?
+            ORDER BY timestamp ASC
+        ''', (session_id,))
+        filas = cursor.fetchall()
+        conn.close()
+
+        return [{'mensaje_usuario': fila[0], 'respuesta_bot': fila[1], 'timestamp': fila[2]} for fila in filas]
+
+    def eliminar(self, session_id: str):
+        conn = self.conectar()
+        cursor = conn.cursor()
+
+        cursor.execute('DELETE FROM historial_conversacion WHERE sesion_id = ?', (session_id,))
+        cursor.execute('DELETE FROM sesiones WHERE id = ?', (session_id,))
+
+        conn.commit()
+        conn.close()
+
+    def estadisticas(self) -> Dict[str, int]:
+        conn = self.conectar()
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT COUNT(*) FROM sesiones')
+        total_sesiones = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM historial_conversacion')
+        total_mensajes = cursor.fetchone()[0]
+        # Sesiones activas (últimas 24 horas)
+        cursor.execute('''
+            SELECT COUNT(*) FROM sesiones
+            WHERE fecha_actualizacion > datetime('now', '-1 day')
+        ''')
+        sesiones_activas = cursor.fetchone()[0]
+        conn.close()
+
+        return {"total_sesiones": total_sesiones, "total_mensajes": total_mensajes,
+                "sesiones_activas_24h": sesiones_activas}
+
+
+class AlmacenRedis(AlmacenSesiones):
+    """Sesiones en un servidor compatible con Redis, compartido por todos los workers e instancias.
+
+    - <prefijo>sesion:<id>: hash con estado, datos_contexto (JSON), datos de contacto, version y fechas
+    - <prefijo>historial:<id>: lista de mensajes en JSON, en orden de llegada
+    - <prefijo>actividad: conjunto ordenado por fecha de la última escritura (sesiones activas)
+    - <prefijo>total_sesiones y <prefijo>total_mensajes: contadores para /estadisticas
+
+    Las claves de cada sesión vencen SESION_KV_TTL_SEGUNDOS después de su última escritura. Las escrituras
+    condicionadas usan WATCH/MULTI/EXEC: si la clave cambia entre la lectura y EXEC, la transacción no se
+    aplica.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str = None, prefijo: str = None, cliente=None):
+        if cliente is None:
+            if redis is None:
+                raise RuntimeError("SESION_BACKEND=redis requiere el paquete redis (pip install redis)")
+            cliente = redis.Redis.from_url(url or Config.SESION_KV_URL, decode_responses=True,
+                                           socket_timeout=Config.SESION_KV_TIMEOUT_SEGUNDOS,
+                                           socket_connect_timeout=Config.SESION_KV_TIMEOUT_SEGUNDOS)
+        self.cliente = cliente
+        self.prefijo = prefijo if prefijo is not None else Config.SESION_KV_PREFIJO
+        self.ttl = Config.SESION_KV_TTL_SEGUNDOS
+
+    def clave_sesion(self, session_id: str) -> str:
+        return f"{self.prefijo}sesion:{session_id}"
+
+    def clave_historial(self, session_id: str) -> str:
+        return f"{self.prefijo}historial:{session_id}"
+
+    def marcar_actividad(self, pipe, session_id: str):
+        """Renueva el vencimiento de las claves de la sesión y su fecha de actividad"""
+        pipe.expire(self.clave_sesion(session_id), self.ttl)
+        pipe.expire(self.clave_historial(session_id), self.ttl)
+        pipe.zadd(f"{self.prefijo}actividad", {session_id: time.time()})
+
+    def crear(self, session_id: str) -> int:
+        ahora = datetime.now().isoformat()
+        with self.cliente.pipeline() as pipe:
+            pipe.hset(self.clave_sesion(session_id), mapping={
+                "estado": "inicio", "datos_contexto": json.dumps({}), "version": 1,
+                "fecha_creacion": ahora, "fecha_actualizacion": ahora,
+            })
+            pipe.incr(f"{self.prefijo}total_sesiones")
+            self.marcar_actividad(pipe, session_id)
+            pipe.execute()
+        return 1
+
+    def obtener(self, session_id: str) -> Optional[Dict[str, Any]]:
+        datos = self.cliente.hgetall(self.clave_sesion(session_id))
+        if not datos:
+            return None
+        return {
+            "estado": datos.get("estado"),
+            "datos_contexto": json.loads(datos["datos_contexto"]) if datos.get("datos_contexto") else {},
+            "nombre_usuario": datos.get("nombre_usuario") or None,
+            "telefono_usuario": datos.get("telefono_usuario") or None,
+            "version": int(datos.get("version", 0)),
+        }
+
+    def actualizar(self, session_id: str, estado: str, datos_contexto: Dict[str, Any],
+                   version: Optional[int] = None) -> Optional[int]:
+        clave = self.clave_sesion(session_id)
+        with self.cliente.pipeline() as pipe:
+            pipe.watch(clave)
+            actual = pipe.hget(clave, "version")
+            if actual is None:
+                return None
+            if version is not None and int(actual) != version:
+                raise ConflictoVersion(session_id, version, int(actual))
+
+            nueva = int(actual) + 1
+            pipe.multi()
+            pipe.hset(clave, mapping={"estado": estado, "datos_contexto": json.dumps(datos_contexto),
+                                      "version": nueva, "fecha_actualizacion": datetime.now().isoformat()})
+            self.marcar_actividad(pipe, session_id)
+            try:
+                pipe.execute()
+            except redis.WatchError:
+                # Otra escritura llegó entre la lectura de la versión y EXEC
+                raise ConflictoVersion(session_id, int(actual))
+        return nueva
+
+    def actualizar_contacto(self, session_id: str, nombre: Optional[str],
+                            telefono: Optional[str]) -> Tuple[Dict[str, Optional[str]], Optional[int]]:
+        clave = self.clave_sesion(session_id)
+        # Los datos de contacto se combinan campo a campo: ante otra escritura se vuelve a leer y combinar
+        for _ in range(Config.SESION_REINTENTOS_CONFLICTO + 1):
+            with self.cliente.pipeline() as pipe:
+                pipe.watch(clave)
+                nombre_actual, telefono_actual, actual = pipe.hmget(
+                    clave, ["nombre_usuario", "telefono_usuario", "version"])
+                anteriores = {"nombre_usuario": nombre_actual or None, "telefono_usuario": telefono_actual or None}
+                if actual is None:
+                    return anteriores, None
+
+                nueva = int(actual) + 1
+                pipe.multi()
+                pipe.hset(clave, mapping={"nombre_usuario": nombre or nombre_actual or "",
+                                          "telefono_usuario": telefono or telefono_actual or "",
+                                          "version": nueva})
+                self.marcar_actividad(pipe, session_id)
+                try:
+                    pipe.execute()
+                    return anteriores, nueva
+                except redis.WatchError:
+                    continue
+        raise ConflictoVersion(session_id, int(actual))
+
+    def agregar_historial(self, filas: List[tuple]):
+        with self.cliente.pipeline() as pipe:
+            for doc_id, session_id, mensaje_usuario, respuesta_bot, fecha in filas:
+                pipe.rpush(self.clave_historial(session_id), json.dumps({
+                    "id": doc_id, "mensaje_usuario": mensaje_usuario, "respuesta_bot": respuesta_bot,
+                    "timestamp": fecha.isoformat() if isinstance(fecha, datetime) else fecha,
+                }, ensure_ascii=False))
+            for session_id in {fila[1] for fila in filas}:
+                self.marcar_actividad(pipe, session_id)
+            pipe.incrby(f"{self.prefijo}total_mensajes", len(filas))
+            pipe.execute()
+
+    def historial(self, session_id: str) -> List[Dict[str, Any]]:
+        historial = []
+        for valor in self.cliente.lrange(self.clave_historial(session_id), 0, -1):
+            fila = json.loads(valor)
+            historial.append({"mensaje_usuario": fila["mensaje_usuario"], "respuesta_bot": fila["respuesta_bot"],
+                              "timestamp": fila["timestamp"]})
+        return historial
+
+    def eliminar(self, session_id: str):
+        with self.cliente.pipeline() as pipe:
+            pipe.delete(self.clave_sesion(session_id))
+            pipe.llen(self.clave_historial(session_id))
+            pipe.delete(self.clave_historial(session_id))
+            pipe.zrem(f"{self.prefijo}actividad", session_id)
+            sesiones, mensajes, _, _ = pipe.execute()
+        if sesiones:
+            self.cliente.decr(f"{self.prefijo}total_sesiones")
+        if mensajes:
+            self.cliente.decrby(f"{self.prefijo}total_mensajes", mensajes)
+
+    def estadisticas(self) -> Dict[str, int]:
+        ahora = time.time()
+        actividad = f"{self.prefijo}actividad"
+        with self.cliente.pipeline() as pipe:
+            # Las sesiones vencidas salen del conjunto de actividad
+            pipe.zremrangebyscore(actividad, "-inf", ahora - self.ttl)
+            pipe.zcount(actividad, ahora - 24 * 3600, "+inf")
+            pipe.get(f"{self.prefijo}total_sesiones")
+            pipe.get(f"{self.prefijo}total_mensajes")
+            _, activas, sesiones, mensajes = pipe.execute()
+        return {"total_sesiones": int(sesiones or 0), "total_mensajes": int(mensajes or 0),
+                "sesiones_activas_24h": int(activas)}
+
+    def comprobar(self) -> Dict[str, Any]:
+        inicio = time.perf_counter()
+        self.cliente.ping()
+        return {"ok": True, "backend": self.backend, "latencia_ms": round((time.perf_counter() - inicio) * 1000, 2)}
+
+
+def crear_almacen_sesiones(backend: str = None, db_path: str = None,
+                           conectar: Callable[[], sqlite3.Connection] = None) -> AlmacenSesiones:
+    """Crea el almacén configurado en SESION_BACKEND"""
+    backend = backend or Config.SESION_BACKEND
+    if backend == "redis":
+        return AlmacenRedis()
+    if backend == "sqlite":
+        return AlmacenSQLite(db_path, conectar)
+    raise ValueError(f"SESION_BACKEND desconocido: {backend}")
+
+
+def verificar_almacen(almacen: AlmacenSesiones) -> List[str]:
+    """Comprueba el contrato del almacén (versiones, conflictos, contacto e historial); retorna las fallas"""
+    fallas = []
+
+    def comprobar(condicion: bool, descripcion: str):
+        if not condicion:
+            fallas.append(descripcion)
+
+    session_id = str(uuid.uuid4())
+    comprobar(almacen.obtener(session_id) is None, "una sesión inexistente debe retornar None")
+    comprobar(almacen.actualizar(session_id, "inicio", {}, 1) is None, "actualizar una sesión inexistente no la crea")
+
+    version = almacen.crear(session_id)
+    sesion = almacen.obtener(session_id)
+    comprobar(sesion is not None and sesion["estado"] == "inicio" and sesion["version"] == version,
+              "la sesión nueva empieza en inicio con su versión")
+
+    nueva = almacen.actualizar(session_id, "requisitos_grado", {"grado": "1er grado"}, version)
+    comprobar(nueva == version + 1, "cada escritura aumenta la versión")
+    try:
+        almacen.actualizar(session_id, "inicio", {}, version)
+        fallas.append("escribir con una versión vieja debe fallar con ConflictoVersion")
+    except ConflictoVersion as e:
+        comprobar(e.actual == nueva, "el conflicto informa la versión actual")
+    sesion = almacen.obtener(session_id)
+    comprobar(sesion["estado"] == "requisitos_grado" and sesion["datos_contexto"] == {"grado": "1er grado"},
+              "una escritura en conflicto no modifica la sesión")
+
+    anteriores, con_contacto = almacen.actualizar_contacto(session_id, "Ana Quispe", None)
+    comprobar(anteriores == {"nombre_usuario": None, "telefono_usuario": None}, "contacto anterior vacío")
+    anteriores, con_contacto = almacen.actualizar_contacto(session_id, None, "987654321")
+    sesion = almacen.obtener(session_id)
+    comprobar(anteriores["nombre_usuario"] == "Ana Quispe" and sesion["telefono_usuario"] == "987654321"
+              and sesion["nombre_usuario"] == "Ana Quispe", "el contacto se completa sin borrar lo anterior")
+    comprobar(con_contacto == sesion["version"] and con_contacto > nueva, "el contacto también aumenta la versión")
+
+    almacen.agregar_historial([(str(uuid.uuid4()), session_id, f"mensaje {i}", f"respuesta {i}", datetime.now())
+                               for i in range(3)])
+    historial = almacen.historial(session_id)
+    comprobar([h["mensaje_usuario"] for h in historial] == ["mensaje 0", "mensaje 1", "mensaje 2"],
+              "el historial conserva el orden")
+
+    estadisticas = almacen.estadisticas()
+    comprobar(estadisticas["total_sesiones"] >= 1 and estadisticas["sesiones_activas_24h"] >= 1,
+              "las estadísticas cuentan la sesión")
+
+    almacen.eliminar(session_id)
+    comprobar(almacen.obtener(session_id) is None and almacen.historial(session_id) == [],
+              "eliminar borra la sesión y su historial")
+    return fallas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica el contrato de un almacén de sesiones")
+    parser.add_argument("--backend", choices=["sqlite", "redis"], default=None,
+                        help="Por defecto SESION_BACKEND; con redis y sin --url se usa el servidor local de prueba")
+    parser.add_argument("--url", default=None, help="URL del servidor clave-valor (redis://...)")
+    args = parser.parse_args()
+
+    backend = args.backend or Config.SESION_BACKEND
+    servidor = None
+    carpeta = tempfile.mkdtemp(prefix="almacen-sesiones-")
+    if backend == "redis":
+        if args.url is None:
+            from servidor_kv_local import ServidorKVLocal
+            servidor = ServidorKVLocal().iniciar()
+            args.url = servidor.url
+        almacen = AlmacenRedis(args.url, prefijo=f"verificacion:{uuid.uuid4().hex[:8]}:")
+    else:
+        # Base temporal: la verificación no deja sesiones de prueba en la base real
+        from migraciones import aplicar_migraciones
+        db_path = os.path.join(carpeta, "verificacion.sqlite")
+        aplicar_migraciones(db_path)
+        almacen = AlmacenSQLite(db_path)
+
+    try:
+        fallas = verificar_almacen(almacen)
+    finally:
+        if servidor is not None:
+            servidor.detener()
+        shutil.rmtree(carpeta, ignore_errors=True)
+    for falla in fallas:
+        print(f"❌ {falla}")
+    print(f"{'✅' if not fallas else '❌'} Almacén {backend}: {len(fallas)} fallas")
+    raise SystemExit(1 if fallas else 0)
@@ -0,0 +1,389 @@
+import base64
+import binascii
+import hashlib
+import os
+import sqlite3
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from werkzeug.formparser import parse_form_data
+
+from config import Config
+
+
+class ArchivoRechazado(Exception):
+    """Archivo rechazado durante la recepción (tipo no permitido, tamaño o cantidad excedidos)"""
+
+    def __init__(self, mensaje: str, codigo_http: int = 400):
+        super().__init__(mensaje)
+        self.codigo_http = codigo_http
+
+
+def normalizar_nombre_archivo(nombre_archivo: str) -> str:
+    """Quita directorios del nombre y agrega una extensión a los archivos sin ella (fotos móviles)"""
+    nombre_archivo = os.path.basename(nombre_archivo.replace('\\', '/')) or "archivo"
+    if '.' not in nombre_archivo:
+        extension = Config.get_file_extension(nombre_archivo)
+        nombre_archivo = f"{nombre_archivo}.{extension}"
+    return nombre_archivo
+
+
+def ruta_temporal() -> str:
+    """Obtiene una ruta temporal en la carpeta de uploads, creando la carpeta si no existe"""
+    upload_folder = Config.get_upload_folder()
+    os.makedirs(upload_folder, exist_ok=True)
+    return f"{upload_folder}/.tmp-{uuid.uuid4()}"
+
+
+def ruta_blob(sha256: str) -> str:
+    """Obtiene la ruta del blob repartida en subcarpetas por prefijo del hash (documentos/ab/cd/abcd...)"""
+    prefijos = [sha256[2 * nivel:2 * nivel + 2] for nivel in range(Config.NIVELES_SUBCARPETAS)]
+    return "/".join([Config.get_upload_folder(), *prefijos, sha256])
+
+
+# Los documentos archivados se referencian como "<archivo.zip>#<sha256>"
+SEPARADOR_ARCHIVO = "#"
+
+
+def es_ruta_archivada(ruta: str) -> bool:
+    """Indica si la ruta apunta a un documento dentro de un archivo .zip"""
+    return bool(ruta) and SEPARADOR_ARCHIVO in ruta
+
+
+def existe_documento(ruta: str) -> bool:
+    """Verifica que el documento (o el archivo .zip que lo contiene) exista en disco"""
+    if es_ruta_archivada(ruta):
+        ruta = ruta.split(SEPARADOR_ARCHIVO, 1)[0]
+    return bool(ruta) and os.path.exists(ruta)
+
+
+def leer_documento(ruta: str) -> bytes:
+    """Lee el contenido de un documento, esté suelto o dentro de un archivo .zip"""
+    if es_ruta_archivada(ruta):
+        ruta_zip, nombre = ruta.split(SEPARADOR_ARCHIVO, 1)
+        with zipfile.ZipFile(ruta_zip) as archivo_zip:
+            return archivo_zip.read(nombre)
+    with open(ruta, "rb") as f:
+        return f.read()
+
+
+def calcular_sha256(ruta: str) -> str:
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques"""
+    hash_archivo = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(64 * 1024), b""):
+            hash_archivo.update(bloque)
+    return hash_archivo.hexdigest()
+
+
+# Marcas HEIF/HEIC que aparecen en la caja "ftyp" (bytes 8 a 12)
+MARCAS_HEIF = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}
+
+
+def detectar_tipo_real(cabecera: bytes) -> Optional[str]:
+    """Detecta el tipo real del archivo por sus primeros bytes, sin confiar en el nombre"""
+    if cabecera.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if cabecera.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if cabecera[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if cabecera.startswith(b"BM"):
+        return "bmp"
+    if cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WEBP":
+        return "webp"
+    if cabecera[4:8] == b"ftyp" and cabecera[8:12] in MARCAS_HEIF:
+        return "heic"
+    if cabecera.startswith(b"%PDF-"):
+        return "pdf"
+    return None
+
+
+def leer_cabecera(ruta: str, tamano: int = 16) -> bytes:
+    """Lee los primeros bytes de un documento para detectar su tipo"""
+    if es_ruta_archivada(ruta):
+        return leer_documento(ruta)[:tamano]
+    with open(ruta, "rb") as f:
+        return f.read(tamano)
+
+
+class ArchivoDestino:
+    """Archivo temporal que se escribe por bloques controlando el tamaño máximo y calculando su SHA-256"""
+
+    def __init__(self, ruta: str = None, max_bytes: int = None):
+        self.ruta = ruta or ruta_temporal()
+        self.max_bytes = max_bytes or Config.MAX_FILE_SIZE
+        self.tamano = 0
+        self.hash = hashlib.sha256()
+        self.archivo = open(self.ruta, "wb+")
+
+    @property
+    def sha256(self) -> str:
+        return self.hash.hexdigest()
+
+    def write(self, datos: bytes) -> int:
+        self.tamano += len(datos)
+        if self.tamano > self.max_bytes:
+            raise ArchivoRechazado(f"Archivo demasiado grande. Máximo {self.max_bytes / (1024*1024)}MB", 413)
+        self.hash.update(datos)
+        return self.archivo.write(datos)
+
+    def seek(self, *args) -> int:
+        return self.archivo.seek(*args)
+
+    def read(self, *args) -> bytes:
+        return self.archivo.read(*args)
+
+    def flush(self):
+        self.archivo.flush()
+
+    def close(self):
+        self.archivo.close()
+
+    def descartar(self):
+        """Cierra y elimina el archivo parcialmente escrito"""
+        self.archivo.close()
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+
+def recibir_archivos_multipart(environ: Dict[str, Any], tipo_por_defecto: str = "documento") -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+    """Recibe un formulario multipart escribiendo cada archivo directamente en disco por bloques"""
+    destinos: List[ArchivoDestino] = []
+    archivos: List[Dict[str, Any]] = []
+
+    def crear_destino(total_content_length=None, content_type=None, filename=None, content_length=None):
+        if len(destinos) >= Config.MAX_ARCHIVOS_POR_PETICION:
+            raise ArchivoRechazado(f"Demasiados archivos. Máximo {Config.MAX_ARCHIVOS_POR_PETICION} por envío")
+
+        # El tipo se valida antes de escribir el primer byte
+        nombre = normalizar_nombre_archivo(filename or "archivo")
+        if not Config.is_allowed_file(nombre):
+            raise ArchivoRechazado(f"Tipo de archivo no permitido: {nombre}")
+
+        destino = ArchivoDestino()
+        destinos.append(destino)
+        archivos.append({"id": str(uuid.uuid4()), "nombre": nombre, "ruta_temporal": destino.ruta})
+        return destino
+
+    try:
+        _, form, _ = parse_form_data(
+            environ,
+            stream_factory=crear_destino,
+            max_content_length=Config.MAX_BYTES_POR_PETICION,
+        )
+    except Exception:
+        for destino in destinos:
+            destino.descartar()
+        raise
+
+    for destino in destinos:
+        destino.close()
+
+    # Los campos "tipo" se asocian a los archivos en el mismo orden en que se enviaron
+    tipos = form.getlist("tipo")
+
+    # Archivos vacíos (campo de archivo sin seleccionar) no cuentan como documentos
+    recibidos = []
+    for indice, (archivo, destino) in enumerate(zip(archivos, destinos)):
+        if destino.tamano == 0:
+            destino.descartar()
+            continue
+        archivo["tipo"] = tipos[indice] if indice < len(tipos) else tipo_por_defecto
+        archivo["tamano"] = destino.tamano
+        archivo["sha256"] = destino.sha256
+        recibidos.append(archivo)
+
+    return form.to_dict(), recibidos
+
+
+# Pool acotado para escribir en paralelo los documentos de un mismo envío
+pool_escritura = ThreadPoolExecutor(max_workers=Config.MAX_HILOS_ESCRITURA, thread_name_prefix="escritura-documentos")
+
+
+def escribir_archivo(ruta: str, contenido: bytes) -> str:
+    """Escribe el contenido completo de un documento en disco y retorna su SHA-256"""
+    with open(ruta, "wb") as f:
+        f.write(contenido)
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def escribir_archivos(documentos: List[Dict[str, Any]]):
+    """Escribe varios documentos en sus rutas temporales en paralelo; si alguno falla se propaga el primer error"""
+    if len(documentos) == 1:
+        documentos[0]["sha256"] = escribir_archivo(documentos[0]["ruta_temporal"], documentos[0]["contenido"])
+        return
+
+    futuros = [pool_escritura.submit(escribir_archivo, documento["ruta_temporal"], documento["contenido"])
+               for documento in documentos]
+    # Esperar a todas las escrituras antes de reportar errores para poder limpiar
+    errores = [futuro.exception() for futuro in futuros]
+    for error in errores:
+        if error is not None:
+            raise error
+    for documento, futuro in zip(documentos, futuros):
+        documento["sha256"] = futuro.result()
+
+
+def descartar_archivos(archivos: List[Dict[str, Any]]):
+    """Elimina del disco los archivos temporales que no llegaron a registrarse"""
+    for archivo in archivos:
+        if archivo.get("ruta_temporal") and os.path.exists(archivo["ruta_temporal"]):
+            os.remove(archivo["ruta_temporal"])
+
+
+def registrar_blobs(cursor: sqlite3.Cursor, documentos: List[Dict[str, Any]]):
+    """Suma una referencia al blob de cada documento y decide su ruta definitiva.
+
+    Debe llamarse dentro de una transacción con el lock de escritura tomado (BEGIN IMMEDIATE),
+    así la creación de blobs no compite con su liberación en otra petición. No toca el disco:
+    después del commit guardar_blobs mueve los archivos; si la transacción falla, descartar_archivos
+    elimina los temporales.
+    """
+    nuevos = set()
+    for documento in documentos:
+        sha256 = documento["sha256"]
+        cursor.execute('''
+            INSERT INTO blobs (sha256, ruta_archivo, tamano, referencias, fecha_creacion)
+            VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT(sha256) DO UPDATE SET referencias = referencias + 1
+        ''', (sha256, ruta_blob(sha256), documento["tamano"], datetime.now()))
+        # El blob existente puede estar en otra ubicación (carpeta plana sin migrar o archivo .zip)
+        cursor.execute('SELECT ruta_archivo FROM blobs WHERE sha256 = ?', (sha256,))
+        ruta = cursor.fetchone()[0]
+
+        # Un contenido repetido en el mismo envío se guarda una sola vez
+        documento["nuevo"] = sha256 not in nuevos and not existe_documento(ruta)
+        if documento["nuevo"]:
+            nuevos.add(sha256)
+            if ruta != ruta_blob(sha256):
+                ruta = ruta_blob(sha256)
+                cursor.execute('UPDATE blobs SET ruta_archivo = ? WHERE sha256 = ?', (ruta, sha256))
+        documento["ruta"] = ruta
+
+
+def guardar_blobs(documentos: List[Dict[str, Any]]):
+    """Después del commit de registrar_blobs: mueve los temporales de los blobs nuevos a su ruta"""
+    for documento in documentos:
+        temporal = documento.get("ruta_temporal")
+        if not documento.get("nuevo"):
+            # Un contenido repetido no se vuelve a escribir: se descarta la copia temporal
+            if temporal and os.path.exists(temporal):
+                os.remove(temporal)
+            continue
+        os.makedirs(os.path.dirname(documento["ruta"]), exist_ok=True)
+        if temporal:
+            os.replace(temporal, documento["ruta"])
+        else:
+            # El blob se liberó después de comprobar que existía: se escribe ahora
+            escribir_archivo(documento["ruta"], documento["contenido"])
+
+
+def liberar_blobs(cursor: sqlite3.Cursor, hashes: Iterable[str]) -> List[str]:
+    """Resta una referencia a cada blob y borra las filas de los que quedan sin referencias.
+
+    Igual que registrar_blobs, debe llamarse con el lock de escritura tomado. Retorna las rutas a
+    eliminar con eliminar_archivos después del commit, así un rollback no deja filas sin archivo.
+    """
+    rutas = []
+    for sha256 in hashes:
+        cursor.execute('UPDATE blobs SET referencias = referencias - 1 WHERE sha256 = ?', (sha256,))
+        cursor.execute('''
+            SELECT ruta_archivo, ruta_revision, ruta_miniatura FROM blobs
+            WHERE sha256 = ? AND referencias <= 0
+        ''', (sha256,))
+        fila = cursor.fetchone()
+        if fila:
+            cursor.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+            # Los documentos archivados permanecen en su .zip; las variantes se eliminan con el original
+            rutas.extend(ruta for ruta in fila if ruta and not es_ruta_archivada(ruta))
+    return rutas
+
+
+def eliminar_archivos(rutas: Iterable[str]):
+    """Elimina del disco los archivos de blobs liberados, después del commit"""
+    for ruta in rutas:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+
+def verificar_blob(sha256: str, ruta: str = None) -> bool:
+    """Verifica que el contenido del blob en disco coincida con su SHA-256"""
+    ruta = ruta or ruta_blob(sha256)
+    if not existe_documento(ruta):
+        return False
+    if es_ruta_archivada(ruta):
+        return hashlib.sha256(leer_documento(ruta)).hexdigest() == sha256
+    return calcular_sha256(ruta) == sha256
+
+
+def tamano_base64(contenido: str) -> int:
+    """Calcula el tamaño decodificado a partir de la longitud del texto base64 (cota superior)"""
+    relleno = 2 if contenido.endswith('==') else 1 if contenido.endswith('=') else 0
+    return max(0, (len(contenido) * 3) // 4 - relleno)
+
+
+def validar_archivos_base64(archivos: List[Dict[str, Any]]):
+    """Valida cantidad, tipos y tamaños de archivos en base64 antes de decodificarlos"""
+    if len(archivos) > Config.MAX_ARCHIVOS_POR_PETICION:
+        raise ArchivoRechazado(f"Demasiados archivos. Máximo {Config.MAX_ARCHIVOS_POR_PETICION} por envío")
+
+    total = 0
+    for archivo in archivos:
+        contenido = archivo.get('contenido') or ''
+        if not isinstance(contenido, str):
+            raise ArchivoRechazado("Error procesando archivo: el contenido debe estar en base64")
+
+        nombre = normalizar_nombre_archivo(archivo.get('nombre') or 'archivo')
+        if not Config.is_allowed_file(nombre):
+            raise ArchivoRechazado(f"Tipo de archivo no permitido: {nombre}")
+
+        tamano = tamano_base64(contenido)
+        if tamano > Config.MAX_FILE_SIZE:
+            raise ArchivoRechazado(f"Archivo demasiado grande. Máximo {Config.MAX_FILE_SIZE / (1024*1024)}MB", 413)
+        total += tamano
+
+    if total > Config.MAX_BYTES_POR_PETICION:
+        raise ArchivoRechazado(f"El envío es demasiado grande. Máximo {Config.MAX_BYTES_POR_PETICION / (1024*1024)}MB en total", 413)
+
+
+def escribir_base64(contenido: str, destino: ArchivoDestino, bloque: int = None):
+    """Decodifica el base64 por bloques escribiendo directamente en el archivo de destino"""
+    bloque = bloque or Config.TAMANO_BLOQUE_BASE64
+    pendiente = ''
+    for inicio in range(0, len(contenido), bloque):
+        # Se ignoran los saltos de línea y se decodifican solo grupos completos de 4 caracteres
+        fragmento = pendiente + ''.join(contenido[inicio:inicio + bloque].split())
+        corte = len(fragmento) - len(fragmento) % 4
+        if corte:
+            destino.write(base64.b64decode(fragmento[:corte]))
+        pendiente = fragmento[corte:]
+    if pendiente:
+        destino.write(base64.b64decode(pendiente))
+
+
+def guardar_archivo_base64(archivo: Dict[str, Any]) -> Dict[str, Any]:
+    """Guarda en disco un archivo recibido en base64 sin decodificarlo completo en memoria"""
+    nombre = normalizar_nombre_archivo(archivo.get('nombre') or 'archivo')
+    destino = ArchivoDestino()
+    try:
+        escribir_base64(archivo.get('contenido') or '', destino)
+    except (binascii.Error, ValueError) as e:
+        destino.descartar()
+        raise ArchivoRechazado(f"Error procesando archivo: {str(e)}")
+    except Exception:
+        destino.descartar()
+        raise
+    destino.close()
+
+    return {
+        "id": str(uuid.uuid4()),
+        "tipo": archivo.get('tipo', 'documento'),
+        "nombre": nombre,
+        "ruta_temporal": destino.ruta,
+        "tamano": destino.tamano,
+        "sha256": destino.sha256
+    }
@@ -1,24 +1,75 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import base64
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 import json
-import traceback
+import threading
+import time
 from datetime import datetime
 from chatbot_inteligente import chatbot
-from chatbot_matricula import cargar_datos_varios_csv, buscar_por_codigo, ARCHIVOS_GRADOS
+from almacen_sesiones import ConflictoVersion
+from padron_alumnos import padron_alumnos
 from config import Config
+from cache_respuestas import cache_respuestas
+from cache_http import registrar_cache_http, calcular_etag
+from metricas import registrar_metricas_http, registro_metricas
+from bitacora import obtener_bitacora
+from limite_peticiones import registrar_limites
+from lotes_conversacion import procesar_lote, LoteInvalido
+from eventos_sesion import canal_eventos
+from normalizacion_imagenes import cargar_pillow
+from salud import sondas_salud
+from idempotencia import cache_idempotencia, calcular_clave
+from revision_documentos import revisor_documentos
+from almacenamiento_documentos import (
+    ArchivoRechazado, recibir_archivos_multipart, descartar_archivos,
+    validar_archivos_base64, guardar_archivo_base64, liberar_blobs, eliminar_archivos
+)
 
 app = Flask(__name__)
 CORS(app, origins=Config.CORS_ORIGINS)
+registrar_cache_http(app)
+registrar_metricas_http(app)
+registrar_limites(app)
+bitacora = obtener_bitacora("api")
 
-# Cargar datos de alumnos existentes
-try:
-    alumnos = cargar_datos_varios_csv(ARCHIVOS_GRADOS)
-    print(f"✅ Datos de alumnos cargados: {len(alumnos)} registros")
-except Exception as e:
-    print(f"❌ Error cargando datos de alumnos: {e}")
-    alumnos = []
+
+def cargar_padron():
+    """Carga los datos de alumnos existentes"""
+    inicio = time.perf_counter()
+    try:
+        padron_alumnos.asegurar_cargado()
+        bitacora.info("alumnos_cargados", f"✅ Datos de alumnos cargados: {len(padron_alumnos)} registros",
+                      registros=len(padron_alumnos), version=padron_alumnos.version,
+                      duracion_ms=round((time.perf_counter() - inicio) * 1000, 1))
+    except Exception as e:
+        bitacora.exception("error_cargando_alumnos", f"❌ Error cargando datos de alumnos: {e}")
+
+
+def calentar():
+    """Carga lo que la primera respuesta no necesita: el padrón, el clasificador (numpy) y Pillow"""
+    cargar_padron()
+    # Con gunicorn --preload quedan cargados en el maestro y compartidos por los workers
+    chatbot.clasificador  # El primer acceso importa numpy y lee el modelo
+    cargar_pillow()
+
+
+if Config.ARRANQUE_RAPIDO:
+    # La aplicación atiende mientras tanto; una verificación de matrícula que llegue antes espera la carga
+    threading.Thread(target=calentar, name="calentamiento", daemon=True).start()
+else:
+    calentar()
+
+
+def respuesta_json_memorizada(clave, constructor):
+    """Retorna una respuesta JSON cuyo cuerpo y ETag se calculan una sola vez por versión de configuración"""
+    def construir():
+        cuerpo = jsonify(constructor()).get_data()
+        return cuerpo, calcular_etag(cuerpo)
+    cuerpo, etag = cache_respuestas.obtener(("http", clave), construir)
+    respuesta = app.response_class(cuerpo, mimetype=app.json.mimetype)
+    respuesta.set_etag(etag, weak=True)
+    return respuesta
 
 @app.route('/chatbot-inteligente', methods=['POST'])
 def chatbot_inteligente():
@@ -32,7 +83,8 @@ def chatbot_inteligente():
         session_id = data.get('session_id')
         archivos = data.get('archivos', [])
         
-        print(f"📨 Mensaje recibido: '{mensaje}' | Session ID: {session_id}")
+        bitacora.info("mensaje_recibido", "📨 Mensaje recibido",
+                      mensaje_usuario=mensaje, session_id=session_id, archivos=len(archivos or []))
         
         if not mensaje and not archivos:
             return jsonify({'error': 'Se requiere un mensaje o archivos'}), 400
@@ -41,36 +93,121 @@ def chatbot_inteligente():
         if mensaje and len(mensaje) > Config.MAX_MESSAGE_LENGTH:
             return jsonify({'error': f'El mensaje es demasiado largo. Máximo {Config.MAX_MESSAGE_LENGTH} caracteres'}), 400
         
-        # Procesar archivos si se enviaron
-        archivos_procesados = []
+        # Rechazar archivos no permitidos o demasiado grandes antes de decodificarlos
         if archivos:
-            for archivo in archivos:
-                try:
-                    # Decodificar el contenido base64
-                    contenido = base64.b64decode(archivo.get('contenido', ''))
-                    archivos_procesados.append({
-                        'tipo': archivo.get('tipo', 'documento'),
-                        'nombre': archivo.get('nombre', 'archivo'),
-                        'contenido': contenido
-                    })
-                except Exception as e:
-                    return jsonify({'error': f'Error procesando archivo: {str(e)}'}), 400
-        
-        # Procesar mensaje con el chatbot inteligente
-        print(f"🤖 Procesando mensaje con chatbot...")
-        respuesta = chatbot.procesar_mensaje(
-            mensaje=mensaje,
-            session_id=session_id,
-            archivos=archivos_procesados if archivos_procesados else None
+            if not isinstance(archivos, list):
+                return jsonify({'error': 'El campo archivos debe ser una lista'}), 400
+            try:
+                validar_archivos_base64(archivos)
+            except ArchivoRechazado as e:
+                return jsonify(chatbot.respuesta_archivo_rechazado(session_id, str(e)))
+        
+        def procesar():
+            # Decodificar los archivos por bloques directamente en la carpeta de uploads
+            archivos_procesados = []
+            try:
+                for archivo in archivos or []:
+                    archivos_procesados.append(guardar_archivo_base64(archivo))
+                
+                # Procesar mensaje con el chatbot inteligente
+                bitacora.debug("procesando_mensaje", "🤖 Procesando mensaje con chatbot...", session_id=session_id)
+                return chatbot.procesar_mensaje(
+                    mensaje=mensaje,
+                    session_id=session_id,
+                    archivos=archivos_procesados if archivos_procesados else None
+                )
+            except Exception:
+                descartar_archivos(archivos_procesados)
+                raise
+        
+        # Los reintentos del cliente reciben la respuesta original sin volver a ejecutar el flujo
+        clave = calcular_clave(
+            session_id,
+            request.headers.get('Idempotency-Key') or data.get('idempotency_key'),
+            request.get_data(),
+            lambda: chatbot.almacen.obtener(session_id)
         )
+        try:
+            if clave:
+                respuesta, repetida = cache_idempotencia.ejecutar(clave, procesar)
+            else:
+                respuesta, repetida = procesar(), False
+        except ArchivoRechazado as e:
+            return jsonify({'error': str(e)}), e.codigo_http
+        except ConflictoVersion:
+            # Otra petición de la misma sesión sigue escribiendo después de los reintentos
+            return jsonify({'error': 'La sesión se está actualizando desde otra petición, intenta nuevamente'}), 409
+        
+        if repetida:
+            bitacora.info("reintento_idempotente", "🔁 Reintento detectado, se devuelve la respuesta original",
+                          session_id=session_id)
+        else:
+            bitacora.info("respuesta_generada", "✅ Respuesta generada",
+                          session_id=respuesta.get('session_id', session_id),
+                          extracto=respuesta.get('mensaje', '')[:50])
+        resultado = jsonify(respuesta)
+        if repetida:
+            resultado.headers['Idempotent-Replayed'] = 'true'
+        return resultado
+        
+    except Exception as e:
+        bitacora.exception("error_chatbot", f"❌ Error en chatbot-inteligente: {str(e)}")
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+@app.route('/chatbot-lote', methods=['POST'])
+def chatbot_lote():
+    """Procesa un lote de conversaciones (mensajes en orden por sesión) con el mismo flujo del chatbot"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'Se requiere un JSON válido'}), 400
+        
+        try:
+            resultados = procesar_lote(data.get('conversaciones'), chatbot=chatbot)
+        except LoteInvalido as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'resultados': resultados,
+            'errores': sum(1 for resultado in resultados if 'error' in resultado)
+        })
+        
+    except Exception as e:
+        bitacora.exception("error_chatbot_lote", f"❌ Error en chatbot-lote: {str(e)}")
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+@app.route('/subir-documentos', methods=['POST'])
+def subir_documentos():
+    """Recibe documentos como multipart/form-data escribiéndolos en disco por bloques"""
+    try:
+        if request.mimetype != 'multipart/form-data':
+            return jsonify({'error': 'Se requiere un formulario multipart/form-data'}), 400
+        
+        try:
+            campos, archivos = recibir_archivos_multipart(request.environ)
+        except ArchivoRechazado as e:
+            return jsonify({'error': str(e)}), e.codigo_http
+        except RequestEntityTooLarge:
+            return jsonify({'error': f'El envío es demasiado grande. Máximo {Config.MAX_BYTES_POR_PETICION / (1024*1024)}MB en total'}), 413
+        
+        if not archivos:
+            return jsonify({'error': 'Se requiere al menos un archivo'}), 400
+        
+        session_id = campos.get('session_id') or None
+        bitacora.info("archivos_recibidos", "📤 Archivos recibidos por streaming",
+                      archivos=len(archivos), bytes=sum(archivo['tamano'] for archivo in archivos),
+                      session_id=session_id)
+        
+        try:
+            respuesta = chatbot.procesar_mensaje(mensaje='', session_id=session_id, archivos=archivos)
+        except Exception:
+            descartar_archivos(archivos)
+            raise
         
-        print(f"✅ Respuesta generada: {respuesta.get('mensaje', '')[:50]}...")
         return jsonify(respuesta)
         
     except Exception as e:
-        print(f"❌ Error en chatbot-inteligente: {str(e)}")
-        print(f"📋 Traceback completo:")
-        traceback.print_exc()
+        bitacora.exception("error_subir_documentos", f"❌ Error en subir-documentos: {str(e)}")
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
 @app.route('/verificar-matricula', methods=['POST'])
@@ -87,7 +224,7 @@ def verificar_matricula():
             return jsonify({'error': 'Se requiere el código SIAGE'}), 400
         
         # Buscar alumno usando el sistema existente
-        alumno = buscar_por_codigo(alumnos, codigo)
+        alumno = padron_alumnos.buscar_por_codigo(codigo)
         
         if not alumno:
             return jsonify({
@@ -150,7 +287,7 @@ def obtener_documentos(session_id):
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT id, tipo_documento, nombre_archivo, estado, fecha_subida
+            SELECT id, tipo_documento, nombre_archivo, estado, fecha_subida, motivo_rechazo
             FROM documentos 
             WHERE sesion_id = ?
             ORDER BY fecha_subida DESC
@@ -163,7 +300,8 @@ def obtener_documentos(session_id):
                 'tipo': row[1],
                 'nombre': row[2],
                 'estado': row[3],
-                'fecha_subida': row[4]
+                'fecha_subida': row[4],
+                'motivo_rechazo': row[5]
             })
         
         conn.close()
@@ -176,6 +314,39 @@ def obtener_documentos(session_id):
     except Exception as e:
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
+@app.route('/eventos/<session_id>', methods=['GET'])
+def eventos_sesion(session_id):
+    """Eventos de la sesión: Server-Sent Events con Accept: text/event-stream, si no long-poll JSON"""
+    try:
+        try:
+            desde = int(request.headers.get('Last-Event-ID') or request.args.get('desde') or 0)
+        except ValueError:
+            return jsonify({'error': 'El id del último evento debe ser un número'}), 400
+        
+        # Con workers síncronos (un hilo por proceso) esperar bloquearía el servidor: se responde sin esperar
+        puede_esperar = (request.environ.get('wsgi.multithread', False)
+                         and canal_eventos.conexiones() < Config.EVENTOS_MAX_CONEXIONES)
+        
+        if 'text/event-stream' in request.headers.get('Accept', ''):
+            flujo = canal_eventos.transmitir(session_id, desde, None if puede_esperar else 0)
+            return Response(flujo, mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+        try:
+            espera = min(float(request.args.get('espera', Config.EVENTOS_ESPERA_SEGUNDOS)), Config.EVENTOS_ESPERA_SEGUNDOS)
+        except ValueError:
+            return jsonify({'error': 'El parámetro espera debe ser un número'}), 400
+        eventos = canal_eventos.esperar(session_id, desde, max(0.0, espera) if puede_esperar else 0)
+        
+        return jsonify({
+            'session_id': session_id,
+            'eventos': eventos,
+            'ultimo_id': eventos[-1]['id'] if eventos else desde
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
 @app.route('/sesion/<session_id>', methods=['GET'])
 def obtener_sesion(session_id):
     """Obtiene información de una sesión específica"""
@@ -196,26 +367,7 @@ def obtener_historial(session_id):
         if not session_id:
             return jsonify({'error': 'Se requiere el session_id'}), 400
         
-        import sqlite3
-        conn = sqlite3.connect(chatbot.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT mensaje_usuario, respuesta_bot, timestamp
-            FROM historial_conversacion 
-            WHERE sesion_id = ?
-            ORDER BY timestamp ASC
-        ''', (session_id,))
-        
-        historial = []
-        for row in cursor.fetchall():
-            historial.append({
-                'mensaje_usuario': row[0],
-                'respuesta_bot': row[1],
-                'timestamp': row[2]
-            })
-        
-        conn.close()
+        historial = chatbot.almacen.historial(session_id)
         
         return jsonify({
             'historial': historial,
@@ -234,11 +386,15 @@ def obtener_requisitos(grado):
         
         requisitos = chatbot.obtener_requisitos_grado(grado)
         if requisitos:
-            return jsonify({
+            datos = lambda: {
                 'grado': grado,
                 'requisitos': requisitos,
                 'mensaje': f'Requisitos para {grado}: {requisitos}'
-            })
+            }
+            # Solo se memorizan los grados configurados para no crecer con URLs arbitrarias
+            if grado in Config.REQUISITOS_GRADO:
+                return respuesta_json_memorizada(('requisitos', grado), datos)
+            return jsonify(datos())
         else:
             return jsonify({'error': f'No se encontraron requisitos para {grado}'}), 404
             
@@ -263,11 +419,13 @@ def crear_nueva_sesion():
 def obtener_costos():
     """Obtiene los costos de matrícula"""
     try:
-        costos = Config.get_costos()
-        return jsonify({
-            'costos': costos,
-            'mensaje': f'Costos de matrícula: Matrícula S/ {costos["matricula"]}, Pensión mensual S/ {costos["pension_mensual"]}'
-        })
+        def datos():
+            costos = Config.get_costos()
+            return {
+                'costos': costos,
+                'mensaje': f'Costos de matrícula: Matrícula S/ {costos["matricula"]}, Pensión mensual S/ {costos["pension_mensual"]}'
+            }
+        return respuesta_json_memorizada('costos', datos)
         
     except Exception as e:
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
@@ -276,11 +434,13 @@ def obtener_costos():
 def obtener_grados():
     """Obtiene los grados disponibles"""
     try:
-        grados = Config.get_grados()
-        return jsonify({
-            'grados': grados,
-            'total': len(grados)
-        })
+        def datos():
+            grados = Config.get_grados()
+            return {
+                'grados': grados,
+                'total': len(grados)
+            }
+        return respuesta_json_memorizada('grados', datos)
         
     except Exception as e:
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
@@ -293,33 +453,21 @@ def obtener_estadisticas():
         conn = sqlite3.connect(chatbot.db_path)
         cursor = conn.cursor()
         
-        # Contar sesiones
-        cursor.execute('SELECT COUNT(*) FROM sesiones')
-        total_sesiones = cursor.fetchone()[0]
-        
         # Contar documentos
         cursor.execute('SELECT COUNT(*) FROM documentos')
         total_documentos = cursor.fetchone()[0]
         
-        # Contar mensajes
-        cursor.execute('SELECT COUNT(*) FROM historial_conversacion')
-        total_mensajes = cursor.fetchone()[0]
-        
-        # Sesiones activas (últimas 24 horas)
-        cursor.execute('''
-            SELECT COUNT(*) FROM sesiones 
-            WHERE fecha_actualizacion > datetime('now', '-1 day')
-        ''')
-        sesiones_activas = cursor.fetchone()[0]
-        
         conn.close()
         
+        # Sesiones, mensajes y sesiones activas (últimas 24 horas) del almacén de sesiones
+        sesiones = chatbot.almacen.estadisticas()
+        
         return jsonify({
-            'total_sesiones': total_sesiones,
+            'total_sesiones': sesiones['total_sesiones'],
             'total_documentos': total_documentos,
-            'total_mensajes': total_mensajes,
-            'sesiones_activas_24h': sesiones_activas,
-            'alumnos_cargados': len(alumnos) if alumnos else 0,
+            'total_mensajes': sesiones['total_mensajes'],
+            'sesiones_activas_24h': sesiones['sesiones_activas_24h'],
+            'alumnos_cargados': len(padron_alumnos.asegurar_cargado()),
             'configuracion': {
                 'max_file_size_mb': Config.MAX_FILE_SIZE / (1024*1024),
                 'max_message_length': Config.MAX_MESSAGE_LENGTH,
@@ -332,26 +480,26 @@ def obtener_estadisticas():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Endpoint de verificación de salud del sistema"""
+    """Vida del proceso: responde sin abrir la base de datos ni tocar el disco"""
+    return jsonify({
+        'status': 'ok',
+        'message': 'Chatbot inteligente funcionando correctamente',
+        'alumnos_cargados': len(padron_alumnos),
+        'padron_cargado': padron_alumnos.cargado,
+        'timestamp': datetime.now().isoformat(),
+        'version': '2.0.0'
+    })
+
+@app.route('/health/listo', methods=['GET'])
+def readiness_check():
+    """Disponibilidad: comprobaciones profundas en caché, renovadas en segundo plano (salud.py)"""
     try:
-        import sqlite3
-        conn = sqlite3.connect(chatbot.db_path)
-        cursor = conn.cursor()
-        
-        # Verificar que las tablas existen
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tablas = [row[0] for row in cursor.fetchall()]
-        
-        conn.close()
-        
+        estado = sondas_salud.estado()
         return jsonify({
-            'status': 'ok',
-            'message': 'Chatbot inteligente funcionando correctamente',
-            'tablas_disponibles': tablas,
-            'alumnos_cargados': len(alumnos) if alumnos else 0,
-            'timestamp': datetime.now().isoformat(),
-            'version': '2.0.0'
-        })
+            'status': 'ok' if estado['listo'] else 'error',
+            **estado,
+            'timestamp': datetime.now().isoformat()
+        }), 200 if estado['listo'] else 503
         
     except Exception as e:
         return jsonify({
@@ -360,6 +508,11 @@ def health_check():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/metrics', methods=['GET'])
+def metricas():
+    """Expone las métricas del proceso en formato de texto de Prometheus"""
+    return Response(registro_metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/limpiar-sesion/<session_id>', methods=['DELETE'])
 def limpiar_sesion(session_id):
     """Limpia una sesión específica"""
@@ -371,17 +524,21 @@ def limpiar_sesion(session_id):
         conn = sqlite3.connect(chatbot.db_path)
         cursor = conn.cursor()
         
+        # Liberar los blobs de los documentos de la sesión (se borran los que quedan sin referencias)
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT blob_sha256 FROM documentos WHERE sesion_id = ? AND blob_sha256 IS NOT NULL', (session_id,))
+        rutas = liberar_blobs(cursor, [fila[0] for fila in cursor.fetchall()])
+        
         # Eliminar documentos de la sesión
         cursor.execute('DELETE FROM documentos WHERE sesion_id = ?', (session_id,))
         
-        # Eliminar historial de la sesión
-        cursor.execute('DELETE FROM historial_conversacion WHERE sesion_id = ?', (session_id,))
-        
-        # Eliminar la sesión
-        cursor.execute('DELETE FROM sesiones WHERE id = ?', (session_id,))
-        
         conn.commit()
         conn.close()
+        # Los archivos se borran solo cuando el commit confirmó que ya no tienen referencias
+        eliminar_archivos(rutas)
+        
+        # Eliminar el historial y la sesión
+        chatbot.almacen.eliminar(session_id)
         
         return jsonify({
             'mensaje': 'Sesión limpiada exitosamente',
@@ -392,6 +549,8 @@ def limpiar_sesion(session_id):
         return jsonify({'error': f'Error interno: {str(e)}'}), 500
 
 if __name__ == '__main__':
+    # Con gunicorn los revisores se inician en cada worker (gunicorn.conf.py), nunca en el maestro
+    revisor_documentos.iniciar()
     server_config = Config.get_server_config()
     app.run(
         host=server_config['host'], 
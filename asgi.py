@@ -0,0 +1,178 @@
+"""
+Variante ASGI de la API: mismas rutas y contratos que api_inteligente (se sirve la misma aplicación Flask).
+
+El cuerpo de la petición se recibe y la respuesta se envía en el event loop, así un cliente móvil lento
+no ocupa un hilo; el trabajo bloqueante (SQLite y disco) se ejecuta en pools de hilos dedicados.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from config import Config
+from api_inteligente import app as aplicacion_flask
+from revision_documentos import revisor_documentos
+
+
+def limite_cuerpo(ruta: str) -> int:
+    """Tamaño máximo del cuerpo que acepta el adaptador; los validadores de Flask aplican los límites exactos"""
+    if ruta.rstrip("/") == "/subir-documentos":
+        # multipart: los archivos llegan sin codificar
+        return Config.MAX_BYTES_POR_PETICION + Config.ASGI_UMBRAL_ARCHIVOS
+    # JSON (/chatbot-inteligente): los archivos en base64 ocupan 4/3 de su tamaño decodificado
+    return Config.MAX_BYTES_POR_PETICION * 4 // 3 + Config.ASGI_HOLGURA_JSON
+
+
+def construir_environ(scope: Dict[str, Any], cuerpo, tamano: int) -> Dict[str, Any]:
+    """Construye el environ WSGI (PEP 3333) a partir del scope ASGI y el cuerpo ya recibido"""
+    servidor = scope.get("server") or ("localhost", 80)
+    cliente = scope.get("client") or ("", 0)
+    ruta = scope.get("raw_path") or scope["path"].encode("utf-8")
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": ruta.split(b"?", 1)[0].decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": servidor[0],
+        "SERVER_PORT": str(servidor[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": cliente[0],
+        "REMOTE_PORT": str(cliente[1]),
+        "CONTENT_LENGTH": str(tamano),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": cuerpo,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for nombre, valor in scope.get("headers", []):
+        clave = nombre.decode("latin-1").upper().replace("-", "_")
+        if clave == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = valor.decode("latin-1")
+            continue
+        if clave == "CONTENT_LENGTH":
+            continue
+        clave = f"HTTP_{clave}"
+        valor = valor.decode("latin-1")
+        environ[clave] = f"{environ[clave]},{valor}" if clave in environ else valor
+    return environ
+
+
+class AplicacionASGI:
+    """Adaptador ASGI de una aplicación WSGI con pools de hilos separados para SQLite y para disco"""
+
+    def __init__(self, aplicacion_wsgi: Callable, hilos_db: int = None, hilos_archivos: int = None):
+        self.aplicacion_wsgi = aplicacion_wsgi
+        self.pool_db = ThreadPoolExecutor(max_workers=hilos_db or Config.ASGI_HILOS_DB,
+                                          thread_name_prefix="asgi-db")
+        self.pool_archivos = ThreadPoolExecutor(max_workers=hilos_archivos or Config.ASGI_HILOS_ARCHIVOS,
+                                                thread_name_prefix="asgi-archivos")
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] == "lifespan":
+            await self.ciclo_de_vida(receive, send)
+        elif scope["type"] == "http":
+            await self.atender(scope, receive, send)
+
+    async def ciclo_de_vida(self, receive: Callable, send: Callable):
+        """Atiende los eventos de inicio y apagado del servidor"""
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                # Cada proceso del servidor revisa los documentos pendientes desde que arranca
+                revisor_documentos.iniciar()
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                self.pool_db.shutdown(wait=False)
+                self.pool_archivos.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def recibir_cuerpo(self, receive: Callable, limite: int) -> Tuple[Any, int]:
+        """Recibe el cuerpo sin bloquear el event loop; los cuerpos grandes pasan a un archivo temporal"""
+        loop = asyncio.get_running_loop()
+        cuerpo = tempfile.SpooledTemporaryFile(max_size=Config.ASGI_CUERPO_EN_MEMORIA)
+        tamano = 0
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "http.disconnect":
+                cuerpo.close()
+                raise ConnectionError("El cliente se desconectó durante el envío")
+            datos = mensaje.get("body", b"")
+            if datos:
+                tamano += len(datos)
+                if tamano > limite:
+                    cuerpo.close()
+                    raise ValueError("El envío es demasiado grande")
+                if tamano > Config.ASGI_CUERPO_EN_MEMORIA:
+                    # Ya está en disco: la escritura se hace fuera del event loop
+                    await loop.run_in_executor(self.pool_archivos, cuerpo.write, datos)
+                else:
+                    cuerpo.write(datos)
+            if not mensaje.get("more_body", False):
+                break
+        cuerpo.seek(0)
+        return cuerpo, tamano
+
+    def ejecutar_wsgi(self, environ: Dict[str, Any], loop: asyncio.AbstractEventLoop, send: Callable):
+        """Ejecuta la aplicación WSGI en un hilo del pool y envía la respuesta por el event loop"""
+        inicio: List[Any] = []
+
+        def start_response(estado: str, encabezados: List[Tuple[str, str]], exc_info=None):
+            inicio[:] = [int(estado.split(" ", 1)[0]), encabezados]
+
+        def enviar(mensaje: Dict[str, Any]):
+            asyncio.run_coroutine_threadsafe(send(mensaje), loop).result()
+
+        iterable = self.aplicacion_wsgi(environ, start_response)
+        try:
+            encabezados_enviados = False
+            for fragmento in iterable:
+                if not encabezados_enviados:
+                    enviar(self.mensaje_inicio(*inicio))
+                    encabezados_enviados = True
+                if fragmento:
+                    enviar({"type": "http.response.body", "body": fragmento, "more_body": True})
+            if not encabezados_enviados:
+                enviar(self.mensaje_inicio(*inicio))
+            enviar({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    @staticmethod
+    def mensaje_inicio(estado: int, encabezados: List[Tuple[str, str]]) -> Dict[str, Any]:
+        return {
+            "type": "http.response.start",
+            "status": estado,
+            "headers": [(nombre.lower().encode("latin-1"), valor.encode("latin-1")) for nombre, valor in encabezados],
+        }
+
+    async def atender(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        """Atiende una petición HTTP"""
+        try:
+            cuerpo, tamano = await self.recibir_cuerpo(receive, limite_cuerpo(scope["path"]))
+        except ConnectionError:
+            return
+        except ValueError as e:
+            await send(self.mensaje_inicio(413, [("Content-Type", "application/json")]))
+            await send({"type": "http.response.body", "body": json.dumps({"error": str(e)}).encode("utf-8")})
+            return
+
+        # Las subidas escriben en disco; el resto solo usa SQLite
+        pool = self.pool_archivos if tamano > Config.ASGI_UMBRAL_ARCHIVOS else self.pool_db
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(pool, self.ejecutar_wsgi, construir_environ(scope, cuerpo, tamano), loop, send)
+        finally:
+            cuerpo.close()
+
+
+app = AplicacionASGI(aplicacion_flask)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark del arranque de gunicorn con y sin preload (gunicorn.conf.py): tiempo hasta la primera
+respuesta, tiempo en reponer workers caídos y memoria por worker (RSS, PSS y páginas privadas)
+después de atender tráfico. Requiere Linux (/proc/<pid>/smaps_rollup).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from benchmark_servidores import RAIZ, preparar_carpeta, puerto_libre
+
+
+def hijos(pid: int) -> list:
+    """Pids de los procesos hijos (los workers del maestro)"""
+    resultado = []
+    for tarea in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{tarea}/children") as archivo:
+                resultado.extend(int(hijo) for hijo in archivo.read().split())
+        except OSError:
+            pass
+    return resultado
+
+
+def memoria(pid: int) -> dict:
+    """RSS, PSS, memoria compartida y privada del proceso en KB"""
+    valores = {}
+    with open(f"/proc/{pid}/smaps_rollup") as archivo:
+        for linea in archivo:
+            partes = linea.split()
+            if len(partes) >= 3 and partes[2] == "kB":
+                valores[partes[0].rstrip(":")] = int(partes[1])
+    return {
+        "rss_kb": valores.get("Rss", 0),
+        "pss_kb": valores.get("Pss", 0),
+        "compartida_kb": valores.get("Shared_Clean", 0) + valores.get("Shared_Dirty", 0),
+        "privada_kb": valores.get("Private_Clean", 0) + valores.get("Private_Dirty", 0),
+    }
+
+
+def esperar_respuesta(puerto: int, limite: float = 60) -> float:
+    """Segundos hasta que el servidor responde /grados"""
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < limite:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{puerto}/grados", timeout=1)
+            return time.perf_counter() - inicio
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+def generar_trafico(puerto: int, peticiones: int):
+    """Peticiones que tocan el padrón, el clasificador y SQLite"""
+    base = f"http://127.0.0.1:{puerto}"
+    for indice in range(peticiones):
+        if indice % 3 == 0:
+            cuerpo, ruta = {"codigo": "00000000"}, "/verificar-matricula"
+        elif indice % 3 == 1:
+            cuerpo, ruta = {"mensaje": "¿cuánto cuesta la pensión?"}, "/chatbot-inteligente"
+        else:
+            cuerpo, ruta = None, "/grados"
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        peticion = urllib.request.Request(base + ruta, data=datos, headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(peticion, timeout=10).read()
+        except OSError:
+            pass
+
+
+def medir(preload: bool, workers: int, peticiones: int) -> dict:
+    carpeta = preparar_carpeta()
+    puerto = puerto_libre()
+    entorno = dict(os.environ, PYTHONPATH=RAIZ, PORT=str(puerto), WEB_CONCURRENCY=str(workers),
+                   GUNICORN_PRELOAD="1" if preload else "0", LIMITES_ACTIVOS="0", LOG_NIVEL="WARNING")
+    comando = [sys.executable, "-m", "gunicorn", "wsgi:app", "--config", os.path.join(RAIZ, "gunicorn.conf.py"),
+               "--bind", f"127.0.0.1:{puerto}", "--log-level", "warning"]
+    proceso = subprocess.Popen(comando, cwd=carpeta, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        primera = esperar_respuesta(puerto)
+        while len(hijos(proceso.pid)) < workers:
+            time.sleep(0.01)
+        # Todos los workers deben haber cargado la aplicación antes de medir memoria
+        generar_trafico(puerto, peticiones)
+        time.sleep(0.5)
+
+        maestro = memoria(proceso.pid)
+        por_worker = [memoria(pid) for pid in hijos(proceso.pid)]
+
+        # Reposición: se matan todos los workers y se mide hasta que el servidor vuelve a responder
+        caidos = set(hijos(proceso.pid))
+        for pid in caidos:
+            os.kill(pid, signal.SIGKILL)
+        while set(hijos(proceso.pid)) & caidos:
+            time.sleep(0.005)
+        reposicion = esperar_respuesta(puerto)
+    finally:
+        proceso.terminate()
+        proceso.wait()
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    def promedio(clave: str) -> float:
+        return sum(m[clave] for m in por_worker) / len(por_worker) / 1024
+
+    return {
+        "preload": preload,
+        "workers": workers,
+        "primera_respuesta_s": primera,
+        "reposicion_workers_s": reposicion,
+        "maestro_rss_mb": maestro["rss_kb"] / 1024,
+        "worker_rss_mb": promedio("rss_kb"),
+        "worker_pss_mb": promedio("pss_kb"),
+        "worker_compartida_mb": promedio("compartida_kb"),
+        "worker_privada_mb": promedio("privada_kb"),
+        "pss_total_mb": (maestro["pss_kb"] + sum(m["pss_kb"] for m in por_worker)) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque y memoria de gunicorn con y sin preload")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--peticiones", type=int, default=300, help="Peticiones de calentamiento antes de medir memoria")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado en JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("❌ Este benchmark requiere Linux (/proc/<pid>/smaps_rollup)")
+
+    resultados = [medir(preload, args.workers, args.peticiones) for preload in (False, True)]
+    if args.json:
+        json.dump(resultados, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"⚙️  {args.workers} workers, {args.peticiones} peticiones de calentamiento")
+    for r in resultados:
+        print(f"{'preload' if r['preload'] else 'sin preload':>12}: primera respuesta {r['primera_respuesta_s']:5.2f} s | "
+              f"reposición {r['reposicion_workers_s']:5.2f} s | worker RSS {r['worker_rss_mb']:6.1f} MB "
+              f"(compartida {r['worker_compartida_mb']:5.1f}, privada {r['worker_privada_mb']:5.1f}) | "
+              f"PSS total {r['pss_total_mb']:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la normalización de imágenes: separa el trabajo en Python (detección de tipo,
+cola y registro) del trabajo de Pillow (decodificar, reducir y recomprimir)
+"""
+
+import argparse
+import json
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from config import Config
+
+
+def generar_imagen(ancho: int, alto: int, formato: str) -> bytes:
+    """Genera una foto sintética con ruido (se comprime como una foto real, no como un color plano)"""
+    ruido = Image.effect_noise((ancho, alto), 48)
+    imagen = Image.merge("RGB", (ruido, ruido.rotate(90, expand=False), ruido.transpose(Image.FLIP_LEFT_RIGHT)))
+    salida = BytesIO()
+    if formato == "JPEG":
+        imagen.save(salida, formato, quality=92)
+    else:
+        imagen.save(salida, formato)
+    return salida.getvalue()
+
+
+def medir(funcion, repeticiones: int) -> list:
+    """Ejecuta la función varias veces y retorna los tiempos en segundos"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def resumen(tiempos: list) -> dict:
+    """Resume una lista de tiempos en milisegundos"""
+    return {
+        "media_ms": statistics.mean(tiempos) * 1000,
+        "mediana_ms": statistics.median(tiempos) * 1000,
+        "ops_por_segundo": len(tiempos) / sum(tiempos) if sum(tiempos) else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la normalización de imágenes")
+    parser.add_argument("--imagenes", type=int, default=12, help="Imágenes sintéticas a procesar")
+    parser.add_argument("--ancho", type=int, default=4032)
+    parser.add_argument("--alto", type=int, default=3024)
+    parser.add_argument("--hilos", type=int, default=Config.NORMALIZACION_HILOS)
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado en JSON")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="benchmark-normalizacion-")
+    Config.actualizar(DATABASE_PATH=f"{carpeta}/chatbot_db.sqlite", UPLOAD_FOLDER=f"{carpeta}/documentos")
+
+    # Se importan después de apuntar la configuración a la carpeta temporal
+    from chatbot_inteligente import chatbot
+    from almacenamiento_documentos import (
+        detectar_tipo_real, leer_cabecera, ruta_temporal, escribir_archivo, registrar_blobs, guardar_blobs
+    )
+    from normalizacion_imagenes import NormalizadorImagenes, generar_variantes, rutas_variantes, escribir_variante
+
+    db_path = chatbot.db_path
+    formatos = ["JPEG", "PNG"]
+    contenidos = [generar_imagen(args.ancho, args.alto, formatos[i % len(formatos)]) for i in range(args.imagenes)]
+
+    # Guardar las imágenes como blobs, igual que una subida
+    documentos = []
+    for contenido in contenidos:
+        documento = {"ruta_temporal": ruta_temporal(), "tamano": len(contenido)}
+        documento["sha256"] = escribir_archivo(documento["ruta_temporal"], contenido)
+        documentos.append(documento)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    registrar_blobs(cursor, documentos)
+    conn.commit()
+    conn.close()
+    guardar_blobs(documentos)
+
+    normalizador = NormalizadorImagenes(db_path=db_path, hilos=args.hilos, max_cola=len(documentos))
+    cabeceras = [leer_cabecera(documento["ruta"]) for documento in documentos]
+
+    # Trabajo solo de Python, por etapa
+    deteccion = medir(lambda: [detectar_tipo_real(cabecera) for cabecera in cabeceras], 2000)
+    lectura = medir(lambda: [leer_cabecera(documento["ruta"]) for documento in documentos], 200)
+    variantes_pillow = []
+    escritura = []
+    registro = []
+    for documento, contenido in zip(documentos, contenidos):
+        inicio = time.perf_counter()
+        revision, miniatura = generar_variantes(contenido)
+        variantes_pillow.append(time.perf_counter() - inicio)
+
+        ruta_revision, ruta_miniatura = rutas_variantes(documento["ruta"])
+        inicio = time.perf_counter()
+        escribir_variante(ruta_revision, revision)
+        escribir_variante(ruta_miniatura, miniatura)
+        escritura.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        normalizador.registrar_variantes(documento["sha256"], {
+            "tipo_real": "jpeg", "ruta_revision": ruta_revision, "ruta_miniatura": ruta_miniatura
+        })
+        registro.append(time.perf_counter() - inicio)
+
+    # Extremo a extremo con el pool: encolar todo y esperar
+    inicio = time.perf_counter()
+    for documento in documentos:
+        normalizador.encolar(documento["sha256"], documento["ruta"])
+    encolado = time.perf_counter() - inicio
+    normalizador.esperar()
+    total_pool = time.perf_counter() - inicio
+
+    por_imagen_python = (statistics.mean(deteccion) / len(cabeceras) + statistics.mean(lectura) / len(documentos)
+                         + statistics.mean(registro))
+    shutil.rmtree(carpeta, ignore_errors=True)
+
+    resultado = {
+        "imagenes": len(documentos),
+        "resolucion": f"{args.ancho}x{args.alto}",
+        "hilos": args.hilos,
+        "python": {
+            "detectar_tipo_us": statistics.mean(deteccion) / len(cabeceras) * 1e6,
+            "leer_cabecera_us": statistics.mean(lectura) / len(documentos) * 1e6,
+            "registrar_variantes": resumen(registro),
+            "encolar_us": encolado / len(documentos) * 1e6,
+            "total_por_imagen_ms": por_imagen_python * 1000,
+        },
+        "pillow": {"generar_variantes": resumen(variantes_pillow)},
+        "escritura_variantes": resumen(escritura),
+        "pool": {
+            "segundos": total_pool,
+            "imagenes_por_segundo": len(documentos) / total_pool if total_pool else 0.0,
+        },
+    }
+
+    if args.json:
+        json.dump(resultado, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"📷 {resultado['imagenes']} imágenes de {resultado['resolucion']} con {args.hilos} hilos")
+    python = resultado["python"]
+    print(f"🐍 Python   detectar tipo: {python['detectar_tipo_us']:.2f} µs | leer cabecera: {python['leer_cabecera_us']:.1f} µs"
+          f" | registrar: {python['registrar_variantes']['media_ms']:.2f} ms | encolar: {python['encolar_us']:.1f} µs")
+    print(f"🐍 Python   total por imagen: {python['total_por_imagen_ms']:.2f} ms")
+    print(f"🖼️  Pillow   generar variantes: {resultado['pillow']['generar_variantes']['media_ms']:.1f} ms por imagen")
+    print(f"💾 Disco    escribir variantes: {resultado['escritura_variantes']['media_ms']:.2f} ms por imagen")
+    print(f"⚙️  Pool     {resultado['pool']['imagenes_por_segundo']:.2f} imágenes/s ({resultado['pool']['segundos']:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Benchmark de las búsquedas en el padrón (chatbot_matricula.py y el índice de padron_alumnos.py) con padrones
+sintéticos de 1k a 200k alumnos: apellidos peruanos frecuentes que se repiten como en un colegio real,
+tildes y eñes, y preguntas escritas como las escriben las familias (sin tildes, en minúsculas, con errores).
+
+Cada padrón se escribe en CSV con el mismo formato que los del colegio y se lee con el cargador real.
+Reporta operaciones por segundo, mediana y memoria: la del padrón cargado y el pico que asigna cada búsqueda.
+"""
+
+import argparse
+import csv
+import gc
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from chatbot_matricula import (
+    ARCHIVOS_GRADOS, cargar_datos_varios_csv, buscar_por_codigo, buscar_por_nombre_parcial,
+    extraer_nombre_de_pregunta, responder_pregunta
+)
+from padron_alumnos import PadronAlumnos
+
+# Apellidos más frecuentes en el Perú, en orden aproximado: con pesos 1/posición unos pocos se repiten mucho
+APELLIDOS = [
+    "QUISPE", "FLORES", "SÁNCHEZ", "RODRÍGUEZ", "GARCÍA", "ROJAS", "MAMANI", "HUAMÁN", "CHÁVEZ", "VÁSQUEZ",
+    "RAMÍREZ", "TORRES", "DÍAZ", "CONDORI", "MENDOZA", "CASTILLO", "ESPINOZA", "GUTIÉRREZ", "LÓPEZ", "PÉREZ",
+    "RAMOS", "CRUZ", "GÓMEZ", "HUAMANÍ", "TAIPE", "CCAHUANA", "YUPANQUI", "HUANCA", "PAREDES", "SALAZAR",
+    "CÁRDENAS", "CHOQUE", "APAZA", "VARGAS", "MORALES", "HERRERA", "JIMÉNEZ", "MEDINA", "AGUILAR", "CAMPOS",
+    "VEGA", "NÚÑEZ", "CASTRO", "ROMERO", "ÁLVAREZ", "PALOMINO", "CÓRDOVA", "SOTO", "ZEGARRA", "MUÑOZ",
+    "LLANOS", "VILLANUEVA", "ALARCÓN", "BERNUY", "JULCA", "CARRILLO", "HUAYANAY", "CÓNDOR", "ORTIZ", "PEÑA",
+]
+NOMBRES = [
+    "José", "María", "Jesús", "Ángel", "Adrián", "Sofía", "Valentina", "Thiago", "Mathías", "Camila",
+    "Luciana", "Nicolás", "Sebastián", "Ximena", "Fabián", "Andrés", "Martín", "Joaquín", "Daniela", "Renata",
+    "Aimee", "Austin", "Leonel", "Tharya", "Alexa", "Dylan", "Liam", "Mía", "Isabella", "Emilia",
+    "Gael", "Santiago", "Rodrigo", "Inés", "Zoé", "Maricielo", "Yeremi", "Ariana", "Kiara", "Noemí",
+]
+COLUMNAS = ["N°", "APELLIDOS Y NOMBRES", "Código modular (SIAGE)", "fecha de registro", "hora de inicio",
+            "hora de fin", "Matrícula pendiente", "Pensiones pendientes"]
+PESOS_APELLIDOS = [1 / posicion for posicion in range(1, len(APELLIDOS) + 1)]
+
+
+def generar_padron(cantidad: int, semilla: int = 1) -> List[Dict[str, str]]:
+    """Filas con las columnas de los CSV del colegio; códigos SIAGE de 14 dígitos únicos"""
+    azar = random.Random(semilla)
+    codigos = azar.sample(range(10 ** 13, 10 ** 14), cantidad)
+    alumnos = []
+    for indice, codigo in enumerate(codigos):
+        paterno, materno = azar.choices(APELLIDOS, PESOS_APELLIDOS, k=2)
+        nombres = " ".join(azar.sample(NOMBRES, azar.choice((1, 2, 2))))
+        alumnos.append({
+            "N°": str(indice + 1),
+            "APELLIDOS Y NOMBRES": f"{paterno} {materno}, {nombres}",
+            "Código modular (SIAGE)": str(codigo),
+            "fecha de registro": "",
+            "hora de inicio": "",
+            "hora de fin": "",
+            "Matrícula pendiente": azar.choice(("Sí", "No")),
+            "Pensiones pendientes": str(azar.choice((0, 0, 0, 1, 2, 3))),
+        })
+    return alumnos
+
+
+def escribir_csv(alumnos: List[Dict[str, str]], carpeta: str) -> List[str]:
+    """Reparte los alumnos en un CSV por grado con los nombres de archivo del colegio"""
+    archivos = [os.path.join(carpeta, nombre) for nombre in ARCHIVOS_GRADOS]
+    por_grado = len(alumnos) // len(archivos) + 1
+    for indice, archivo in enumerate(archivos):
+        with open(archivo, "w", newline="", encoding="utf-8") as salida:
+            escritor = csv.DictWriter(salida, fieldnames=COLUMNAS)
+            escritor.writeheader()
+            escritor.writerows(alumnos[indice * por_grado:(indice + 1) * por_grado])
+    return archivos
+
+
+def sin_tildes(texto: str) -> str:
+    return texto.translate(str.maketrans("ÁÉÍÓÚÜÑáéíóúüñ", "AEIOUUNaeiouun"))
+
+
+def consultas(alumnos: List[Dict[str, str]], semilla: int = 1) -> Dict[str, Any]:
+    """Búsquedas de ejemplo: alumnos al final del padrón (el peor caso de un recorrido lineal) y ausentes"""
+    azar = random.Random(semilla)
+    alumno = alumnos[-1 - azar.randrange(max(1, len(alumnos) // 10))]
+    apellidos, nombres = alumno["APELLIDOS Y NOMBRES"].split(", ")
+    primer_nombre = nombres.split()[0]
+    # Una persona que no está en el padrón pero comparte los apellidos más comunes
+    ausente = f"{APELLIDOS[0].lower()} {APELLIDOS[1].lower()} florencio"
+    return {
+        "codigo": alumno["Código modular (SIAGE)"],
+        "codigo_ausente": "00000000000000",
+        "nombre_completo": sin_tildes(f"{primer_nombre} {apellidos}").lower(),
+        "apellidos_frecuentes": f"{APELLIDOS[0].lower()} {APELLIDOS[1].lower()}",
+        "nombre_con_error": sin_tildes(f"{apellidos} {primer_nombre}").lower()[:-1],
+        "nombre_ausente": ausente,
+        "pregunta_codigo": f"cual es el codigo de {sin_tildes(primer_nombre).lower()} {sin_tildes(apellidos).lower()}",
+        "pregunta_pension": f"¿cuánto debe de pensión {sin_tildes(apellidos).lower()}?",
+        "pregunta_ausente": f"cual es el codigo de {ausente}",
+    }
+
+
+def medir_operacion(funcion: Callable[[], Any], segundos: float = 1.0, max_repeticiones: int = 10000,
+                    min_repeticiones: int = 3) -> Dict[str, Any]:
+    """Repite la operación hasta juntar los segundos indicados; el pico de memoria se mide en una llamada aparte"""
+    inicio = time.perf_counter()
+    funcion()  # Calentamiento: cachés de normalización, compilación de expresiones regulares
+    calentamiento = time.perf_counter() - inicio
+    if calentamiento > segundos:
+        # Con 200k alumnos una búsqueda por nombre tarda segundos: el calentamiento ya es la medición
+        tiempos = [calentamiento]
+    else:
+        tiempos = []
+        limite = time.perf_counter() + segundos
+        while len(tiempos) < max_repeticiones and (len(tiempos) < min_repeticiones or time.perf_counter() < limite):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+
+    # tracemalloc frena mucho las asignaciones: no se mezcla con la medición de tiempo
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "repeticiones": len(tiempos),
+        "mediana_ms": statistics.median(tiempos) * 1000,
+        "media_ms": statistics.mean(tiempos) * 1000,
+        "ops_por_segundo": len(tiempos) / sum(tiempos) if sum(tiempos) else 0.0,
+        "memoria_pico_kb": pico / 1024,
+    }
+
+
+def medir_memoria(funcion: Callable[[], Any]) -> tuple:
+    """Resultado de la función y memoria que sigue ocupando al terminar, en MB"""
+    gc.collect()
+    tracemalloc.start()
+    resultado = funcion()
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, memoria / (1024 * 1024)
+
+
+def medir_carga(archivos: List[str]) -> Dict[str, Any]:
+    """Lectura de los CSV con el cargador real y memoria que ocupa el padrón cargado"""
+    # El tiempo se mide sin tracemalloc y la memoria en una segunda carga
+    inicio = time.perf_counter()
+    cargar_datos_varios_csv(archivos)
+    lectura = time.perf_counter() - inicio
+    alumnos, memoria_lista = medir_memoria(lambda: cargar_datos_varios_csv(archivos))
+
+    inicio = time.perf_counter()
+    PadronAlumnos(archivos).cargar()
+    indice = time.perf_counter() - inicio
+    padron, memoria_padron = medir_memoria(lambda: PadronAlumnos(archivos).cargar())
+
+    return {
+        "alumnos": alumnos,
+        "padron": padron,
+        "resultado": {
+            "lectura_csv_ms": lectura * 1000,
+            "memoria_lista_mb": memoria_lista,
+            "carga_padron_ms": indice * 1000,
+            "memoria_padron_mb": memoria_padron,
+        },
+    }
+
+
+def operaciones(alumnos: List[Dict[str, str]], padron: PadronAlumnos, c: Dict[str, Any]) -> Dict[str, Callable]:
+    """Cada camino de búsqueda con sus argumentos de ejemplo"""
+    return {
+        "buscar_por_codigo": lambda: buscar_por_codigo(alumnos, c["codigo"]),
+        "buscar_por_codigo (ausente)": lambda: buscar_por_codigo(alumnos, c["codigo_ausente"]),
+        "padron.buscar_por_codigo (índice)": lambda: padron.buscar_por_codigo(c["codigo"]),
+        "buscar_por_nombre_parcial": lambda: buscar_por_nombre_parcial(alumnos, c["nombre_completo"]),
+        "buscar_por_nombre_parcial (apellidos frecuentes)": lambda: buscar_por_nombre_parcial(alumnos, c["apellidos_frecuentes"]),
+        "buscar_por_nombre_parcial (con error)": lambda: buscar_por_nombre_parcial(alumnos, c["nombre_con_error"]),
+        "buscar_por_nombre_parcial (ausente)": lambda: buscar_por_nombre_parcial(alumnos, c["nombre_ausente"]),
+        "extraer_nombre_de_pregunta": lambda: extraer_nombre_de_pregunta(c["pregunta_codigo"], alumnos),
+        "responder_pregunta (código)": lambda: responder_pregunta(c["pregunta_codigo"], alumnos),
+        "responder_pregunta (pensión)": lambda: responder_pregunta(c["pregunta_pension"], alumnos),
+        "responder_pregunta (ausente)": lambda: responder_pregunta(c["pregunta_ausente"], alumnos),
+    }
+
+
+def benchmark_tamano(cantidad: int, segundos: float, semilla: int, filtro: str = None) -> Dict[str, Any]:
+    carpeta = tempfile.mkdtemp(prefix="benchmark-padron-")
+    try:
+        generados = generar_padron(cantidad, semilla)
+        archivos = escribir_csv(generados, carpeta)
+        del generados
+        carga = medir_carga(archivos)
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    alumnos = carga["alumnos"]
+    c = consultas(alumnos, semilla)
+    resultados = {}
+    for nombre, funcion in operaciones(alumnos, carga["padron"], c).items():
+        if filtro and filtro not in nombre:
+            continue
+        resultados[nombre] = medir_operacion(funcion, segundos)
+
+    frecuentes = c["apellidos_frecuentes"].upper()
+    return {
+        "alumnos": cantidad,
+        # Cuántos comparten los dos apellidos más frecuentes: el tamaño de la lista de coincidencias
+        "homonimos_apellidos_frecuentes": sum(1 for a in alumnos if sin_tildes(a["APELLIDOS Y NOMBRES"]).startswith(frecuentes)),
+        "carga": carga["resultado"],
+        "operaciones": resultados,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las búsquedas en el padrón con padrones sintéticos")
+    parser.add_argument("--tamanos", default="1000,10000,50000",
+                        help="Alumnos de cada padrón sintético, separados por comas (200000 tarda varios minutos)")
+    parser.add_argument("--segundos", type=float, default=1.0, help="Tiempo de medición por operación")
+    parser.add_argument("--operacion", default=None, help="Solo las operaciones cuyo nombre contiene este texto")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado en JSON")
+    args = parser.parse_args()
+
+    tamanos = [int(t) for t in args.tamanos.split(",")]
+    resultados = []
+    for cantidad in tamanos:
+        resultados.append(benchmark_tamano(cantidad, args.segundos, args.semilla, args.operacion))
+        if not args.json:
+            r = resultados[-1]
+            carga = r["carga"]
+            print(f"\n📚 {cantidad} alumnos ({r['homonimos_apellidos_frecuentes']} con los apellidos más frecuentes) | "
+                  f"CSV {carga['lectura_csv_ms']:.0f} ms, {carga['memoria_lista_mb']:.1f} MB | "
+                  f"padrón {carga['carga_padron_ms']:.0f} ms, {carga['memoria_padron_mb']:.1f} MB")
+            for nombre, m in r["operaciones"].items():
+                print(f"   {nombre:<50} {m['ops_por_segundo']:11.1f} ops/s | mediana {m['mediana_ms']:9.3f} ms | "
+                      f"pico {m['memoria_pico_kb']:9.1f} KB")
+
+    if args.json:
+        json.dump(resultados, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+
+
+if __name__ == "__main__":
+    main()
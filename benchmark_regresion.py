@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Control de regresiones de rendimiento contra una línea base guardada en el repositorio
+(linea_base_rendimiento.json): motor de diálogo (procesar_mensaje en cada estado), búsquedas en el padrón
+y escrituras y lecturas de sesiones en SQLite.
+
+Cada medición se repite en varias rondas y se resume con medianas, que no se mueven por una ronda
+interrumpida. Una carga de calibración en Python puro corrige la diferencia de velocidad entre la máquina
+de la línea base y la actual. Una métrica falla si empeora más que la tolerancia o que tres veces la
+dispersión observada entre rondas, lo que sea mayor; las sospechosas se miden otra vez antes de
+reportarlas, para que un pico aislado de la máquina no haga fallar el control.
+
+Corre sin red, sobre una copia temporal de la base de datos:
+
+    python benchmark_regresion.py               # Compara; sale con código 1 si hay regresiones
+    python benchmark_regresion.py --actualizar  # Guarda la medición como nueva línea base
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmark_servidores import RAIZ, preparar_carpeta
+
+LINEA_BASE = os.path.join(RAIZ, "linea_base_rendimiento.json")
+TAMANO_PADRON = 2000
+
+# Mensaje representativo y contexto de cada estado del diálogo
+MENSAJES_POR_ESTADO = {
+    "inicio": ("hola", {}),
+    "inicio (clasificador)": ("kiero sabr cuanto kuesta la pension", {}),
+    "opciones_matricula": ("requisitos", {}),
+    "requisitos_grado": ("2do grado", {"opcion_seleccionada": "requisitos"}),
+    "subiendo_documentos": ("3er grado", {"opcion_seleccionada": "subir_documentos"}),
+    "verificando_matricula": ("12345678", {"opcion_seleccionada": "verificar"}),
+    "conectando_asesor": ("Mi nombre es Ana Quispe y mi teléfono es 987654321", {"opcion_seleccionada": "asesor"}),
+    "recolectando_datos": ("gracias", {}),
+    "redireccion_presencial": ("costos", {}),
+    "post_matricula": ("calendario", {"grado_seleccionado": "1er grado"}),
+}
+
+
+def calibrar(repeticiones: int = 7) -> float:
+    """Milisegundos de una carga fija en Python puro (diccionarios, cadenas, JSON, regex): velocidad de la máquina"""
+    patron = re.compile(r"[^a-z0-9 ]")
+    datos = [{"nombre": f"ALUMNO {i} ÁÉÍ", "codigo": str(10 ** 13 + i), "grado": i % 4} for i in range(3000)]
+
+    def carga():
+        texto = json.dumps(datos)
+        filas = json.loads(texto)
+        indice = {fila["codigo"]: fila for fila in filas}
+        nombres = sorted(patron.sub("", fila["nombre"].lower()) for fila in indice.values())
+        return sum(len(n) for n in nombres)
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        carga()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos) * 1000
+
+
+def medir_ronda(operacion: Callable[[Any], Any], preparar: Callable[[], Any] = None, segundos: float = 0.2,
+                max_por_ronda: int = 2000) -> List[float]:
+    """Una ronda: segundos por llamada; solo se mide operacion, preparar corre antes fuera del tiempo"""
+    gc.collect()
+    tiempos = []
+    limite = time.perf_counter() + segundos
+    while not tiempos or (len(tiempos) < max_por_ronda and time.perf_counter() < limite):
+        argumento = preparar() if preparar else None
+        inicio = time.perf_counter()
+        operacion(argumento)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def resumir(rondas: List[List[float]], calibraciones: List[float]) -> Dict[str, Any]:
+    """Medianas entre rondas de ops/s y de la latencia de cada ronda.
+
+    Cada ronda se normaliza por la calibración medida justo antes (ops por carga de calibración). Las
+    dispersiones son la desviación absoluta mediana entre rondas, relativa a la mediana.
+    """
+    por_ronda = [len(tiempos) / sum(tiempos) for tiempos in rondas]
+    p95_por_ronda = [sorted(tiempos)[min(len(tiempos) - 1, int(0.95 * len(tiempos)))] for tiempos in rondas]
+    normalizadas = [ops * calibracion / 1000 for ops, calibracion in zip(por_ronda, calibraciones)]
+    muestras = sorted(t for tiempos in rondas for t in tiempos)
+    mediana_normalizada = statistics.median(normalizadas)
+    mediana_p95 = statistics.median(p95_por_ronda)
+    return {
+        "ops_por_segundo": statistics.median(por_ronda),
+        "ops_por_calibracion": mediana_normalizada,
+        "calibracion_ms": statistics.median(calibraciones),
+        "dispersion": statistics.median(abs(n - mediana_normalizada) for n in normalizadas) / mediana_normalizada,
+        "mediana_ms": statistics.median(muestras) * 1000,
+        "p95_ms": mediana_p95 * 1000,
+        "dispersion_p95": statistics.median(abs(p - mediana_p95) for p in p95_por_ronda) / mediana_p95,
+        "muestras": len(muestras),
+    }
+
+
+def benchmarks_dialogo(chatbot) -> Dict[str, Tuple[Callable, Optional[Callable]]]:
+    """procesar_mensaje en cada estado; la sesión vuelve al estado antes de cada llamada"""
+    casos = {}
+    for nombre, (mensaje, contexto) in MENSAJES_POR_ESTADO.items():
+        estado = nombre.split(" ")[0]
+        session_id = chatbot.crear_sesion()
+
+        def preparar(session_id=session_id, estado=estado, contexto=contexto):
+            chatbot.almacen.actualizar(session_id, estado, contexto)
+            return session_id
+
+        casos[f"dialogo/{nombre}"] = (lambda session_id, mensaje=mensaje: chatbot.procesar_mensaje(mensaje, session_id),
+                                      preparar)
+    return casos
+
+
+def benchmarks_sqlite(chatbot) -> Dict[str, Tuple[Callable, Optional[Callable]]]:
+    """Caminos de persistencia de las sesiones y el historial"""
+    session_id = chatbot.crear_sesion()
+    for i in range(20):
+        chatbot.guardar_mensaje_historial(session_id, f"mensaje {i}", f"respuesta {i}")
+    # Las escrituras del historial van a otra sesión: la lectura siempre encuentra los mismos 20 mensajes
+    sesion_escritura = chatbot.crear_sesion()
+    conversacion = ["hola", "matricula", "requisitos", "1er grado", "no, gracias"]
+
+    return {
+        "sqlite/crear_sesion": (lambda _: chatbot.crear_sesion(), None),
+        "sqlite/obtener_estado_sesion": (lambda _: chatbot.obtener_estado_sesion(session_id), None),
+        "sqlite/actualizar_estado_sesion": (lambda _: chatbot.actualizar_estado_sesion(
+            session_id, "opciones_matricula", {"opcion_seleccionada": "matricula"}, concurrencia_optimista=False), None),
+        "sqlite/guardar_mensaje_historial": (lambda _: chatbot.guardar_mensaje_historial(sesion_escritura, "hola",
+                                                                                             "respuesta"), None),
+        "sqlite/historial": (lambda _: chatbot.almacen.historial(session_id), None),
+        "sqlite/estadisticas": (lambda _: chatbot.almacen.estadisticas(), None),
+        "sqlite/procesar_conversacion": (lambda _: chatbot.procesar_conversacion(conversacion), None),
+    }
+
+
+def benchmarks_padron(carpeta: str) -> Dict[str, Tuple[Callable, Optional[Callable]]]:
+    """Búsquedas de benchmark_padron.py sobre un padrón sintético de TAMANO_PADRON alumnos"""
+    from benchmark_padron import generar_padron, escribir_csv, consultas, operaciones
+    from chatbot_matricula import cargar_datos_varios_csv
+    from padron_alumnos import PadronAlumnos
+
+    carpeta_padron = os.path.join(carpeta, "padron")
+    os.makedirs(carpeta_padron)
+    archivos = escribir_csv(generar_padron(TAMANO_PADRON), carpeta_padron)
+    alumnos = cargar_datos_varios_csv(archivos)
+    padron = PadronAlumnos(archivos).cargar()
+    return {f"padron/{nombre}": (lambda _, funcion=funcion: funcion(), None)
+            for nombre, funcion in operaciones(alumnos, padron, consultas(alumnos)).items()}
+
+
+def ejecutar(rondas: int, segundos: float, filtro: str = None,
+             confirmar: Callable[[Dict[str, Any]], List[str]] = None) -> Dict[str, Any]:
+    """Mide todos los benchmarks sobre una copia temporal de la base de datos y los CSV.
+
+    confirmar recibe los resultados y devuelve los benchmarks sospechosos de regresión; esos se miden
+    otra vez con la misma cantidad de rondas y se resumen con todas las rondas juntas.
+    """
+    carpeta = preparar_carpeta()
+    try:
+        # Rutas relativas de Config (base de datos, documentos, CSV) dentro de la carpeta temporal
+        os.chdir(carpeta)
+        from chatbot_inteligente import chatbot
+
+        casos = {}
+        casos.update(benchmarks_dialogo(chatbot))
+        casos.update(benchmarks_sqlite(chatbot))
+        casos.update(benchmarks_padron(carpeta))
+
+        casos = {nombre: caso for nombre, caso in casos.items() if not filtro or filtro in nombre}
+        for operacion, preparar in casos.values():
+            operacion(preparar() if preparar else None)  # Calentamiento
+
+        rondas_por_caso: Dict[str, List[List[float]]] = {nombre: [] for nombre in casos}
+        calibraciones: Dict[str, List[float]] = {nombre: [] for nombre in casos}
+
+        def medir(nombres: List[str]):
+            # Rondas intercaladas y una calibración corta antes de cada ronda de cada benchmark: los cambios
+            # de velocidad de la máquina durante la corrida se reflejan también en la calibración
+            for _ in range(rondas):
+                for nombre in nombres:
+                    operacion, preparar = casos[nombre]
+                    calibraciones[nombre].append(calibrar(1))
+                    rondas_por_caso[nombre].append(medir_ronda(operacion, preparar, segundos))
+
+        medir(list(casos))
+        resultados = {nombre: resumir(rondas_por_caso[nombre], calibraciones[nombre]) for nombre in casos}
+        sospechosos = confirmar(resultados) if confirmar else []
+        if sospechosos:
+            print(f"🔁 Confirmando {len(sospechosos)} posibles regresiones con {rondas} rondas más", file=sys.stderr)
+            medir(sospechosos)
+            resultados.update({nombre: resumir(rondas_por_caso[nombre], calibraciones[nombre])
+                               for nombre in sospechosos})
+        calibracion_ms = statistics.median(c for lista in calibraciones.values() for c in lista)
+    finally:
+        os.chdir(RAIZ)
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "maquina": platform.machine(),
+        "calibracion_ms": calibracion_ms,
+        "parametros": {"rondas": rondas, "segundos": segundos, "tamano_padron": TAMANO_PADRON},
+        "resultados": resultados,
+    }
+
+
+def comparar(base: Dict[str, Any], actual: Dict[str, Any], tolerancia: float, tolerancia_p95: float,
+             filtro: str = None) -> List[Dict[str, Any]]:
+    """Compara cada métrica contra la línea base escalada por la velocidad de la máquina"""
+    filas = []
+    for nombre, medido in actual["resultados"].items():
+        referencia = base["resultados"].get(nombre)
+        if referencia is None:
+            filas.append({"benchmark": nombre, "metrica": "-", "estado": "nuevo"})
+            continue
+
+        # Valores esperados en la velocidad actual de la máquina, según la calibración de cada benchmark
+        factor = medido["calibracion_ms"] / referencia["calibracion_ms"]
+        # Ruido de esta medición o de la línea base: el umbral nunca queda por debajo de 3 veces la dispersión
+        ruido = 3 * max(medido["dispersion"], referencia["dispersion"])
+        ruido_p95 = 3 * max(medido["dispersion_p95"], referencia["dispersion_p95"])
+        for metrica, esperado, valor, limite_relativo, menor_es_mejor in (
+            # Mediana de las rondas normalizadas, expresada en ops/s a la calibración actual
+            ("ops_por_segundo", referencia["ops_por_calibracion"] * 1000 / medido["calibracion_ms"],
+             medido["ops_por_calibracion"] * 1000 / medido["calibracion_ms"], max(tolerancia, ruido), False),
+            ("p95_ms", referencia["p95_ms"] * factor, medido["p95_ms"], max(tolerancia_p95, ruido_p95), True),
+        ):
+            cambio = (valor - esperado) / esperado if esperado else 0.0
+            empeora = cambio if menor_es_mejor else -cambio
+            if empeora > limite_relativo:
+                estado = "regresion"
+            elif -empeora > limite_relativo:
+                estado = "mejora"
+            else:
+                estado = "ok"
+            filas.append({"benchmark": nombre, "metrica": metrica, "esperado": esperado, "actual": valor,
+                          "cambio": cambio, "umbral": limite_relativo, "estado": estado})
+
+    for nombre in base["resultados"]:
+        if nombre not in actual["resultados"] and (not filtro or filtro in nombre):
+            filas.append({"benchmark": nombre, "metrica": "-", "estado": "sin_medir"})
+    return filas
+
+
+def imprimir_diferencias(filas: List[Dict[str, Any]], factor: float):
+    iconos = {"ok": "✅", "mejora": "🚀", "regresion": "❌", "nuevo": "🆕", "sin_medir": "⚠️"}
+    print(f"⚖️  Línea base escalada por la calibración de la máquina (x{factor:.2f})")
+    print(f"   {'benchmark':<58} {'métrica':<16} {'esperado':>11} {'actual':>11} {'cambio':>8} {'umbral':>7}")
+    for fila in filas:
+        if fila["metrica"] == "-":
+            print(f"{iconos[fila['estado']]} {fila['benchmark']:<58} {fila['estado']}")
+            continue
+        print(f"{iconos[fila['estado']]} {fila['benchmark']:<58} {fila['metrica']:<16} {fila['esperado']:11.2f} "
+              f"{fila['actual']:11.2f} {fila['cambio'] * 100:+7.1f}% {fila['umbral'] * 100:6.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Control de regresiones de rendimiento contra la línea base")
+    parser.add_argument("--actualizar", action="store_true", help="Guardar la medición como nueva línea base")
+    parser.add_argument("--linea-base", default=LINEA_BASE)
+    parser.add_argument("--rondas", type=int, default=5)
+    parser.add_argument("--segundos", type=float, default=0.2, help="Duración de cada ronda por benchmark")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Caída de ops/s aceptada (0.25 = 25%%) antes de contar como regresión")
+    parser.add_argument("--tolerancia-p95", type=float, default=0.5, help="Aumento del p95 aceptado")
+    parser.add_argument("--solo", default=None, help="Solo los benchmarks cuyo nombre contiene este texto")
+    parser.add_argument("--json", action="store_true", help="Imprimir la medición y la comparación en JSON")
+    args = parser.parse_args()
+
+    # Antes de importar la aplicación: Config lee el entorno al importarse
+    os.environ["SESION_BACKEND"] = "sqlite"
+    os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+    if args.actualizar:
+        actual = ejecutar(args.rondas, args.segundos, args.solo)
+        with open(args.linea_base, "w", encoding="utf-8") as archivo:
+            json.dump(actual, archivo, indent=2, ensure_ascii=False, sort_keys=True)
+            archivo.write("\n")
+        print(f"💾 Línea base actualizada: {len(actual['resultados'])} benchmarks en {args.linea_base}")
+        return
+
+    if not os.path.exists(args.linea_base):
+        print(f"❌ No existe la línea base {args.linea_base}; créala con --actualizar", file=sys.stderr)
+        sys.exit(1)
+    with open(args.linea_base, encoding="utf-8") as archivo:
+        base = json.load(archivo)
+
+    def confirmar(resultados: Dict[str, Any]) -> List[str]:
+        filas = comparar(base, {"resultados": resultados}, args.tolerancia, args.tolerancia_p95)
+        return sorted({fila["benchmark"] for fila in filas if fila["estado"] == "regresion"})
+
+    actual = ejecutar(args.rondas, args.segundos, args.solo, confirmar)
+    filas = comparar(base, actual, args.tolerancia, args.tolerancia_p95, args.solo)
+    regresiones = [fila for fila in filas if fila["estado"] == "regresion"]
+    if args.json:
+        json.dump({"medicion": actual, "comparacion": filas}, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        imprimir_diferencias(filas, actual["calibracion_ms"] / base["calibracion_ms"])
+        print(f"\n{'❌' if regresiones else '✅'} {len(regresiones)} regresiones en "
+              f"{sum(1 for fila in filas if fila['metrica'] != '-')} métricas")
+    sys.exit(1 if regresiones else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmark de gunicorn (wsgi.py, workers síncronos o gthread con --hilos) contra la variante ASGI (asgi.py)
+con la misma concurrencia: peticiones rápidas mientras hay subidas lentas de clientes móviles en curso
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+ARCHIVOS_DATOS = [
+    "chatbot_db.sqlite",
+    "modelo_intenciones.npz",
+    "lista primaria 1ro y 2do.xlsx - 1er grado.csv",
+    "lista primaria 1ro y 2do.xlsx - 2do grado.csv",
+    "lista primaria 1ro y 2do.xlsx - 3er grado.csv",
+    "lista primaria 1ro y 2do.xlsx - 4to grado.csv",
+]
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def preparar_carpeta() -> str:
+    """Copia la base de datos y los datos a una carpeta temporal para no tocar los del repositorio"""
+    carpeta = tempfile.mkdtemp(prefix="benchmark-servidores-")
+    for nombre in ARCHIVOS_DATOS:
+        if os.path.exists(os.path.join(RAIZ, nombre)):
+            shutil.copy2(os.path.join(RAIZ, nombre), os.path.join(carpeta, nombre))
+    return carpeta
+
+
+def iniciar_servidor(tipo: str, puerto: int, carpeta: str, workers: int, hilos: int) -> subprocess.Popen:
+    """Inicia gunicorn o uvicorn en la carpeta temporal"""
+    if tipo == "gunicorn":
+        comando = [sys.executable, "-m", "gunicorn", "wsgi:app", "--bind", f"127.0.0.1:{puerto}",
+                   "--workers", str(workers), "--threads", str(hilos), "--log-level", "warning"]
+    else:
+        comando = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(puerto),
+                   "--workers", str(workers), "--log-level", "warning"]
+    # Todas las peticiones salen de la misma IP: sin desactivar los límites se medirían respuestas 429
+    entorno = dict(os.environ, PYTHONPATH=RAIZ, LIMITES_ACTIVOS="0")
+    proceso = subprocess.Popen(comando, cwd=carpeta, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    limite = time.time() + 60
+    while time.time() < limite:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{puerto}/grados", timeout=1)
+            return proceso
+        except OSError:
+            time.sleep(0.2)
+    proceso.kill()
+    raise RuntimeError(f"{tipo} no respondió a tiempo")
+
+
+async def peticion(puerto: int, metodo: str, ruta: str, cuerpo: bytes = b"", tipo: str = None,
+                   fragmentos: int = 1, pausa: float = 0.0) -> int:
+    """Envía una petición HTTP/1.1; con varios fragmentos y pausa simula un cliente móvil lento"""
+    lector, escritor = await asyncio.open_connection("127.0.0.1", puerto)
+    encabezados = [f"{metodo} {ruta} HTTP/1.1", f"Host: 127.0.0.1:{puerto}", "Connection: close",
+                   f"Content-Length: {len(cuerpo)}"]
+    if tipo:
+        encabezados.append(f"Content-Type: {tipo}")
+    escritor.write(("\r\n".join(encabezados) + "\r\n\r\n").encode("latin-1"))
+
+    tamano = max(1, len(cuerpo) // fragmentos)
+    for inicio in range(0, len(cuerpo), tamano):
+        escritor.write(cuerpo[inicio:inicio + tamano])
+        await escritor.drain()
+        if pausa:
+            await asyncio.sleep(pausa)
+
+    respuesta = await lector.read()
+    escritor.close()
+    return int(respuesta.split(b" ", 2)[1])
+
+
+def cuerpo_multipart(tamano: int) -> tuple:
+    """Arma un formulario multipart con un archivo de prueba"""
+    limite = uuid.uuid4().hex
+    cuerpo = (f"--{limite}\r\nContent-Disposition: form-data; name=\"tipo\"\r\n\r\ndni\r\n"
+              f"--{limite}\r\nContent-Disposition: form-data; name=\"archivos\"; filename=\"foto.jpg\"\r\n"
+              f"Content-Type: image/jpeg\r\n\r\n").encode() + os.urandom(tamano) + f"\r\n--{limite}--\r\n".encode()
+    return cuerpo, f"multipart/form-data; boundary={limite}"
+
+
+async def medir(puerto: int, concurrencia: int, peticiones: int, lentas: int, segundos_lentas: float,
+                kb_subida: int) -> dict:
+    """Lanza subidas lentas y, en paralelo, peticiones rápidas con la concurrencia indicada"""
+    mensaje = json.dumps({"mensaje": "hola"}).encode()
+    subida, tipo_subida = cuerpo_multipart(kb_subida * 1024)
+    fragmentos = 20
+
+    async def subida_lenta():
+        inicio = time.perf_counter()
+        estado = await peticion(puerto, "POST", "/subir-documentos", subida, tipo_subida,
+                                fragmentos=fragmentos, pausa=segundos_lentas / fragmentos)
+        return estado, time.perf_counter() - inicio
+
+    latencias = []
+    errores = 0
+    pendientes = iter(range(peticiones))
+
+    async def cliente():
+        nonlocal errores
+        for indice in pendientes:
+            inicio = time.perf_counter()
+            try:
+                if indice % 2:
+                    estado = await peticion(puerto, "GET", "/grados")
+                else:
+                    estado = await peticion(puerto, "POST", "/chatbot-inteligente", mensaje, "application/json")
+            except OSError:
+                estado = 0
+            latencias.append(time.perf_counter() - inicio)
+            if estado != 200:
+                errores += 1
+
+    tareas_lentas = [asyncio.ensure_future(subida_lenta()) for _ in range(lentas)]
+    await asyncio.sleep(0.05)
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+    resultados_lentas = await asyncio.gather(*tareas_lentas)
+
+    latencias.sort()
+    percentil = lambda p: latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000
+    return {
+        "peticiones_por_segundo": len(latencias) / duracion,
+        "p50_ms": percentil(0.50),
+        "p95_ms": percentil(0.95),
+        "p99_ms": percentil(0.99),
+        "errores": errores,
+        "subidas_lentas": {
+            "total": lentas,
+            "correctas": sum(1 for estado, _ in resultados_lentas if estado == 200),
+            "media_s": statistics.mean(duracion for _, duracion in resultados_lentas) if resultados_lentas else 0.0,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gunicorn (WSGI) contra la variante ASGI")
+    parser.add_argument("--concurrencia", type=int, default=16, help="Clientes rápidos simultáneos")
+    parser.add_argument("--peticiones", type=int, default=400, help="Peticiones rápidas en total")
+    parser.add_argument("--lentas", type=int, default=4, help="Subidas lentas simultáneas")
+    parser.add_argument("--segundos-lentas", type=float, default=3.0, help="Duración de cada subida lenta")
+    parser.add_argument("--kb-subida", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=1, help="Procesos por servidor (render.yaml usa 1)")
+    parser.add_argument("--hilos", type=int, default=1,
+                        help="Hilos por worker de gunicorn (render.yaml usa GUNICORN_THREADS=12)")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado en JSON")
+    args = parser.parse_args()
+
+    resultado = {"concurrencia": args.concurrencia, "lentas": args.lentas, "workers": args.workers, "hilos": args.hilos}
+    for tipo in ("gunicorn", "asgi"):
+        carpeta = preparar_carpeta()
+        puerto = puerto_libre()
+        proceso = iniciar_servidor(tipo, puerto, carpeta, args.workers, args.hilos)
+        try:
+            resultado[tipo] = asyncio.run(medir(puerto, args.concurrencia, args.peticiones, args.lentas,
+                                                args.segundos_lentas, args.kb_subida))
+        finally:
+            proceso.terminate()
+            proceso.wait()
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+    if args.json:
+        json.dump(resultado, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"⚙️  {args.concurrencia} clientes rápidos + {args.lentas} subidas lentas ({args.segundos_lentas}s), "
+          f"{args.workers} proceso(s) por servidor, {args.hilos} hilo(s) por worker de gunicorn")
+    for tipo in ("gunicorn", "asgi"):
+        r = resultado[tipo]
+        print(f"{tipo:>9}: {r['peticiones_por_segundo']:7.1f} pet/s | p50 {r['p50_ms']:7.1f} ms | "
+              f"p95 {r['p95_ms']:7.1f} ms | p99 {r['p99_ms']:7.1f} ms | errores {r['errores']} | "
+              f"subidas {r['subidas_lentas']['correctas']}/{r['subidas_lentas']['total']} "
+              f"en {r['subidas_lentas']['media_s']:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Logs estructurados que no bloquean el camino caliente.
+
+Las peticiones solo arman el registro y lo dejan en una cola acotada; un hilo oyente lo formatea
+(JSON o texto) y lo escribe en stdout. Si la cola se llena el registro se descarta y se cuenta
+en /metrics en lugar de hacer esperar a la petición.
+
+    bitacora = obtener_bitacora("api")
+    bitacora.info("mensaje_recibido", "📨 Mensaje recibido", mensaje_usuario=mensaje, session_id=session_id)
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from config import Config
+from metricas import logs_descartados
+
+
+class FormatoJSON(logging.Formatter):
+    """Un objeto JSON por línea con el evento y sus campos"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "evento": getattr(record, "evento", None),
+            "mensaje": record.getMessage(),
+        }
+        for clave, valor in getattr(record, "campos", {}).items():
+            # Un campo con el nombre de una clave base no la reemplaza
+            datos.setdefault(clave, valor)
+        if getattr(record, "muestreo", 1.0) < 1.0:
+            datos["muestreo"] = record.muestreo
+        if record.exc_text:
+            datos["traceback"] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class FormatoTexto(logging.Formatter):
+    """Una línea legible con el mensaje original seguido de los campos como clave=valor"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fecha = datetime.fromtimestamp(record.created).isoformat(sep=" ", timespec="seconds")
+        linea = f"{fecha} {record.levelname} {record.name} {record.getMessage()}"
+        campos = " ".join(f"{clave}={valor!r}" for clave, valor in getattr(record, "campos", {}).items())
+        if campos:
+            linea = f"{linea} | {campos}"
+        if record.exc_text:
+            linea = f"{linea}\n{record.exc_text}"
+        return linea
+
+
+class OyenteCola(QueueListener):
+    """Oyente que espera lugar en la cola para el aviso de cierre, así no se pierden los últimos registros"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class ManejadorCola(QueueHandler):
+    """Deja los registros en una cola acotada sin bloquear; el hilo oyente se inicia con el primer registro.
+
+    Tras un fork (workers de gunicorn) el hijo no hereda el hilo, así que se vuelve a iniciar en el hijo.
+    """
+
+    def __init__(self, salida: logging.Handler, max_cola: int = None):
+        super().__init__(None)
+        self.salida = salida
+        self.max_cola = max_cola or Config.LOG_COLA_MAX
+        self.oyente: Optional[OyenteCola] = None
+        self.lock_inicio = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reiniciar_tras_fork)
+
+    def iniciar(self):
+        """Crea la cola e inicia el hilo oyente (una sola vez por proceso)"""
+        with self.lock_inicio:
+            if self.oyente is not None:
+                return
+            self.queue = queue.Queue(self.max_cola)
+            self.oyente = OyenteCola(self.queue, self.salida, respect_handler_level=True)
+            self.oyente.start()
+
+    def reiniciar_tras_fork(self):
+        self.lock_inicio = threading.Lock()
+        self.oyente = None
+        self.queue = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Resuelve el mensaje y el traceback en el hilo que registra; el formato final lo hace el oyente"""
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.oyente is None:
+            self.iniciar()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            logs_descartados.inc()
+
+    def detener(self):
+        """Escribe los registros pendientes y detiene el hilo oyente"""
+        with self.lock_inicio:
+            if self.oyente is not None:
+                self.oyente.stop()
+                self.oyente = None
+
+
+def crear_formato(formato: str = None) -> logging.Formatter:
+    return FormatoTexto() if (formato or Config.LOG_FORMATO) == "texto" else FormatoJSON()
+
+
+# Un contador por evento muestreado; next() sobre itertools.count es atómico con el GIL
+contadores_muestreo: Dict[str, Any] = {}
+
+
+def muestrear(evento: str) -> Optional[float]:
+    """Retorna la fracción con la que se registra el evento, o None si esta ocurrencia se omite"""
+    fraccion = Config.LOG_MUESTREO.get(evento)
+    if fraccion is None or fraccion >= 1.0:
+        return 1.0
+    if fraccion <= 0:
+        return None
+    contador = contadores_muestreo.get(evento) or contadores_muestreo.setdefault(evento, itertools.count())
+    # Se registra una de cada 1/fraccion ocurrencias, de forma determinista
+    return fraccion if next(contador) % max(1, round(1 / fraccion)) == 0 else None
+
+
+class Bitacora:
+    """Logger de eventos: cada registro lleva el nombre del evento, un mensaje legible y campos"""
+
+    __slots__ = ("logger",)
+
+    def __init__(self, nombre: str):
+        self.logger = logging.getLogger(f"chatbot.{nombre}")
+
+    def registrar(self, nivel: int, evento: str, texto: str, exc_info: bool = False, /, **campos):
+        # Parámetros solo posicionales: los campos pueden llamarse "texto", "evento", etc.
+        if not self.logger.isEnabledFor(nivel):
+            return
+        fraccion = 1.0
+        if nivel < logging.WARNING:
+            fraccion = muestrear(evento)
+            if fraccion is None:
+                return
+        self.logger.log(nivel, texto, exc_info=exc_info,
+                        extra={"evento": evento, "campos": campos, "muestreo": fraccion})
+
+    def debug(self, evento: str, texto: str, /, **campos):
+        self.registrar(logging.DEBUG, evento, texto, False, **campos)
+
+    def info(self, evento: str, texto: str, /, **campos):
+        self.registrar(logging.INFO, evento, texto, False, **campos)
+
+    def warning(self, evento: str, texto: str, /, **campos):
+        self.registrar(logging.WARNING, evento, texto, False, **campos)
+
+    def error(self, evento: str, texto: str, /, **campos):
+        self.registrar(logging.ERROR, evento, texto, False, **campos)
+
+    def exception(self, evento: str, texto: str, /, **campos):
+        """Registra un error con el traceback de la excepción en curso"""
+        self.registrar(logging.ERROR, evento, texto, True, **campos)
+
+
+def configurar_logs(nivel: str = None, formato: str = None, salida=None) -> ManejadorCola:
+    """Instala el manejador con cola en el logger "chatbot" (no inicia hilos hasta el primer registro)"""
+    logger = logging.getLogger("chatbot")
+    for manejador in list(logger.handlers):
+        if isinstance(manejador, ManejadorCola):
+            manejador.detener()
+        logger.removeHandler(manejador)
+
+    escritor = logging.StreamHandler(salida or sys.stdout)
+    escritor.setFormatter(crear_formato(formato))
+    manejador = ManejadorCola(escritor)
+    logger.addHandler(manejador)
+    logger.setLevel((nivel or Config.LOG_NIVEL).upper())
+    # Los registros no pasan al logger raíz para no duplicarse con los logs del servidor
+    logger.propagate = False
+    return manejador
+
+
+def detener_logs():
+    """Escribe los registros que quedan en la cola (se llama al salir del proceso)"""
+    for manejador in logging.getLogger("chatbot").handlers:
+        if isinstance(manejador, ManejadorCola):
+            manejador.detener()
+
+
+def registros_en_cola() -> int:
+    """Registros que esperan al hilo oyente"""
+    return sum(manejador.queue.qsize() for manejador in logging.getLogger("chatbot").handlers
+               if isinstance(manejador, ManejadorCola) and manejador.queue is not None)
+
+
+def obtener_bitacora(nombre: str) -> Bitacora:
+    return Bitacora(nombre)
+
+
+configurar_logs()
+atexit.register(detener_logs)
@@ -0,0 +1,84 @@
+import gzip
+import hashlib
+
+from flask import Flask, Response, request
+
+from config import Config
+from cache_respuestas import cache_respuestas
+
+# Brotli es opcional: si no está instalado se usa solo gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TIPOS_COMPRIMIBLES = {"application/json", "text/html", "text/plain", "text/css", "application/javascript"}
+
+
+def calcular_etag(datos: bytes) -> str:
+    """Calcula el ETag de un cuerpo de respuesta"""
+    return hashlib.sha1(datos).hexdigest()
+
+
+def elegir_codificacion() -> str:
+    """Elige la codificación que acepta el cliente (brotli si está disponible, si no gzip)"""
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas["br"]:
+        return "br"
+    if aceptadas["gzip"]:
+        return "gzip"
+    return None
+
+
+def comprimir(datos: bytes, codificacion: str) -> bytes:
+    """Comprime el cuerpo con la codificación indicada"""
+    if codificacion == "br":
+        return brotli.compress(datos, quality=Config.COMPRESION_NIVEL)
+    return gzip.compress(datos, compresslevel=Config.COMPRESION_NIVEL)
+
+
+def aplicar_cache_http(response: Response) -> Response:
+    """Agrega Cache-Control y ETag, responde 304 si el cliente ya tiene la versión y comprime el cuerpo"""
+    # Las respuestas en streaming (Server-Sent Events) no se leen para calcular el ETag
+    if (request.method not in ("GET", "HEAD") or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed):
+        return response
+
+    regla = request.url_rule.rule if request.url_rule else None
+    if regla in Config.CACHE_CONTROL and "Cache-Control" not in response.headers:
+        response.headers["Cache-Control"] = Config.CACHE_CONTROL[regla]
+
+    # Las respuestas memorizadas ya traen su ETag; el resto se calcula sobre el cuerpo sin comprimir
+    etag, _ = response.get_etag()
+    memorizada = etag is not None
+    if not memorizada:
+        etag = calcular_etag(response.get_data())
+        # ETag débil: la versión comprimida y la original son equivalentes
+        response.set_etag(etag, weak=True)
+    response.make_conditional(request.environ)
+    if response.status_code == 304:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    if (response.mimetype not in TIPOS_COMPRIMIBLES or "Content-Encoding" in response.headers
+            or (response.content_length or 0) < Config.COMPRESION_MIN_BYTES):
+        return response
+
+    codificacion = elegir_codificacion()
+    if codificacion is None:
+        return response
+
+    datos = response.get_data()
+    if memorizada:
+        # El cuerpo comprimido de una respuesta memorizada se reutiliza mientras no cambie su ETag
+        comprimido = cache_respuestas.obtener(("comprimido", codificacion, etag), lambda: comprimir(datos, codificacion))
+    else:
+        comprimido = comprimir(datos, codificacion)
+    response.set_data(comprimido)
+    response.headers["Content-Encoding"] = codificacion
+    return response
+
+
+def registrar_cache_http(app: Flask):
+    """Registra la capa de caché HTTP y compresión en la aplicación"""
+    app.after_request(aplicar_cache_http)
@@ -0,0 +1,32 @@
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from config import Config
+
+
+class CacheRespuestas:
+    """Memoriza respuestas que solo dependen de la configuración (costos, grados, requisitos)"""
+
+    def __init__(self, max_entradas: int = None):
+        self.max_entradas = max_entradas or Config.CACHE_RESPUESTAS_MAX
+        self.entradas: Dict[Hashable, Tuple[int, Any]] = {}
+
+    def obtener(self, clave: Hashable, constructor: Callable[[], Any]) -> Any:
+        """Retorna la respuesta memorizada para la clave o la construye si la configuración cambió"""
+        version = Config.get_version()
+        entrada = self.entradas.get(clave)
+        if entrada is not None and entrada[0] == version:
+            return entrada[1]
+
+        valor = constructor()
+        # Las entradas de versiones anteriores se reemplazan; las claves nuevas respetan el límite
+        if clave in self.entradas or len(self.entradas) < self.max_entradas:
+            self.entradas[clave] = (version, valor)
+        return valor
+
+    def limpiar(self):
+        """Elimina todas las respuestas memorizadas"""
+        self.entradas.clear()
+
+
+# Instancia global de la cache
+cache_respuestas = CacheRespuestas()
@@ -1,171 +1,159 @@
-import json
+import hashlib
 import os
 import sqlite3
+import threading
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import TYPE_CHECKING, Dict, List, Optional, Any
 import uuid
 import re
 from config import Config
+from cache_respuestas import cache_respuestas
+from normalizacion_imagenes import normalizador_imagenes
+from revision_documentos import revisor_documentos, resumen_matricula
+from metricas import mensajes_chatbot, transiciones_chatbot, documentos_chatbot, bytes_documentos_chatbot
+from bitacora import obtener_bitacora
+from eventos_sesion import publicar_evento
+from migraciones import aplicar_migraciones
+from almacen_sesiones import ConflictoVersion, crear_almacen_sesiones
+from almacenamiento_documentos import (
+    normalizar_nombre_archivo, ruta_temporal, ruta_blob, escribir_archivos,
+    descartar_archivos, registrar_blobs, guardar_blobs
+)
+
+if TYPE_CHECKING:
+    from clasificador_intenciones import ClasificadorIntenciones
+
+bitacora = obtener_bitacora("chatbot")
+
+class ConexionCompartida:
+    """Conexión que reutilizan los mensajes de un lote; close() la deja abierta para el siguiente"""
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+    
+    def __getattr__(self, nombre):
+        return getattr(self.conn, nombre)
+    
+    def close(self):
+        pass
 
 class ChatbotInteligente:
     def __init__(self):
         self.db_path = Config.get_database_path()
         self.init_database()
-        
+        self.modelo_intenciones = None
+        # Estado de la sesión que atiende cada hilo, para contar transiciones sin consultar la base
+        self.estado_hilo = threading.local()
+        # Estado, contexto e historial de las sesiones (SQLite o clave-valor compartido, ver SESION_BACKEND)
+        self.almacen = crear_almacen_sesiones(db_path=self.db_path, conectar=self.conectar)
+        
+    @property
+    def clasificador(self) -> "ClasificadorIntenciones":
+        """Clasificador de intenciones; numpy y el modelo se cargan con el primer uso"""
+        if self.modelo_intenciones is None:
+            # Dos hilos que llegan a la vez cargan el modelo dos veces y queda uno: no hace falta lock
+            from clasificador_intenciones import ClasificadorIntenciones
+            self.modelo_intenciones = ClasificadorIntenciones()
+        return self.modelo_intenciones
+    
+    def opcion_por_intencion(self, mensaje: str) -> Optional[str]:
+        """Opción del menú inicial equivalente a la intención que reconoce el clasificador"""
+        from clasificador_intenciones import OPCION_POR_INTENCION
+        intencion = self.clasificador.clasificar(mensaje)
+        return OPCION_POR_INTENCION[intencion] if intencion else None
+    
     def init_database(self):
-        """Inicializa la base de datos con las tablas necesarias"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Tabla para sesiones de chat
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sesiones (
-                id TEXT PRIMARY KEY,
-                estado TEXT,
-                datos_contexto TEXT,
-                fecha_creacion TIMESTAMP,
-                fecha_actualizacion TIMESTAMP,
-                nombre_usuario TEXT,
-                telefono_usuario TEXT
-            )
-        ''')
-        
-        # Verificar si las columnas nombre_usuario y telefono_usuario existen
-        cursor.execute("PRAGMA table_info(sesiones)")
-        columnas = [col[1] for col in cursor.fetchall()]
-        
-        # Agregar columnas si no existen
-        if 'nombre_usuario' not in columnas:
-            cursor.execute('ALTER TABLE sesiones ADD COLUMN nombre_usuario TEXT')
-            print("✅ Columna nombre_usuario agregada a la tabla sesiones")
-        
-        if 'telefono_usuario' not in columnas:
-            cursor.execute('ALTER TABLE sesiones ADD COLUMN telefono_usuario TEXT')
-            print("✅ Columna telefono_usuario agregada a la tabla sesiones")
-        
-        # Tabla para documentos subidos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS documentos (
-                id TEXT PRIMARY KEY,
-                sesion_id TEXT,
-                tipo_documento TEXT,
-                nombre_archivo TEXT,
-                ruta_archivo TEXT,
-                estado TEXT,
-                fecha_subida TIMESTAMP,
-                FOREIGN KEY (sesion_id) REFERENCES sesiones (id)
-            )
-        ''')
-        
-        # Tabla para requisitos por grado
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS requisitos_grado (
-                grado TEXT PRIMARY KEY,
-                requisitos TEXT,
-                descripcion TEXT
-            )
-        ''')
-        
-        # Tabla para historial de conversación
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS historial_conversacion (
-                id TEXT PRIMARY KEY,
-                sesion_id TEXT,
-                mensaje_usuario TEXT,
-                respuesta_bot TEXT,
-                timestamp TIMESTAMP,
-                FOREIGN KEY (sesion_id) REFERENCES sesiones (id)
-            )
-        ''')
-        
-        # Insertar requisitos por grado si no existen
-        for grado in Config.get_grados():
-            requisitos = Config.get_requisitos(grado)
-            descripcion = f"{grado} de primaria"
-            
-            cursor.execute('''
-                INSERT OR IGNORE INTO requisitos_grado (grado, requisitos, descripcion)
-                VALUES (?, ?, ?)
-            ''', (grado, requisitos, descripcion))
-        
-        conn.commit()
-        conn.close()
-        print("✅ Base de datos inicializada correctamente")
+        """Aplica las migraciones pendientes del esquema (migraciones.py)"""
+        aplicar_migraciones(self.db_path)
+    
+    def conectar(self):
+        """Abre una conexión; durante un lote se usa la conexión compartida del hilo"""
+        compartida = getattr(self.estado_hilo, "conexion_lote", None)
+        return compartida if compartida is not None else sqlite3.connect(self.db_path)
     
     def crear_sesion(self, user_id: str = None) -> str:
         """Crea una nueva sesión de chat"""
         session_id = str(uuid.uuid4())
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO sesiones (id, estado, datos_contexto, fecha_creacion, fecha_actualizacion)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (session_id, "inicio", json.dumps({}), datetime.now(), datetime.now()))
-        
-        conn.commit()
-        conn.close()
+        self.almacen.crear(session_id)
         return session_id
     
     def obtener_estado_sesion(self, session_id: str) -> Dict[str, Any]:
-        """Obtiene el estado actual de una sesión"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT estado, datos_contexto, nombre_usuario, telefono_usuario FROM sesiones WHERE id = ?', (session_id,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return {
-                "estado": result[0],
-                "datos_contexto": json.loads(result[1]) if result[1] else {},
-                "nombre_usuario": result[2],
-                "telefono_usuario": result[3]
-            }
-        return {"estado": "inicio", "datos_contexto": {}, "nombre_usuario": None, "telefono_usuario": None}
+        """Obtiene el estado actual de una sesión y recuerda la versión leída para la siguiente escritura"""
+        sesion = self.almacen.obtener(session_id)
+        if sesion is None:
+            sesion = {"estado": "inicio", "datos_contexto": {}, "nombre_usuario": None, "telefono_usuario": None,
+                      "version": None}
+        self.estado_hilo.version_sesion = (session_id, sesion["version"])
+        return sesion
     
-    def actualizar_estado_sesion(self, session_id: str, estado: str, datos_contexto: Dict[str, Any]):
-        """Actualiza el estado de una sesión"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE sesiones 
-            SET estado = ?, datos_contexto = ?, fecha_actualizacion = ?
-            WHERE id = ?
-        ''', (estado, json.dumps(datos_contexto), datetime.now(), session_id))
-        
-        conn.commit()
-        conn.close()
+    def version_leida(self, session_id: str) -> Optional[int]:
+        version_sesion = getattr(self.estado_hilo, "version_sesion", None)
+        if version_sesion is not None and version_sesion[0] == session_id:
+            return version_sesion[1]
+        return None
+    
+    def actualizar_estado_sesion(self, session_id: str, estado: str, datos_contexto: Dict[str, Any],
+                                 concurrencia_optimista: bool = True):
+        """Actualiza el estado de una sesión; falla con ConflictoVersion si cambió desde que se leyó"""
+        version = self.version_leida(session_id) if concurrencia_optimista else None
+        nueva = self.almacen.actualizar(session_id, estado, datos_contexto, version)
+        self.estado_hilo.version_sesion = (session_id, nueva)
+        
+        anterior = getattr(self.estado_hilo, "estado", None)
+        if anterior is not None and anterior != estado:
+            transiciones_chatbot.inc(anterior, estado)
+        self.estado_hilo.estado = estado
     
     def guardar_mensaje_historial(self, session_id: str, mensaje_usuario: str, respuesta_bot: str):
         """Guarda un mensaje en el historial de conversación"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        fila = (str(uuid.uuid4()), session_id, mensaje_usuario, respuesta_bot, datetime.now())
         
-        cursor.execute('''
-            INSERT INTO historial_conversacion (id, sesion_id, mensaje_usuario, respuesta_bot, timestamp)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (str(uuid.uuid4()), session_id, mensaje_usuario, respuesta_bot, datetime.now()))
+        # Durante un lote el historial se acumula y se escribe al terminar la conversación
+        pendientes = getattr(self.estado_hilo, "historial_pendiente", None)
+        if pendientes is not None:
+            pendientes.append(fila)
+            return
         
-        conn.commit()
-        conn.close()
+        self.escribir_historial([fila])
     
-    def guardar_documento(self, session_id: str, tipo_documento: str, nombre_archivo: str, contenido_archivo: bytes) -> str:
-        """Guarda un documento subido por el usuario"""
+    def escribir_historial(self, filas: List[tuple]):
+        """Inserta filas del historial en una sola escritura"""
+        self.almacen.agregar_historial(filas)
+    
+    def procesar_conversacion(self, mensajes: List[str], session_id: str = None,
+                              conexion: sqlite3.Connection = None) -> Dict[str, Any]:
+        """Procesa en orden los mensajes de una sesión reutilizando una conexión y escribiendo el historial al final"""
+        propia = conexion is None
+        conexion = conexion or sqlite3.connect(self.db_path)
+        self.estado_hilo.conexion_lote = ConexionCompartida(conexion)
+        self.estado_hilo.historial_pendiente = []
+        respuestas = []
+        
+        try:
+            # La sesión se crea antes para que todos los mensajes queden en la misma
+            session_id = session_id or self.crear_sesion()
+            for mensaje in mensajes:
+                respuestas.append(self.procesar_mensaje(mensaje, session_id))
+        finally:
+            # El historial de los mensajes ya procesados se escribe aunque uno haya fallado
+            pendientes = self.estado_hilo.historial_pendiente
+            self.estado_hilo.historial_pendiente = None
+            try:
+                if pendientes:
+                    self.escribir_historial(pendientes)
+            finally:
+                self.estado_hilo.conexion_lote = None
+                if propia:
+                    conexion.close()
+        
+        return {"session_id": session_id, "respuestas": respuestas}
+    
+    def preparar_documento(self, tipo_documento: str, nombre_archivo: str, contenido_archivo: bytes) -> Dict[str, Any]:
+        """Valida un documento y calcula su hash sin escribirlo"""
         doc_id = str(uuid.uuid4())
-        upload_folder = Config.get_upload_folder()
         
         # Manejar archivos sin extensión (común en fotos móviles)
-        if '.' not in nombre_archivo:
-            extension = Config.get_file_extension(nombre_archivo)
-            nombre_archivo = f"{nombre_archivo}.{extension}"
-        
-        ruta_archivo = f"{upload_folder}/{doc_id}_{nombre_archivo}"
-        
-        # Crear directorio si no existe
-        os.makedirs(upload_folder, exist_ok=True)
+        nombre_archivo = normalizar_nombre_archivo(nombre_archivo)
         
         # Verificar extensión permitida
         if not Config.is_allowed_file(nombre_archivo):
@@ -175,27 +163,119 @@ class ChatbotInteligente:
         if len(contenido_archivo) > Config.MAX_FILE_SIZE:
             raise ValueError(f"Archivo demasiado grande. Máximo {Config.MAX_FILE_SIZE / (1024*1024)}MB")
         
-        # Guardar archivo
-        with open(ruta_archivo, "wb") as f:
-            f.write(contenido_archivo)
-        
-        # Guardar en base de datos
+        return {
+            "id": doc_id,
+            "tipo": tipo_documento,
+            "nombre": nombre_archivo,
+            "contenido": contenido_archivo,
+            "tamano": len(contenido_archivo),
+            "sha256": hashlib.sha256(contenido_archivo).hexdigest()
+        }
+    
+    def guardar_documento(self, session_id: str, tipo_documento: str, nombre_archivo: str, contenido_archivo: bytes) -> str:
+        """Guarda un documento subido por el usuario"""
+        return self.guardar_documentos(session_id, [{
+            "tipo": tipo_documento,
+            "nombre": nombre_archivo,
+            "contenido": contenido_archivo
+        }])[0]
+    
+    def guardar_documentos(self, session_id: str, archivos: List[Dict]) -> List[str]:
+        """Guarda varios documentos: escrituras en paralelo y registro en una sola transacción (todo o nada)"""
+        documentos = []
+        for archivo in archivos:
+            if archivo.get("ruta_temporal") or archivo.get("ruta"):
+                # El archivo ya fue escrito en disco durante la recepción
+                documentos.append({
+                    "id": archivo.get("id") or str(uuid.uuid4()),
+                    "tipo": archivo.get("tipo", "documento"),
+                    "nombre": archivo.get("nombre", "archivo"),
+                    "ruta": archivo.get("ruta"),
+                    "ruta_temporal": archivo.get("ruta_temporal"),
+                    "tamano": archivo.get("tamano"),
+                    "sha256": archivo.get("sha256")
+                })
+            else:
+                # Se validan todos los archivos antes de escribir el primero
+                documentos.append(self.preparar_documento(
+                    archivo.get("tipo", "documento"),
+                    archivo.get("nombre", "archivo"),
+                    archivo.get("contenido", b"")
+                ))
+        
+        # Un contenido que ya está almacenado no se vuelve a escribir
+        pendientes = []
+        for documento in documentos:
+            if "contenido" in documento and not os.path.exists(ruta_blob(documento["sha256"])):
+                documento["ruta_temporal"] = ruta_temporal()
+                pendientes.append(documento)
+        try:
+            escribir_archivos(pendientes)
+            return self.registrar_documentos(session_id, documentos)
+        except Exception:
+            descartar_archivos(pendientes)
+            raise
+    
+    def registrar_documento(self, session_id: str, tipo_documento: str, nombre_archivo: str, ruta_archivo: str, doc_id: str = None) -> str:
+        """Registra en la base de datos un documento que ya está guardado en disco"""
+        return self.registrar_documentos(session_id, [{
+            "id": doc_id or str(uuid.uuid4()),
+            "tipo": tipo_documento,
+            "nombre": nombre_archivo,
+            "ruta": ruta_archivo
+        }])[0]
+    
+    def registrar_documentos(self, session_id: str, documentos: List[Dict]) -> List[str]:
+        """Registra varios documentos ya guardados en disco en una sola transacción"""
+        fecha_subida = datetime.now()
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO documentos (id, sesion_id, tipo_documento, nombre_archivo, ruta_archivo, estado, fecha_subida)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (doc_id, session_id, tipo_documento, nombre_archivo, ruta_archivo, "pendiente", datetime.now()))
-        
-        conn.commit()
-        conn.close()
-        
-        return doc_id
+        try:
+            # El lock de escritura se toma antes de ubicar los blobs para no competir con su liberación
+            cursor.execute('BEGIN IMMEDIATE')
+            blobs = [documento for documento in documentos if documento.get("sha256")]
+            registrar_blobs(cursor, blobs)
+            cursor.executemany('''
+                INSERT INTO documentos (id, sesion_id, tipo_documento, nombre_archivo, ruta_archivo, estado, fecha_subida, blob_sha256)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (documento["id"], session_id, documento["tipo"], documento["nombre"], documento["ruta"], "pendiente", fecha_subida, documento.get("sha256"))
+                for documento in documentos
+            ])
+            conn.commit()
+        finally:
+            # Si no se llegó al commit, cerrar la conexión descarta toda la transacción
+            conn.close()
+        # Con la transacción confirmada, los temporales pasan a su ruta definitiva
+        guardar_blobs(blobs)
+        
+        documentos_chatbot.inc(valor=len(documentos))
+        for documento in documentos:
+            publicar_evento(session_id, "documento", id=documento["id"], tipo=documento["tipo"],
+                            nombre=documento["nombre"], estado="pendiente")
+        bytes_documentos_chatbot.inc(valor=sum(documento.get("tamano") or 0 for documento in documentos))
+        
+        # Las variantes de las imágenes nuevas se generan fuera de la petición
+        for documento in documentos:
+            if documento.get("nuevo"):
+                normalizador_imagenes.encolar(documento["sha256"], documento["ruta"])
+        # Los documentos quedan pendientes; los revisores validan en segundo plano
+        revisor_documentos.avisar()
+        
+        return [documento["id"] for documento in documentos]
     
     def obtener_requisitos_grado(self, grado: str) -> Optional[str]:
         """Obtiene los requisitos para un grado específico"""
-        return Config.get_requisitos(grado)
+        if grado not in Config.REQUISITOS_GRADO:
+            return Config.get_requisitos(grado)
+        return cache_respuestas.obtener(("requisitos", grado), lambda: Config.get_requisitos(grado))
+    
+    def respuesta_informativa(self, intencion: str, session_id: str, constructor) -> Dict[str, Any]:
+        """Retorna una respuesta que solo depende de la configuración, memorizada por intención"""
+        respuesta = dict(cache_respuestas.obtener(("respuesta", intencion), constructor))
+        respuesta["session_id"] = session_id
+        return respuesta
     
     def extraer_nombre_telefono(self, mensaje: str) -> Dict[str, str]:
         """Extrae nombre y teléfono del mensaje del usuario de forma más robusta"""
@@ -291,9 +371,26 @@ class ChatbotInteligente:
         if not session_id:
             session_id = self.crear_sesion()
         
+        # Si otra petición de la misma sesión escribió primero, el mensaje se atiende de nuevo sobre su estado
+        try:
+            for intento in range(Config.SESION_REINTENTOS_CONFLICTO + 1):
+                try:
+                    return self.atender_mensaje(mensaje, session_id, archivos)
+                except ConflictoVersion as e:
+                    bitacora.warning("conflicto_sesion", "⚠️ La sesión cambió mientras se atendía el mensaje",
+                                     session_id=session_id, intento=intento + 1, version=e.esperada)
+                    if intento == Config.SESION_REINTENTOS_CONFLICTO:
+                        raise
+        finally:
+            self.estado_hilo.version_sesion = None
+    
+    def atender_mensaje(self, mensaje: str, session_id: str, archivos: List[Dict] = None) -> Dict[str, Any]:
+        """Responde según el estado de la sesión; lo reintenta procesar_mensaje ante un conflicto de versión"""
         estado_actual = self.obtener_estado_sesion(session_id)
         estado = estado_actual["estado"]
         contexto = estado_actual["datos_contexto"]
+        mensajes_chatbot.inc(estado)
+        self.estado_hilo.estado = estado
         
         # Procesar archivos si se enviaron
         if archivos:
@@ -571,6 +668,14 @@ class ChatbotInteligente:
         elif self.es_mensaje_matricula(mensaje):
             return self.iniciar_flujo_matricula(session_id)
         
+        # Respaldo: clasificador de intenciones para mensajes mal escritos o parafraseados
+        opcion = self.opcion_por_intencion(mensaje)
+        if opcion == "costos":
+            # El menú inicial no tiene opción de costos: se responde sin pasar por el menú de matrícula
+            return self.respuesta_informativa("costos_matricula", session_id, self.construir_respuesta_costos_matricula)
+        if opcion:
+            return self.procesar_estado_inicio(opcion, session_id)
+        
         return {
             "mensaje": "Entiendo tu consulta. ¿Te gustaría información sobre el proceso de matrícula o hay algo específico en lo que pueda ayudarte?",
             "opciones": [
@@ -587,7 +692,6 @@ class ChatbotInteligente:
     def procesar_opciones_matricula(self, mensaje: str, session_id: str, contexto: Dict) -> Dict[str, Any]:
         """Procesa la selección de opciones de matrícula"""
         mensaje_lower = mensaje.lower()
-        costos = Config.get_costos()
         
         if "requisitos" in mensaje_lower or "1" in mensaje:
             self.actualizar_estado_sesion(session_id, "requisitos_grado", {"opcion_seleccionada": "requisitos"})
@@ -623,16 +727,7 @@ class ChatbotInteligente:
                 "session_id": session_id
             }
         elif "costos" in mensaje_lower or "precio" in mensaje_lower or "4" in mensaje:
-            return {
-                "mensaje": f"💰 Los costos de matrícula para el 2025 son:\n\n• Matrícula: S/ {costos['matricula']}\n• Pensión mensual: S/ {costos['pension_mensual']}\n\n¿Te gustaría proceder con la matrícula o tienes alguna pregunta sobre los costos?",
-                "opciones": [
-                    {"texto": "📋 Ver requisitos", "valor": "requisitos"},
-                    {"texto": "📤 Subir documentos", "valor": "subir_documentos"},
-                    {"texto": "👨‍💼 Hablar con asesor", "valor": "asesor"}
-                ],
-                "tipo": "opciones",
-                "session_id": session_id
-            }
+            return self.respuesta_informativa("costos_matricula", session_id, self.construir_respuesta_costos_matricula)
         elif "asesor" in mensaje_lower or "hablar" in mensaje_lower or "5" in mensaje:
             self.actualizar_estado_sesion(session_id, "conectando_asesor", {"opcion_seleccionada": "asesor"})
             return {
@@ -811,41 +906,28 @@ class ChatbotInteligente:
         """Procesa los archivos subidos por el usuario - versión simplificada"""
         import time
         
-        documentos_guardados = []
-        
-        # Guardar archivos
-        for archivo in archivos:
-            try:
-                doc_id = self.guardar_documento(
-                    session_id,
-                    archivo.get("tipo", "documento"),
-                    archivo.get("nombre", "archivo"),
-                    archivo.get("contenido", b"")
-                )
-                documentos_guardados.append(doc_id)
-            except ValueError as e:
-                return {
-                    "mensaje": f"❌ Error: {str(e)}",
-                    "tipo": "texto",
-                    "session_id": session_id
-                }
+        # Guardar archivos: si alguno no es válido no se guarda ninguno
+        try:
+            documentos_guardados = self.guardar_documentos(session_id, archivos)
+        except ValueError as e:
+            return self.respuesta_archivo_rechazado(session_id, str(e))
         
         # Obtener el grado seleccionado del contexto
         grado_seleccionado = contexto.get("grado_seleccionado", "el grado seleccionado")
         
-        # Si se subieron archivos, aceptarlos automáticamente
+        # Los documentos quedan pendientes: el resultado de la revisión llega por /eventos/<session_id>
         if len(documentos_guardados) > 0:
-            # Cambiar estado a post_matricula
-            self.actualizar_estado_sesion(session_id, "post_matricula", contexto)
+            # Cambiar estado a post_matricula; los documentos ya quedaron registrados, no se reintenta
+            self.actualizar_estado_sesion(session_id, "post_matricula", contexto, concurrencia_optimista=False)
             
-            # Mensaje de confirmación
+            # Mensaje de recepción
             return {
-                "mensaje": f"🎉 ¡FELICITACIONES! Tu matrícula para {grado_seleccionado} ha sido APROBADA exitosamente.\n\n" +
-                          f"✅ Documentos recibidos: {len(documentos_guardados)} archivo(s)\n\n" +
+                "mensaje": f"📥 Recibimos tus documentos de matrícula para {grado_seleccionado}.\n\n" +
+                          f"✅ Documentos recibidos: {len(documentos_guardados)} archivo(s)\n" +
+                          f"🔍 Estado: en revisión\n\n" +
                           f"📋 Próximos pasos:\n" +
-                          f"• Recibirás un correo de confirmación en las próximas 3 horas\n" +
-                          f"• Te contactaremos para coordinar el pago de la matrícula\n\n" +
-                          f"🏫 Bienvenido al I.E.P. Barton! 🎓\n\n" +
+                          f"• Revisaremos cada documento y te avisaremos si fue validado o si debes volver a enviarlo\n" +
+                          f"• Con los documentos validados te contactaremos para coordinar el pago de la matrícula\n\n" +
                           f"¿Hay algo más en lo que pueda ayudarte?",
                 "opciones": [
                     {"texto": "💰 Consultar costos de matrícula", "valor": "costos"},
@@ -855,9 +937,10 @@ class ChatbotInteligente:
                 ],
                 "tipo": "opciones",
                 "session_id": session_id,
-                "matricula_aprobada": True,
+                "estado_documentos": "pendiente",
                 "grado": grado_seleccionado,
-                "documentos_recibidos": len(documentos_guardados)
+                "documentos_recibidos": len(documentos_guardados),
+                "eventos": f"/eventos/{session_id}"
             }
         
         return {
@@ -866,6 +949,14 @@ class ChatbotInteligente:
             "session_id": session_id
         }
     
+    def respuesta_archivo_rechazado(self, session_id: str, error: str) -> Dict[str, Any]:
+        """Respuesta cuando un archivo no cumple con el tipo o tamaño permitido"""
+        return {
+            "mensaje": f"❌ Error: {error}",
+            "tipo": "texto",
+            "session_id": session_id
+        }
+    
     def procesar_verificacion_matricula(self, mensaje: str, session_id: str, contexto: Dict) -> Dict[str, Any]:
         """Procesa la verificación de estado de matrícula"""
         # Verificar si el usuario menciona que no tiene el código SIAGE
@@ -970,27 +1061,19 @@ class ChatbotInteligente:
     
     def actualizar_datos_contacto(self, session_id: str, nombre: str = None, telefono: str = None):
         """Actualiza los datos de contacto en la sesión"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Obtener datos actuales
-        cursor.execute('SELECT nombre_usuario, telefono_usuario FROM sesiones WHERE id = ?', (session_id,))
-        result = cursor.fetchone()
-        nombre_actual = result[0] if result else None
-        telefono_actual = result[1] if result else None
+        anteriores, version = self.almacen.actualizar_contacto(session_id, nombre, telefono)
+        if version is not None and self.version_leida(session_id) is not None:
+            self.estado_hilo.version_sesion = (session_id, version)
+        nombre_actual = anteriores["nombre_usuario"]
+        telefono_actual = anteriores["telefono_usuario"]
         
         # Actualizar solo los campos que se proporcionan
         nombre_final = nombre if nombre else nombre_actual
         telefono_final = telefono if telefono else telefono_actual
         
-        cursor.execute('''
-            UPDATE sesiones 
-            SET nombre_usuario = ?, telefono_usuario = ?
-            WHERE id = ?
-        ''', (nombre_final, telefono_final, session_id))
-        
-        conn.commit()
-        conn.close()
+        # Con nombre y teléfono completos la solicitud queda registrada para los asesores
+        if nombre_final and telefono_final and not (nombre_actual and telefono_actual):
+            publicar_evento(session_id, "asesor", estado="solicitud_registrada", nombre=nombre_final)
     
     def procesar_recoleccion_datos(self, mensaje: str, session_id: str, contexto: Dict) -> Dict[str, Any]:
         """Procesa la recolección de datos del usuario"""
@@ -1022,17 +1105,7 @@ class ChatbotInteligente:
         
         # Si el usuario selecciona consultar costos
         elif "costos" in mensaje_lower or "precio" in mensaje_lower or "2" in mensaje:
-            costos = Config.get_costos()
-            return {
-                "mensaje": f"💰 Los costos de matrícula para el 2025 son:\n\n• Matrícula: S/ {costos['matricula']}\n• Pensión mensual: S/ {costos['pension_mensual']}\n\n¿Te gustaría proceder con la matrícula o tienes alguna pregunta sobre los costos?",
-                "opciones": [
-                    {"texto": "📋 Ver requisitos", "valor": "requisitos"},
-                    {"texto": "👨‍💼 Hablar con asesor", "valor": "asesor"},
-                    {"texto": "🏫 Información de la institución", "valor": "institucion"}
-                ],
-                "tipo": "opciones",
-                "session_id": session_id
-            }
+            return self.respuesta_informativa("costos_presencial", session_id, self.construir_respuesta_costos_presencial)
         
         # Si el usuario selecciona hablar con asesor
         elif "asesor" in mensaje_lower or "3" in mensaje:
@@ -1045,17 +1118,7 @@ class ChatbotInteligente:
         
         # Si el usuario selecciona información de la institución
         elif "institucion" in mensaje_lower or "4" in mensaje:
-            return {
-                "mensaje": f"{Config.get_mensaje('redireccion_presencial')}\n\n• 📋 Obtener tu código SIAGE\n• 📝 Completar el proceso de matrícula\n• 💰 Realizar los pagos correspondientes\n• 📚 Recibir información sobre horarios \n\n🏫 Dirección: Calle 13B 138, Comas 15311\n📞 Teléfono: (01) 551-8239\n🕒 Horario de atención: Lunes a Viernes de 8:00 AM a 4:00 PM\n\n¿Te gustaría que te ayude con algo más?",
-                "opciones": [
-                    {"texto": "📋 Ver requisitos", "valor": "requisitos"},
-                    {"texto": "💰 Consultar costos", "valor": "costos"},
-                    {"texto": "👨‍💼 Hablar con asesor", "valor": "asesor"},
-                    {"texto": "🙏 Agradecer y terminar", "valor": "agradecer"}
-                ],
-                "tipo": "opciones",
-                "session_id": session_id
-            }
+            return self.respuesta_informativa("info_institucion", session_id, self.construir_respuesta_info_institucion)
         
         # Si el usuario quiere agradecer y terminar
         elif "agradecer" in mensaje_lower or "gracias" in mensaje_lower or "terminar" in mensaje_lower:
@@ -1068,21 +1131,69 @@ class ChatbotInteligente:
         
         # Respuesta por defecto
         else:
-            return {
-                "mensaje": f"{Config.get_mensaje('redireccion_presencial')}\n\n• 📋 Obtener tu código SIAGE\n• 📝 Completar el proceso de matrícula\n• 💰 Realizar los pagos correspondientes\n• 📚 Recibir información sobre horarios\n\n🏫 Dirección: Calle 13B 138, Comas 15311\n📞 Teléfono: (01) 551-8239\n🕒 Horario de atención: Lunes a Viernes de 8:00 AM a 4:00 PM\n\n¿En qué más puedo ayudarte?",
-                "opciones": [
-                    {"texto": "📋 Ver requisitos", "valor": "requisitos"},
-                    {"texto": "💰 Consultar costos", "valor": "costos"},
-                    {"texto": "👨‍💼 Hablar con asesor", "valor": "asesor"},
-                    {"texto": "🏫 Información de la institución", "valor": "institucion"},
-                    {"texto": "🙏 Agradecer y terminar", "valor": "agradecer"}
-                ],
-                "tipo": "opciones",
-                "session_id": session_id
-            }
+            return self.respuesta_informativa("redireccion_presencial", session_id, self.construir_respuesta_redireccion_presencial)
+    
+    def construir_respuesta_costos_matricula(self) -> Dict[str, Any]:
+        """Construye la respuesta de costos del menú de matrícula"""
+        costos = Config.get_costos()
+        return {
+            "mensaje": f"💰 Los costos de matrícula para el 2025 son:\n\n• Matrícula: S/ {costos['matricula']}\n• Pensión mensual: S/ {costos['pension_mensual']}\n\n¿Te gustaría proceder con la matrícula o tienes alguna pregunta sobre los costos?",
+            "opciones": [
+                {"texto": "📋 Ver requisitos", "valor": "requisitos"},
+                {"texto": "📤 Subir documentos", "valor": "subir_documentos"},
+                {"texto": "👨‍💼 Hablar con asesor", "valor": "asesor"}
+            ],
+            "tipo": "opciones"
+        }
+    
+    def construir_respuesta_costos_presencial(self) -> Dict[str, Any]:
+        """Construye la respuesta de costos de la redirección presencial"""
+        costos = Config.get_costos()
+        return {
+            "mensaje": f"💰 Los costos de matrícula para el 2025 son:\n\n• Matrícula: S/ {costos['matricula']}\n• Pensión mensual: S/ {costos['pension_mensual']}\n\n¿Te gustaría proceder con la matrícula o tienes alguna pregunta sobre los costos?",
+            "opciones": [
+                {"texto": "📋 Ver requisitos", "valor": "requisitos"},
+                {"texto": "👨‍💼 Hablar con asesor", "valor": "asesor"},
+                {"texto": "🏫 Información de la institución", "valor": "institucion"}
+            ],
+            "tipo": "opciones"
+        }
+    
+    def construir_respuesta_info_institucion(self) -> Dict[str, Any]:
+        """Construye la respuesta con la información de la institución"""
+        return {
+            "mensaje": f"{Config.get_mensaje('redireccion_presencial')}\n\n• 📋 Obtener tu código SIAGE\n• 📝 Completar el proceso de matrícula\n• 💰 Realizar los pagos correspondientes\n• 📚 Recibir información sobre horarios \n\n🏫 Dirección: Calle 13B 138, Comas 15311\n📞 Teléfono: (01) 551-8239\n🕒 Horario de atención: Lunes a Viernes de 8:00 AM a 4:00 PM\n\n¿Te gustaría que te ayude con algo más?",
+            "opciones": [
+                {"texto": "📋 Ver requisitos", "valor": "requisitos"},
+                {"texto": "💰 Consultar costos", "valor": "costos"},
+                {"texto": "👨‍💼 Hablar con asesor", "valor": "asesor"},
+                {"texto": "🙏 Agradecer y terminar", "valor": "agradecer"}
+            ],
+            "tipo": "opciones"
+        }
+    
+    def construir_respuesta_redireccion_presencial(self) -> Dict[str, Any]:
+        """Construye la respuesta por defecto de la redirección presencial"""
+        return {
+            "mensaje": f"{Config.get_mensaje('redireccion_presencial')}\n\n• 📋 Obtener tu código SIAGE\n• 📝 Completar el proceso de matrícula\n• 💰 Realizar los pagos correspondientes\n• 📚 Recibir información sobre horarios\n\n🏫 Dirección: Calle 13B 138, Comas 15311\n📞 Teléfono: (01) 551-8239\n🕒 Horario de atención: Lunes a Viernes de 8:00 AM a 4:00 PM\n\n¿En qué más puedo ayudarte?",
+            "opciones": [
+                {"texto": "📋 Ver requisitos", "valor": "requisitos"},
+                {"texto": "💰 Consultar costos", "valor": "costos"},
+                {"texto": "👨‍💼 Hablar con asesor", "valor": "asesor"},
+                {"texto": "🏫 Información de la institución", "valor": "institucion"},
+                {"texto": "🙏 Agradecer y terminar", "valor": "agradecer"}
+            ],
+            "tipo": "opciones"
+        }
     
     def respuesta_generica(self, mensaje: str, session_id: str) -> Dict[str, Any]:
         """Respuesta genérica cuando no se entiende el mensaje"""
+        # Intentar reconocer la intención antes de mostrar el menú genérico
+        opcion = self.opcion_por_intencion(mensaje)
+        if opcion:
+            self.actualizar_estado_sesion(session_id, "inicio", {})
+            return self.procesar_estado_inicio(opcion, session_id)
+        
         return {
             "mensaje": "No entendí tu mensaje. ¿Te gustaría información sobre el proceso de matrícula o hay algo específico en lo que pueda ayudarte?",
             "opciones": [
@@ -1095,31 +1206,35 @@ class ChatbotInteligente:
             "session_id": session_id
         }
 
+    def resumen_documentos(self, session_id: str) -> Dict[str, Any]:
+        """Estado de la matrícula según la revisión de los documentos de la sesión"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT estado, COUNT(*) FROM documentos WHERE sesion_id = ? GROUP BY estado', (session_id,))
+        por_estado = dict(cursor.fetchall())
+        conn.close()
+        return resumen_matricula(por_estado)
+    
+    def mensaje_estado_documentos(self, resumen: Dict[str, Any]) -> str:
+        """Texto para la familia con el estado de la revisión de sus documentos"""
+        if resumen["estado"] == "en_revision":
+            return (f"🔍 Tus documentos siguen en revisión ({resumen['pendientes']} pendiente(s)). " +
+                    "Te avisaremos si fueron validados o si debes volver a enviar alguno.")
+        if resumen["estado"] == "documentos_observados":
+            return (f"⚠️ {resumen['rechazados']} documento(s) fueron observados. " +
+                    "Revisa el motivo y vuelve a enviarlos para continuar con la matrícula.")
+        if resumen["validados"]:
+            return ("✅ Tus documentos fueron validados. " +
+                    "Estate atento a nuestras llamadas para coordinar el pago de la matrícula.")
+        return "📤 Aún no recibimos documentos de esta sesión. Puedes enviarlos cuando los tengas listos."
+    
     def procesar_opciones_post_matricula(self, mensaje: str, session_id: str, contexto: Dict) -> Dict[str, Any]:
         """Procesa las opciones después de la aprobación de matrícula"""
         mensaje_lower = mensaje.lower()
-        costos = Config.get_costos()
         
         # Consultar costos de matrícula
         if "costos" in mensaje_lower or "precio" in mensaje_lower or "pago" in mensaje_lower:
-            return {
-                "mensaje": f"💰 Costos de matrícula para el 2025:\n\n" +
-                          f"• Matrícula: S/ {costos['matricula']}\n" +
-                          f"• Pensión mensual: S/ {costos['pension_mensual']}\n"
-                          "\n\n" +
-                          f"📋 Formas de pago:\n" +
-                          f"• Transferencia bancaria\n" +
-                          f"• Depósito en efectivo\n" +
-                          f"• Tarjeta de crédito/débito\n\n" +
-                          f"¿Te gustaría que te ayude con algo más?",
-                "opciones": [
-                    {"texto": "📅 Información del calendario escolar", "valor": "calendario"},
-                    {"texto": "👨‍💼 Hablar con asesor", "valor": "asesor"},
-                    {"texto": "🏠 Finalizar conversación", "valor": "finalizar"}
-                ],
-                "tipo": "opciones",
-                "session_id": session_id
-            }
+            return self.respuesta_informativa("costos_post_matricula", session_id, self.construir_respuesta_costos_post_matricula)
         
         # Información del calendario escolar
         elif "calendario" in mensaje_lower or "horarios" in mensaje_lower or "fechas" in mensaje_lower:
@@ -1159,17 +1274,15 @@ class ChatbotInteligente:
         # Finalizar conversación
         elif "finalizar" in mensaje_lower or "terminar" in mensaje_lower or "gracias" in mensaje_lower or "adiós" in mensaje_lower:
             self.actualizar_estado_sesion(session_id, "inicio", {})
+            resumen = self.resumen_documentos(session_id)
             return {
                 "mensaje": "¡Muchas gracias por confiar en el I.E.P. Barton! 🎓\n\n" +
-                          f"Tu matrícula ha sido procesada exitosamente. Recuerda:\n" +
-                          f"• Revisar tu correo electrónico en las próximas 24 horas\n" +
-                          f"• Estar atento a nuestras llamadas para coordinar el pago\n" +
-                          f"• Preparar los materiales escolares para el inicio de clases\n\n" +
-                          f"🏫 Bienvenido a nuestra familia educativa! 🌟\n\n" +
+                          self.mensaje_estado_documentos(resumen) + "\n\n" +
                           f"Si tienes alguna consulta adicional, no dudes en contactarnos.\n" +
                           f"¡Que tengas un excelente día! 👋",
                 "tipo": "texto",
-                "session_id": session_id
+                "session_id": session_id,
+                "matricula": resumen
             }
         
         # Si no se entiende la opción
@@ -1185,6 +1298,27 @@ class ChatbotInteligente:
                 "tipo": "opciones",
                 "session_id": session_id
             }
+    
+    def construir_respuesta_costos_post_matricula(self) -> Dict[str, Any]:
+        """Construye la respuesta de costos y formas de pago después de la matrícula"""
+        costos = Config.get_costos()
+        return {
+            "mensaje": f"💰 Costos de matrícula para el 2025:\n\n" +
+                      f"• Matrícula: S/ {costos['matricula']}\n" +
+                      f"• Pensión mensual: S/ {costos['pension_mensual']}\n"
+                      "\n\n" +
+                      f"📋 Formas de pago:\n" +
+                      f"• Transferencia bancaria\n" +
+                      f"• Depósito en efectivo\n" +
+                      f"• Tarjeta de crédito/débito\n\n" +
+                      f"¿Te gustaría que te ayude con algo más?",
+            "opciones": [
+                {"texto": "📅 Información del calendario escolar", "valor": "calendario"},
+                {"texto": "👨‍💼 Hablar con asesor", "valor": "asesor"},
+                {"texto": "🏠 Finalizar conversación", "valor": "finalizar"}
+            ],
+            "tipo": "opciones"
+        }
 
 # Instancia global del chatbot
 chatbot = ChatbotInteligente() 
\ No newline at end of file
@@ -0,0 +1,200 @@
+import os
+import re
+import sqlite3
+import unicodedata
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import Config
+
+# Frases semilla por intención. Garantizan un centroide para cada intención
+# aunque el historial aún no tenga ejemplos suficientes.
+FRASES_SEMILLA = {
+    "matricula": [
+        "quiero matricular a mi hijo", "quiero inscribir a mi niño",
+        "información de matrícula", "necesito información sobre matrícula",
+        "como inscribo a mi hija", "quiero registrar a mi hijo en el colegio",
+        "proceso de admisión", "matricular a mi niña", "vacantes para primaria",
+        "inscribir a mi niño", "inscripción para primaria",
+    ],
+    "requisitos": [
+        "ver requisitos", "qué documentos necesito", "que papeles piden",
+        "requisitos para matricular", "qué necesito llevar para la matrícula",
+        "cuales son los requisitos por grado", "documentos requeridos",
+    ],
+    "subir_documentos": [
+        "subir documentos", "quiero enviar los documentos", "enviar foto del dni",
+        "adjuntar la libreta de notas", "mandar mis archivos", "cargar documentos",
+    ],
+    "verificar": [
+        "verificar estado de matrícula", "ya está matriculado mi hijo",
+        "quiero saber si mi hija está matriculada", "consultar estado de la matrícula",
+        "revisar mi matrícula", "tengo deudas pendientes",
+    ],
+    "asesor": [
+        "hablar con un asesor", "quiero hablar con una persona", "comunicarme con alguien",
+        "necesito que me llamen", "contactar a la secretaría", "atención personalizada",
+    ],
+    "costos": [
+        "cuánto cuesta la matrícula", "cuanto es la pensión", "precio de la mensualidad",
+        "costos de matrícula", "cuanto se paga al mes", "información de costos",
+    ],
+}
+
+# Prefijos de respuestas del bot que permiten etiquetar el historial sin ambigüedad
+PREFIJOS_RESPUESTA = {
+    "¡Perfecto! 🎓 Te ayudo con el proceso de matrícula": "matricula",
+    "¡Excelente! 📋 Te ayudo con los requisitos": "requisitos",
+    "¡Perfecto! 📤 Para subir documentos": "subir_documentos",
+    "🔍 Para verificar el estado de tu matrícula": "verificar",
+    "👨‍💼 Te voy a conectar con un asesor": "asesor",
+    "💰 Los costos de matrícula": "costos",
+}
+
+# Valor de opción del menú inicial equivalente a cada intención ("costos" responde directo con los costos)
+OPCION_POR_INTENCION = {
+    "matricula": "matricula",
+    "requisitos": "requisitos",
+    "subir_documentos": "subir documentos",
+    "verificar": "verificar",
+    "asesor": "asesor",
+    "costos": "costos",
+}
+
+
+def normalizar_texto(texto: str) -> str:
+    """Normaliza el texto: minúsculas, sin tildes ni signos"""
+    texto = texto.lower()
+    texto = ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+    texto = re.sub(r'[^a-z0-9 ]', ' ', texto)
+    return ' '.join(texto.split())
+
+
+def vectorizar(texto: str, dimension: int = None) -> np.ndarray:
+    """Convierte un texto en un vector de n-gramas de caracteres con hashing, normalizado L2"""
+    dimension = dimension or Config.CLASIFICADOR_DIMENSION
+    vector = np.zeros(dimension, dtype=np.float32)
+    texto = normalizar_texto(texto)
+    if not texto:
+        return vector
+
+    for palabra in texto.split():
+        palabra = f" {palabra} "
+        for n in (3, 4):
+            for i in range(len(palabra) - n + 1):
+                # crc32 es estable entre procesos, a diferencia de hash()
+                vector[zlib.crc32(palabra[i:i + n].encode()) % dimension] += 1.0
+
+    norma = np.linalg.norm(vector)
+    if norma > 0:
+        vector /= norma
+    return vector
+
+
+def cargar_ejemplos_historial(db_path: str) -> List[Tuple[str, str]]:
+    """Etiqueta los mensajes del historial según la respuesta que generaron"""
+    if not os.path.exists(db_path):
+        return []
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('SELECT mensaje_usuario, respuesta_bot FROM historial_conversacion')
+    filas = cursor.fetchall()
+    conn.close()
+
+    ejemplos = []
+    for mensaje, respuesta in filas:
+        if not mensaje or not respuesta:
+            continue
+        # Los números de menú dependen del estado, no aportan al texto
+        if not re.search(r'[a-zA-Záéíóúñ]', mensaje):
+            continue
+        for prefijo, intencion in PREFIJOS_RESPUESTA.items():
+            if respuesta.startswith(prefijo):
+                ejemplos.append((mensaje, intencion))
+                break
+    return ejemplos
+
+
+def entrenar_centroides(ejemplos: List[Tuple[str, str]], dimension: int = None) -> Tuple[List[str], np.ndarray]:
+    """Calcula el centroide normalizado de cada intención"""
+    dimension = dimension or Config.CLASIFICADOR_DIMENSION
+    acumulados: Dict[str, np.ndarray] = {}
+    vistos = set()
+
+    for texto, intencion in ejemplos:
+        # Los mensajes repetidos (botones del menú) no deben dominar el centroide
+        clave = (normalizar_texto(texto), intencion)
+        if clave in vistos:
+            continue
+        vistos.add(clave)
+        if intencion not in acumulados:
+            acumulados[intencion] = np.zeros(dimension, dtype=np.float32)
+        acumulados[intencion] += vectorizar(texto, dimension)
+
+    etiquetas = sorted(acumulados)
+    centroides = np.vstack([acumulados[etiqueta] for etiqueta in etiquetas])
+    normas = np.linalg.norm(centroides, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return etiquetas, centroides / normas
+
+
+class ClasificadorIntenciones:
+    """Clasificador de intenciones por similitud con centroides (respaldo de las palabras clave)"""
+
+    def __init__(self, modelo_path: str = None):
+        self.modelo_path = modelo_path or Config.MODELO_INTENCIONES_PATH
+        self.etiquetas, self.centroides = self.cargar_modelo()
+
+    def cargar_modelo(self) -> Tuple[List[str], np.ndarray]:
+        """Carga los centroides entrenados o, si no existen, los calcula con las frases semilla"""
+        if os.path.exists(self.modelo_path):
+            datos = np.load(self.modelo_path)
+            etiquetas = [str(etiqueta) for etiqueta in datos["etiquetas"]]
+            centroides = datos["centroides"].astype(np.float32)
+            if centroides.shape[1] == Config.CLASIFICADOR_DIMENSION:
+                return etiquetas, centroides
+
+        ejemplos = [(frase, intencion) for intencion, frases in FRASES_SEMILLA.items() for frase in frases]
+        return entrenar_centroides(ejemplos)
+
+    def puntuar(self, mensaje: str) -> Dict[str, float]:
+        """Retorna la similitud coseno del mensaje con cada intención"""
+        puntajes = self.centroides @ vectorizar(mensaje)
+        return {etiqueta: float(puntaje) for etiqueta, puntaje in zip(self.etiquetas, puntajes)}
+
+    def clasificar(self, mensaje: str) -> Optional[str]:
+        """Retorna la intención más probable o None si no supera el umbral"""
+        if not mensaje or not mensaje.strip():
+            return None
+        puntajes = self.centroides @ vectorizar(mensaje)
+        mejor = int(np.argmax(puntajes))
+        if puntajes[mejor] < Config.CLASIFICADOR_UMBRAL:
+            return None
+        return self.etiquetas[mejor]
+
+
+def entrenar_modelo(db_path: str = None, modelo_path: str = None) -> Dict[str, int]:
+    """Entrena el modelo offline con el historial de conversación y lo guarda en disco"""
+    db_path = db_path or Config.get_database_path()
+    modelo_path = modelo_path or Config.MODELO_INTENCIONES_PATH
+
+    ejemplos = [(frase, intencion) for intencion, frases in FRASES_SEMILLA.items() for frase in frases]
+    ejemplos += cargar_ejemplos_historial(db_path)
+
+    etiquetas, centroides = entrenar_centroides(ejemplos)
+    np.savez_compressed(modelo_path, etiquetas=np.array(etiquetas), centroides=centroides)
+
+    conteo = {}
+    for _, intencion in ejemplos:
+        conteo[intencion] = conteo.get(intencion, 0) + 1
+    return conteo
+
+
+if __name__ == "__main__":
+    conteo = entrenar_modelo()
+    print(f"✅ Modelo de intenciones guardado en {Config.MODELO_INTENCIONES_PATH}")
+    for intencion, total in sorted(conteo.items()):
+        print(f"   {intencion}: {total} ejemplos")
@@ -16,11 +16,125 @@ class Config:
     UPLOAD_FOLDER = "documentos"
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
     ALLOWED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.heic', '.heif'}
+    MAX_ARCHIVOS_POR_PETICION = 8
+    MAX_BYTES_POR_PETICION = 40 * 1024 * 1024  # 40MB en total por envío
+    TAMANO_BLOQUE_BASE64 = 64 * 1024  # Caracteres base64 decodificados por bloque
+    MAX_HILOS_ESCRITURA = 4  # Escrituras de documentos en paralelo
+    NIVELES_SUBCARPETAS = 2  # Subcarpetas por prefijo del hash (documentos/ab/cd/abcd...)
+    TAMANO_LOTE_MIGRACION = 500  # Filas por transacción al migrar o archivar documentos
+    CARPETA_ARCHIVO = "archivo"  # Archivos .zip por día con documentos de sesiones cerradas
+    
+    # Configuración de la normalización de imágenes en segundo plano
+    NORMALIZACION_HILOS = 2
+    NORMALIZACION_COLA_MAX = 200  # Imágenes en espera; si la cola está llena se procesan con el backfill
+    REVISION_LADO_MAX = 1600  # Copia de revisión para el personal (píxeles del lado mayor)
+    MINIATURA_LADO_MAX = 256
+    CALIDAD_JPEG = 80
+    
+    # Configuración de la revisión de documentos en segundo plano (pendiente → validado/rechazado)
+    REVISION_HILOS = 2
+    REVISION_LOTE = 20  # Documentos reservados y actualizados por transacción
+    REVISION_LEASE_SEGUNDOS = 120  # Si el revisor no termina a tiempo, otro puede tomar el documento
+    REVISION_INTERVALO_SEGUNDOS = 5  # Espera entre consultas cuando no hay pendientes
+    REVISION_MAX_INTENTOS = 3
+    REVISION_TAMANO_MIN = 1024  # Bytes; un archivo más pequeño no es un documento legible
+    REVISION_LADO_MIN = 300  # Píxeles del lado menor de una imagen
+    REVISION_MAX_PIXELES = 50000000  # Protege contra imágenes descomunales
     
     # Configuración del chatbot
     MAX_MESSAGE_LENGTH = 1000
     SESSION_TIMEOUT_HOURS = 24
     
+    # Configuración del clasificador de intenciones (respaldo de las palabras clave)
+    MODELO_INTENCIONES_PATH = "modelo_intenciones.npz"
+    CLASIFICADOR_DIMENSION = 4096
+    CLASIFICADOR_UMBRAL = 0.3
+    
+    # Máximo de respuestas informativas memorizadas
+    CACHE_RESPUESTAS_MAX = 256
+    
+    # Configuración de idempotencia para reintentos del cliente
+    IDEMPOTENCIA_TTL_SEGUNDOS = 30
+    IDEMPOTENCIA_MAX_ENTRADAS = 5000
+    IDEMPOTENCIA_ESPERA_SEGUNDOS = 30  # Espera máxima de un reintento mientras se procesa el original
+    IDEMPOTENCIA_CLAVE_DERIVADA = False  # Derivar la clave del mensaje y del turno de la sesión si el cliente no envía una
+    
+    # Configuración de caché HTTP y compresión de respuestas
+    COMPRESION_MIN_BYTES = 1024  # Respuestas más pequeñas se envían sin comprimir
+    COMPRESION_NIVEL = 6
+    CACHE_CONTROL = {
+        "/grados": "public, max-age=300",
+        "/costos": "public, max-age=300",
+        "/requisitos/<grado>": "public, max-age=300",
+        "/health": "public, max-age=5",
+        "/health/listo": "no-store",
+        "/historial/<session_id>": "private, no-cache",
+        "/documentos/<session_id>": "private, no-cache",
+        "/eventos/<session_id>": "private, no-store",
+    }
+    
+    # Configuración del servidor ASGI (asgi.py)
+    ASGI_HILOS_DB = 16  # Peticiones que solo consultan o escriben en SQLite
+    ASGI_HILOS_ARCHIVOS = 4  # Peticiones que escriben documentos en disco
+    ASGI_CUERPO_EN_MEMORIA = 1024 * 1024  # Cuerpos más grandes se guardan en un archivo temporal
+    ASGI_UMBRAL_ARCHIVOS = 64 * 1024  # Cuerpos más grandes (subidas) se atienden en el pool de archivos
+    ASGI_HOLGURA_JSON = 4 * 1024 * 1024  # Campos del JSON y escapes ("\/") alrededor de los archivos en base64
+    
+    # Configuración del procesamiento por lotes (lotes_conversacion.py y /chatbot-lote)
+    LOTE_HILOS = 4  # Sesiones procesadas en paralelo
+    LOTE_MAX_CONVERSACIONES = 500
+    LOTE_MAX_MENSAJES = 5000  # Mensajes en total por lote
+    
+    # Configuración de eventos por sesión (eventos_sesion.py y /eventos/<session_id>)
+    EVENTOS_HISTORIAL = 50  # Últimos eventos guardados por sesión para clientes que se reconectan
+    EVENTOS_MAX_SESIONES = 10000
+    EVENTOS_COLA_MAX = 100  # Eventos sin leer por cliente antes de descartar
+    EVENTOS_ESPERA_SEGUNDOS = 25  # Long-poll; menor que el timeout de gunicorn
+    EVENTOS_SSE_DURACION_SEGUNDOS = 300  # El flujo se cierra y el cliente se reconecta con Last-Event-ID
+    EVENTOS_SSE_KEEPALIVE_SEGUNDOS = 15
+    EVENTOS_SSE_REINTENTO_MS = 3000
+    EVENTOS_MAX_CONEXIONES = 8  # Conexiones en espera por proceso; cada una ocupa un hilo (menos que ASGI_HILOS_DB y GUNICORN_THREADS)
+    
+    # Configuración de límites de uso por sesión e IP (limite_peticiones.py)
+    LIMITES_ACTIVOS = os.environ.get('LIMITES_ACTIVOS', '1') != '0'
+    LIMITE_BACKEND = os.environ.get('LIMITE_BACKEND', 'memoria')  # "memoria" (por proceso) o "sqlite" (compartido entre workers)
+    LIMITE_PROXIES_CONFIABLES = 1  # Proxies delante de la app (Render agrega uno a X-Forwarded-For)
+    LIMITE_MAX_CLAVES = 50000  # Cubetas en memoria antes de descartar las que ya están llenas
+    LIMITES = {  # presupuesto: (capacidad de la ráfaga, tokens recuperados por segundo)
+        "mensajes_sesion": (20, 0.5),  # 20 mensajes seguidos, luego 1 cada 2 segundos
+        "mensajes_ip": (120, 3.0),  # Varias familias pueden compartir IP (datos móviles, red del colegio)
+        "sesiones_ip": (20, 20 / 3600),  # 20 sesiones nuevas por hora
+        "bytes_subida_sesion": (MAX_BYTES_POR_PETICION * 2, 512 * 1024),
+        "bytes_subida_ip": (MAX_BYTES_POR_PETICION * 4, 2 * 1024 * 1024),
+    }
+    
+    # Configuración de las sondas de salud (salud.py y /health/listo)
+    SALUD_TTL_SEGUNDOS = 10  # Vigencia de las comprobaciones profundas; al vencer se renuevan en segundo plano
+    SALUD_TIMEOUT_DB_SEGUNDOS = 1  # Espera máxima por el lock de escritura de SQLite
+    SALUD_ESPACIO_LIBRE_MIN_MB = 200  # Debajo de esto la instancia deja de estar disponible
+
+    # Configuración del almacén de sesiones (almacen_sesiones.py)
+    SESION_BACKEND = os.environ.get('SESION_BACKEND', 'sqlite')  # "sqlite" (local) o "redis" (compartido entre instancias)
+    SESION_KV_URL = os.environ.get('SESION_KV_URL', 'redis://localhost:6379/0')
+    SESION_KV_PREFIJO = "barton:"
+    SESION_KV_TTL_SEGUNDOS = 30 * 24 * 3600  # Las sesiones sin escrituras vencen a los 30 días
+    SESION_KV_TIMEOUT_SEGUNDOS = 2
+    SESION_REINTENTOS_CONFLICTO = 2  # Reintentos de un mensaje cuando otra petición cambió la sesión
+
+    # Arranque rápido: el padrón se carga en un hilo de fondo y Pillow se importa con la primera imagen
+    ARRANQUE_RAPIDO = os.environ.get('ARRANQUE_RAPIDO', '0') != '0'
+
+    # Configuración de logs (bitacora.py)
+    LOG_NIVEL = os.environ.get('LOG_NIVEL', 'INFO')
+    LOG_FORMATO = os.environ.get('LOG_FORMATO', 'json')  # "json" o "texto"
+    LOG_COLA_MAX = 10000  # Registros en espera; si la cola está llena se descartan sin bloquear la petición
+    LOG_MUESTREO = {  # Fracción de eventos de nivel INFO o DEBUG que se registran; los avisos y errores no se muestrean
+        "mensaje_recibido": 1.0,
+        "respuesta_generada": 1.0,
+        "procesando_mensaje": 0.1,
+        "limite_excedido": 0.1,
+    }
+    
     # Configuración de costos (en soles)
     COSTOS_MATRICULA = {
         "matricula": 300,
@@ -66,6 +180,24 @@ class Config:
         "*"  # Permitir todos los orígenes para desarrollo
     ]
     
+    # Versión de la configuración; se incrementa con cada cambio en tiempo de ejecución
+    _version = 0
+    
+    @classmethod
+    def get_version(cls) -> int:
+        """Obtiene la versión actual de la configuración"""
+        return cls._version
+    
+    @classmethod
+    def actualizar(cls, **valores) -> int:
+        """Actualiza valores de configuración e invalida las respuestas memorizadas"""
+        for clave, valor in valores.items():
+            if not hasattr(cls, clave):
+                raise AttributeError(f"Configuración desconocida: {clave}")
+            setattr(cls, clave, valor)
+        cls._version += 1
+        return cls._version
+    
     @classmethod
     def get_database_path(cls) -> str:
         """Obtiene la ruta de la base de datos"""
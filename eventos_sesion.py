@@ -0,0 +1,145 @@
+"""
+Pub/sub en proceso de eventos por sesión (documento revisado, solicitud de asesor, estado de la matrícula).
+
+Los eventos se publican desde donde ocurren (revisores, registro de documentos, datos de contacto) y se
+entregan a los clientes suscritos por /eventos/<session_id> como Server-Sent Events o por long-poll.
+Cada sesión guarda sus últimos eventos para que un cliente que se reconecta reciba lo que se perdió.
+"""
+
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import Config
+
+
+class CanalEventos:
+    """Suscriptores e historial reciente de eventos por sesión"""
+
+    def __init__(self, historial: int = None, max_sesiones: int = None, max_cola: int = None):
+        self.historial = historial or Config.EVENTOS_HISTORIAL
+        self.max_sesiones = max_sesiones or Config.EVENTOS_MAX_SESIONES
+        self.max_cola = max_cola or Config.EVENTOS_COLA_MAX
+        self.recientes: "OrderedDict[str, deque]" = OrderedDict()
+        self.suscriptores: Dict[str, List[queue.Queue]] = {}
+        # Los ids parten de la hora en milisegundos para seguir creciendo después de un reinicio
+        self.ids = itertools.count(int(time.time() * 1000))
+        self.lock = threading.Lock()
+
+    def publicar(self, session_id: str, tipo: str, datos: Dict[str, Any]) -> Dict[str, Any]:
+        """Publica un evento para la sesión; nunca bloquea a quien publica"""
+        if not session_id:
+            return None
+        with self.lock:
+            # El id se asigna con el lock tomado para que el historial quede ordenado
+            evento = {"id": next(self.ids), "tipo": tipo, "datos": datos, "fecha": time.time()}
+            recientes = self.recientes.get(session_id)
+            if recientes is None:
+                recientes = self.recientes[session_id] = deque(maxlen=self.historial)
+                # Las sesiones sin actividad reciente son las primeras en descartarse
+                while len(self.recientes) > self.max_sesiones:
+                    self.recientes.popitem(last=False)
+            else:
+                self.recientes.move_to_end(session_id)
+            recientes.append(evento)
+            colas = list(self.suscriptores.get(session_id, ()))
+
+        for cola in colas:
+            try:
+                cola.put_nowait(evento)
+            except queue.Full:
+                # Un cliente que no lee no frena a los demás; al reconectarse recupera el historial
+                pass
+        return evento
+
+    def suscribir(self, session_id: str) -> queue.Queue:
+        cola = queue.Queue(self.max_cola)
+        with self.lock:
+            self.suscriptores.setdefault(session_id, []).append(cola)
+        return cola
+
+    def desuscribir(self, session_id: str, cola: queue.Queue):
+        with self.lock:
+            colas = self.suscriptores.get(session_id, [])
+            if cola in colas:
+                colas.remove(cola)
+            if not colas:
+                self.suscriptores.pop(session_id, None)
+
+    def conexiones(self) -> int:
+        with self.lock:
+            return sum(len(colas) for colas in self.suscriptores.values())
+
+    def eventos_desde(self, session_id: str, desde: int = 0) -> List[Dict[str, Any]]:
+        """Eventos guardados de la sesión con id mayor a desde"""
+        with self.lock:
+            return [evento for evento in self.recientes.get(session_id, ()) if evento["id"] > desde]
+
+    def esperar(self, session_id: str, desde: int = 0, espera: float = None) -> List[Dict[str, Any]]:
+        """Long-poll: retorna los eventos pendientes o espera hasta que llegue uno"""
+        cola = self.suscribir(session_id)
+        try:
+            # La suscripción va antes de revisar el historial para no perder un evento entre ambos pasos
+            eventos = self.eventos_desde(session_id, desde)
+            if eventos:
+                return eventos
+            try:
+                evento = cola.get(timeout=espera if espera is not None else Config.EVENTOS_ESPERA_SEGUNDOS)
+            except queue.Empty:
+                return []
+            return [evento] + [e for e in self.drenar(cola) if e["id"] > evento["id"]]
+        finally:
+            self.desuscribir(session_id, cola)
+
+    @staticmethod
+    def drenar(cola: queue.Queue) -> List[Dict[str, Any]]:
+        eventos = []
+        while True:
+            try:
+                eventos.append(cola.get_nowait())
+            except queue.Empty:
+                return eventos
+
+    def transmitir(self, session_id: str, desde: int = 0, duracion: float = None) -> Iterator[str]:
+        """Genera el flujo Server-Sent Events de la sesión; se cierra tras la duración máxima y el cliente se reconecta"""
+        cola = self.suscribir(session_id)
+        limite = time.monotonic() + (duracion if duracion is not None else Config.EVENTOS_SSE_DURACION_SEGUNDOS)
+        try:
+            # Indica al navegador cuánto esperar antes de reconectarse
+            yield f"retry: {Config.EVENTOS_SSE_REINTENTO_MS}\n\n"
+            ultimo = desde
+            for evento in self.eventos_desde(session_id, desde):
+                ultimo = evento["id"]
+                yield formatear_sse(evento)
+            while True:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return
+                try:
+                    evento = cola.get(timeout=min(restante, Config.EVENTOS_SSE_KEEPALIVE_SEGUNDOS))
+                except queue.Empty:
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": keepalive\n\n"
+                    continue
+                if evento["id"] > ultimo:
+                    ultimo = evento["id"]
+                    yield formatear_sse(evento)
+        finally:
+            self.desuscribir(session_id, cola)
+
+
+def formatear_sse(evento: Dict[str, Any]) -> str:
+    datos = json.dumps(evento["datos"], ensure_ascii=False, default=str)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+def publicar_evento(session_id: str, tipo: str, /, **datos) -> Optional[Dict[str, Any]]:
+    return canal_eventos.publicar(session_id, tipo, datos)
+
+
+# Canal global del proceso
+canal_eventos = CanalEventos()
@@ -0,0 +1,59 @@
+"""
+Configuración de gunicorn; se carga sola desde el directorio de trabajo:
+
+    gunicorn wsgi:app
+
+Con preload_app la aplicación se importa una vez en el proceso maestro: ahí se crea o actualiza el
+esquema de la base de datos y se cargan el padrón de alumnos y el modelo de intenciones. Los workers
+nacen por fork y comparten esas páginas de memoria mientras nadie las modifique (copy-on-write).
+
+- Ninguna conexión SQLite queda abierta en el maestro: el código abre una conexión por operación,
+  así cada worker usa conexiones creadas después del fork.
+- Los hilos de fondo (revisión, normalización, escritura de logs) se inician dentro de cada worker,
+  nunca en el maestro. Los revisores de documentos arrancan al cargar el worker (post_worker_init), así
+  los documentos pendientes de antes de un reinicio se revisan sin esperar una nueva subida.
+- Con arranque rápido (ARRANQUE_RAPIDO=1) el padrón y Pillow se cargan en un hilo de fondo después de
+  importar la aplicación; por eso el preload queda desactivado salvo que GUNICORN_PRELOAD lo pida. Si se
+  combinan, el fork espera a que termine la carga del padrón.
+- El recolector de basura se pausa durante la carga y los objetos del maestro se congelan con
+  gc.freeze() antes de cada fork: así las recolecciones de los workers no escriben en los encabezados
+  de esos objetos y sus páginas siguen compartidas.
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+threads = int(os.environ.get("GUNICORN_THREADS", "1"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+arranque_rapido = os.environ.get("ARRANQUE_RAPIDO", "0") != "0"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0" if arranque_rapido else "1") != "0"
+
+if preload_app:
+    # Sin recolecciones mientras se importa la aplicación en el maestro
+    gc.disable()
+
+
+def when_ready(server):
+    """El maestro terminó de cargar la aplicación y está por crear los workers"""
+    if preload_app:
+        gc.freeze()
+        gc.enable()
+    server.log.info("Maestro listo (preload=%s, workers=%s, threads=%s)", preload_app, workers, threads)
+
+
+def pre_fork(server, worker):
+    # Lo que el maestro creó desde el último fork también queda fuera de las recolecciones de los workers
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info("Worker iniciado (pid: %s)", worker.pid)
+
+
+def post_worker_init(worker):
+    """El worker ya cargó la aplicación (y aplicó las migraciones): inicia los revisores de documentos"""
+    from revision_documentos import revisor_documentos
+    revisor_documentos.iniciar()
@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import Config
+
+
+class _Entrada:
+    """Respuesta registrada para una clave de idempotencia"""
+
+    __slots__ = ("expira", "listo", "respuesta")
+
+    def __init__(self, expira: float):
+        self.expira = expira
+        self.listo = threading.Event()
+        self.respuesta = None
+
+
+class CacheIdempotencia:
+    """Cache en memoria con TTL corto que devuelve la misma respuesta a los reintentos del cliente"""
+
+    def __init__(self, ttl_segundos: float = None, max_entradas: int = None):
+        self.ttl_segundos = ttl_segundos or Config.IDEMPOTENCIA_TTL_SEGUNDOS
+        self.max_entradas = max_entradas or Config.IDEMPOTENCIA_MAX_ENTRADAS
+        self.entradas: Dict[str, _Entrada] = {}
+        self.lock = threading.Lock()
+
+    def _purgar(self, ahora: float):
+        """Elimina las entradas vencidas (se llama con el lock tomado)"""
+        vencidas = [clave for clave, entrada in self.entradas.items()
+                    if entrada.expira <= ahora and entrada.listo.is_set()]
+        for clave in vencidas:
+            del self.entradas[clave]
+
+    def ejecutar(self, clave: str, funcion: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Ejecuta la función una sola vez por clave; retorna (respuesta, es_repetida)"""
+        while True:
+            ahora = time.monotonic()
+            with self.lock:
+                entrada = self.entradas.get(clave)
+                if entrada is not None and entrada.listo.is_set() and entrada.expira <= ahora:
+                    del self.entradas[clave]
+                    entrada = None
+                if entrada is None:
+                    if len(self.entradas) >= self.max_entradas:
+                        self._purgar(ahora)
+                    propia = _Entrada(ahora + self.ttl_segundos)
+                    # Si la cache sigue llena se procesa sin registrar la clave
+                    if len(self.entradas) < self.max_entradas:
+                        self.entradas[clave] = propia
+                    break
+
+            # Otro hilo está procesando la misma petición: esperar su resultado
+            entrada.listo.wait(Config.IDEMPOTENCIA_ESPERA_SEGUNDOS)
+            if entrada.respuesta is not None:
+                return entrada.respuesta, True
+
+            # La petición original falló o tardó demasiado; reintentar como nueva
+            with self.lock:
+                if self.entradas.get(clave) is entrada and entrada.listo.is_set():
+                    del self.entradas[clave]
+            if not entrada.listo.is_set():
+                return funcion(), False
+
+        try:
+            propia.respuesta = funcion()
+            return propia.respuesta, False
+        except Exception:
+            with self.lock:
+                if self.entradas.get(clave) is propia:
+                    del self.entradas[clave]
+            raise
+        finally:
+            propia.listo.set()
+
+
+def calcular_clave(session_id: Optional[str], clave_cliente: Optional[str], cuerpo: bytes,
+                   leer_sesion: Callable[[], Optional[Dict[str, Any]]] = None) -> Optional[str]:
+    """Obtiene la clave de idempotencia: la del cliente o, si IDEMPOTENCIA_CLAVE_DERIVADA está activo,
+    un hash del cuerpo y del estado y la versión de la sesión leídos al recibir la petición.
+
+    Con el estado en la clave, el mismo mensaje en dos turnos seguidos ("1" en dos menús) no se confunde
+    con un reintento; solo coinciden los reintentos que llegan antes de que el original cambie la sesión.
+    """
+    if clave_cliente:
+        return hashlib.sha256(f"{session_id or ''}|{clave_cliente}".encode('utf-8')).hexdigest()
+    # Sin sesión cada petición crea una nueva, no hay forma segura de reconocer un reintento
+    if not session_id or not Config.IDEMPOTENCIA_CLAVE_DERIVADA or leer_sesion is None:
+        return None
+    sesion = leer_sesion() or {}
+    turno = f"{sesion.get('estado')}|{sesion.get('version')}|".encode('utf-8')
+    return hashlib.sha256(turno + cuerpo).hexdigest()
+
+
+# Instancia global de la cache de idempotencia
+cache_idempotencia = CacheIdempotencia()
@@ -0,0 +1,245 @@
+"""
+Límites de uso con cubetas de tokens por sesión e IP.
+
+Cada presupuesto de Config.LIMITES tiene una capacidad (la ráfaga permitida) y una velocidad de
+recuperación. Una petición consume de varias cubetas a la vez (por ejemplo, mensajes de la sesión
+y de la IP); si alguna no alcanza no se consume de ninguna y se responde 429 con Retry-After. Una
+petición que cuesta más que la capacidad de una cubeta (un lote enorme) nunca alcanzaría: se rechaza
+con 413 sin consumir nada.
+
+El estado vive en memoria del proceso o, con LIMITE_BACKEND=sqlite, en la tabla limites_tokens
+de la base de datos para que todos los workers de gunicorn compartan los mismos presupuestos.
+"""
+
+import math
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, request, jsonify
+
+from config import Config
+from metricas import rechazos_limite
+from bitacora import obtener_bitacora
+
+bitacora = obtener_bitacora("limites")
+
+# (presupuesto, clave, costo)
+Solicitud = Tuple[str, str, float]
+
+
+class ExcedeCapacidad(Exception):
+    """El costo de la petición supera la capacidad de un presupuesto: esperar no alcanza"""
+
+    def __init__(self, presupuesto: str, costo: float, capacidad: float):
+        super().__init__(f"El envío excede el límite de uso ({presupuesto}: {costo:g} de un máximo de "
+                         f"{capacidad:g}); divídelo en envíos más pequeños")
+        self.presupuesto = presupuesto
+        self.costo = costo
+        self.capacidad = capacidad
+
+
+def recargar(tokens: float, actualizado: float, ahora: float, capacidad: float, por_segundo: float) -> float:
+    """Tokens disponibles después de recuperar los del tiempo transcurrido"""
+    return min(capacidad, tokens + max(0.0, ahora - actualizado) * por_segundo)
+
+
+def evaluar(presupuestos: Dict[str, Tuple[float, float]], solicitudes: List[Solicitud],
+            estados: Dict[str, Tuple[float, float]], ahora: float) -> Tuple[float, Optional[str], Dict[str, float]]:
+    """Calcula la espera necesaria y, si no hay que esperar, los tokens que quedan en cada cubeta.
+
+    estados tiene (tokens, actualizado) por clave de cubeta; las que no aparecen están llenas.
+    Lanza ExcedeCapacidad si algún costo supera la capacidad de su presupuesto.
+    """
+    espera = 0.0
+    agotado = None
+    restantes: Dict[str, float] = {}
+    for presupuesto, clave, costo in solicitudes:
+        capacidad, por_segundo = presupuestos[presupuesto]
+        # Un costo mayor a la capacidad nunca se alcanzaría: se rechaza antes de consumir de ninguna cubeta
+        if costo > capacidad:
+            raise ExcedeCapacidad(presupuesto, costo, capacidad)
+        cubeta = f"{presupuesto}:{clave}"
+        if cubeta in estados:
+            tokens = recargar(*estados[cubeta], ahora, capacidad, por_segundo)
+        else:
+            tokens = capacidad
+        if tokens < costo:
+            faltante = (costo - tokens) / por_segundo
+            if faltante > espera:
+                espera, agotado = faltante, presupuesto
+        restantes[cubeta] = tokens - costo
+    return espera, agotado, restantes
+
+
+class LimitadorMemoria:
+    """Cubetas en un diccionario del proceso; cada worker tiene sus propios presupuestos"""
+
+    def __init__(self, presupuestos: Dict[str, Tuple[float, float]] = None, max_claves: int = None):
+        self.presupuestos = presupuestos or Config.LIMITES
+        self.max_claves = max_claves or Config.LIMITE_MAX_CLAVES
+        self.cubetas: Dict[str, Tuple[float, float]] = {}
+        self.lock = threading.Lock()
+
+    def consumir(self, solicitudes: List[Solicitud]) -> Tuple[float, Optional[str]]:
+        """Consume de todas las cubetas o de ninguna; retorna los segundos de espera y el presupuesto agotado"""
+        ahora = time.monotonic()
+        with self.lock:
+            espera, agotado, restantes = evaluar(self.presupuestos, solicitudes, self.cubetas, ahora)
+            if espera == 0:
+                for cubeta, tokens in restantes.items():
+                    self.cubetas[cubeta] = (tokens, ahora)
+                if len(self.cubetas) > self.max_claves:
+                    self.podar(ahora)
+        return espera, agotado
+
+    def podar(self, ahora: float):
+        """Descarta las cubetas que ya se llenaron: equivalen a no tener entrada"""
+        for cubeta, (tokens, actualizado) in list(self.cubetas.items()):
+            capacidad, por_segundo = self.presupuestos[cubeta.split(":", 1)[0]]
+            if recargar(tokens, actualizado, ahora, capacidad, por_segundo) >= capacidad:
+                del self.cubetas[cubeta]
+
+
+class LimitadorSQLite:
+    """Cubetas en la tabla limites_tokens; la transacción inmediata serializa a los workers"""
+
+    def __init__(self, db_path: str = None, presupuestos: Dict[str, Tuple[float, float]] = None):
+        self.db_path = db_path or Config.get_database_path()
+        self.presupuestos = presupuestos or Config.LIMITES
+
+    def consumir(self, solicitudes: List[Solicitud]) -> Tuple[float, Optional[str]]:
+        """Consume de todas las cubetas o de ninguna; retorna los segundos de espera y el presupuesto agotado"""
+        # Hora del reloj del sistema: es la misma para todos los procesos
+        ahora = time.time()
+        cubetas = [f"{presupuesto}:{clave}" for presupuesto, clave, _ in solicitudes]
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'''
+                SELECT clave, tokens, actualizado FROM limites_tokens
+                WHERE clave IN ({",".join("?" * len(cubetas))})
+            ''', cubetas)
+            estados = {clave: (tokens, actualizado) for clave, tokens, actualizado in cursor.fetchall()}
+            espera, agotado, restantes = evaluar(self.presupuestos, solicitudes, estados, ahora)
+            if espera == 0:
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO limites_tokens (clave, tokens, actualizado) VALUES (?, ?, ?)
+                ''', [(cubeta, tokens, ahora) for cubeta, tokens in restantes.items()])
+                # De vez en cuando se borran las cubetas que ya se habrían llenado
+                if random.random() < 0.01:
+                    self.podar(cursor, ahora)
+            conn.commit()
+        finally:
+            conn.close()
+
+        return espera, agotado
+
+    def podar(self, cursor: sqlite3.Cursor, ahora: float):
+        for presupuesto, (capacidad, por_segundo) in self.presupuestos.items():
+            cursor.execute('''
+                DELETE FROM limites_tokens
+                WHERE substr(clave, 1, ?) = ? AND tokens + (? - actualizado) * ? >= ?
+            ''', (len(presupuesto) + 1, f"{presupuesto}:", ahora, por_segundo, capacidad))
+
+
+def crear_limitador():
+    if Config.LIMITE_BACKEND == "sqlite":
+        return LimitadorSQLite()
+    return LimitadorMemoria()
+
+
+def ip_cliente() -> str:
+    """IP del cliente; detrás de proxies se toma la que agregó el último proxy confiable"""
+    saltos = Config.LIMITE_PROXIES_CONFIABLES
+    reenviadas = [ip.strip() for ip in request.headers.get("X-Forwarded-For", "").split(",") if ip.strip()]
+    # Las entradas anteriores las escribe el cliente y se pueden falsificar
+    if saltos and len(reenviadas) >= saltos:
+        return reenviadas[-saltos]
+    return request.remote_addr or "desconocida"
+
+
+def solicitudes_peticion() -> List[Solicitud]:
+    """Cubetas de las que consume la petición actual según su ruta"""
+    regla = request.url_rule.rule if request.url_rule else None
+    ip = ip_cliente()
+    bytes_cuerpo = request.content_length or 0
+
+    if regla == "/nueva-sesion":
+        return [("sesiones_ip", ip, 1)]
+
+    if regla == "/subir-documentos":
+        # El session_id llega dentro del formulario, que todavía no se leyó
+        return [("mensajes_ip", ip, 1), ("bytes_subida_ip", ip, bytes_cuerpo)]
+
+    if regla == "/chatbot-inteligente":
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return [("mensajes_ip", ip, 1)]
+        session_id = data.get("session_id")
+        solicitudes = [("mensajes_ip", ip, 1)]
+        if session_id:
+            solicitudes.append(("mensajes_sesion", str(session_id), 1))
+        else:
+            # Sin session_id el chatbot crea una sesión nueva
+            solicitudes.append(("sesiones_ip", ip, 1))
+        if data.get("archivos"):
+            solicitudes.append(("bytes_subida_ip", ip, bytes_cuerpo))
+            if session_id:
+                solicitudes.append(("bytes_subida_sesion", str(session_id), bytes_cuerpo))
+        return solicitudes
+
+    if regla == "/chatbot-lote":
+        data = request.get_json(silent=True)
+        conversaciones = data.get("conversaciones") if isinstance(data, dict) else None
+        if not isinstance(conversaciones, list):
+            return [("mensajes_ip", ip, 1)]
+        # Cada mensaje del lote cuenta como un mensaje y cada conversación sin sesión como una sesión nueva
+        mensajes = sum(len(c.get("mensajes") or []) for c in conversaciones if isinstance(c, dict))
+        nuevas = sum(1 for c in conversaciones if isinstance(c, dict) and not c.get("session_id"))
+        solicitudes = [("mensajes_ip", ip, max(1, mensajes))]
+        if nuevas:
+            solicitudes.append(("sesiones_ip", ip, nuevas))
+        return solicitudes
+
+    return []
+
+
+def registrar_limites(app: Flask, limitador=None):
+    """Aplica los límites de uso antes de atender cada POST de las rutas limitadas"""
+    limitador = limitador or crear_limitador()
+
+    @app.before_request
+    def aplicar_limites():
+        if not Config.LIMITES_ACTIVOS or request.method != "POST":
+            return None
+        solicitudes = solicitudes_peticion()
+        if not solicitudes:
+            return None
+
+        try:
+            espera, agotado = limitador.consumir(solicitudes)
+        except ExcedeCapacidad as e:
+            rechazos_limite.inc(e.presupuesto)
+            bitacora.info("limite_excedido", "⏳ Envío mayor que la capacidad del límite de uso",
+                          presupuesto=e.presupuesto, costo=e.costo, capacidad=e.capacidad,
+                          ip=ip_cliente(), ruta=request.path)
+            return jsonify({'error': str(e)}), 413
+        if espera == 0:
+            return None
+
+        segundos = max(1, math.ceil(espera))
+        rechazos_limite.inc(agotado)
+        bitacora.info("limite_excedido", "⏳ Límite de uso excedido", presupuesto=agotado,
+                      ip=ip_cliente(), ruta=request.path, retry_after=segundos)
+        respuesta = jsonify({'error': f'Demasiadas solicitudes. Intenta nuevamente en {segundos} segundos',
+                             'retry_after': segundos})
+        respuesta.status_code = 429
+        respuesta.headers['Retry-After'] = str(segundos)
+        return respuesta
+
+    return limitador
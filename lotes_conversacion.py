@@ -0,0 +1,123 @@
+"""
+Procesamiento por lotes de conversaciones completas: reproducción de guiones de QA e importación
+de matrículas presenciales con el mismo flujo del chatbot, sin una petición HTTP por mensaje.
+
+    from lotes_conversacion import procesar_lote
+    resultados = procesar_lote([
+        {"mensajes": ["hola", "matrícula", "requisitos", "1er grado"]},
+        {"session_id": "...", "mensajes": ["asesor", "María Quispe 987654321"]},
+    ])
+"""
+
+import json
+import queue
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from config import Config
+from bitacora import obtener_bitacora
+
+bitacora = obtener_bitacora("lotes")
+
+
+class LoteInvalido(Exception):
+    """El lote no cumple el formato o los límites de Config.LOTE_*"""
+
+
+def validar_lote(conversaciones: Any) -> List[Dict[str, Any]]:
+    """Valida el formato y los límites del lote; retorna las conversaciones normalizadas"""
+    if not isinstance(conversaciones, list) or not conversaciones:
+        raise LoteInvalido("Se requiere una lista de conversaciones")
+    if len(conversaciones) > Config.LOTE_MAX_CONVERSACIONES:
+        raise LoteInvalido(f"Demasiadas conversaciones. Máximo {Config.LOTE_MAX_CONVERSACIONES} por lote")
+
+    normalizadas = []
+    total_mensajes = 0
+    for indice, conversacion in enumerate(conversaciones):
+        if not isinstance(conversacion, dict) or not isinstance(conversacion.get("mensajes"), list):
+            raise LoteInvalido(f"La conversación {indice} debe tener una lista de mensajes")
+        mensajes = conversacion["mensajes"]
+        for mensaje in mensajes:
+            if not isinstance(mensaje, str) or not mensaje:
+                raise LoteInvalido(f"La conversación {indice} tiene un mensaje vacío o que no es texto")
+            if len(mensaje) > Config.MAX_MESSAGE_LENGTH:
+                raise LoteInvalido(f"La conversación {indice} tiene un mensaje demasiado largo. "
+                                   f"Máximo {Config.MAX_MESSAGE_LENGTH} caracteres")
+        total_mensajes += len(mensajes)
+        normalizadas.append({"session_id": conversacion.get("session_id") or None, "mensajes": mensajes})
+
+    if total_mensajes > Config.LOTE_MAX_MENSAJES:
+        raise LoteInvalido(f"Demasiados mensajes. Máximo {Config.LOTE_MAX_MENSAJES} por lote")
+    return normalizadas
+
+
+def agrupar_por_sesion(conversaciones: List[Dict[str, Any]]) -> List[List[int]]:
+    """Agrupa los índices de las conversaciones de una misma sesión para procesarlas en orden y en un solo hilo"""
+    grupos: "OrderedDict[Any, List[int]]" = OrderedDict()
+    for indice, conversacion in enumerate(conversaciones):
+        # Las conversaciones sin sesión crean la suya y son independientes entre sí
+        clave = conversacion["session_id"] or ("nueva", indice)
+        grupos.setdefault(clave, []).append(indice)
+    return list(grupos.values())
+
+
+def procesar_lote(conversaciones: List[Dict[str, Any]], hilos: int = None, chatbot=None) -> List[Dict[str, Any]]:
+    """Procesa muchas conversaciones; las sesiones independientes se reparten entre hilos.
+
+    Cada hilo toma una conexión del pool y la reutiliza para todas las conversaciones que procesa.
+    Retorna un resultado por conversación, en el orden recibido: session_id y respuestas, o el error.
+    """
+    if chatbot is None:
+        from chatbot_inteligente import chatbot
+
+    conversaciones = validar_lote(conversaciones)
+    grupos = agrupar_por_sesion(conversaciones)
+    hilos = max(1, min(hilos or Config.LOTE_HILOS, len(grupos)))
+    resultados: List[Optional[Dict[str, Any]]] = [None] * len(conversaciones)
+
+    # Una conexión por hilo; se reparten a través de una cola porque el pool puede cambiar de hilo
+    conexiones: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+    for _ in range(hilos):
+        conexiones.put(sqlite3.connect(chatbot.db_path, check_same_thread=False))
+
+    def procesar_grupo(indices: List[int]):
+        conexion = conexiones.get()
+        try:
+            for indice in indices:
+                conversacion = conversaciones[indice]
+                try:
+                    resultados[indice] = chatbot.procesar_conversacion(
+                        conversacion["mensajes"], conversacion["session_id"], conexion)
+                except Exception as e:
+                    bitacora.exception("error_lote", f"❌ Error procesando la conversación {indice}: {e}",
+                                       indice=indice, session_id=conversacion["session_id"])
+                    resultados[indice] = {"session_id": conversacion["session_id"], "error": str(e)}
+        finally:
+            conexiones.put(conexion)
+
+    inicio = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="lote-conversaciones") as pool:
+            list(pool.map(procesar_grupo, grupos))
+    finally:
+        while not conexiones.empty():
+            conexiones.get_nowait().close()
+
+    bitacora.info("lote_procesado", "✅ Lote de conversaciones procesado",
+                  conversaciones=len(conversaciones), mensajes=sum(len(c["mensajes"]) for c in conversaciones),
+                  errores=sum(1 for resultado in resultados if "error" in resultado), hilos=hilos,
+                  duracion_s=round(time.perf_counter() - inicio, 3))
+    return resultados
+
+
+if __name__ == "__main__":
+    # Uso: python lotes_conversacion.py conversaciones.json > resultados.json
+    with open(sys.argv[1], encoding="utf-8") as archivo:
+        datos = json.load(archivo)
+    json.dump(procesar_lote(datos.get("conversaciones", datos) if isinstance(datos, dict) else datos),
+              sys.stdout, ensure_ascii=False, indent=2)
+    print()
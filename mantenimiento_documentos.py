@@ -0,0 +1,216 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import zipfile
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict
+
+from config import Config
+from almacenamiento_documentos import (
+    ruta_blob, es_ruta_archivada, calcular_sha256, registrar_blobs, guardar_blobs, descartar_archivos, SEPARADOR_ARCHIVO
+)
+
+
+def migrar_blobs(db_path: str = None, tamano_lote: int = None) -> Dict[str, int]:
+    """Mueve los blobs de la carpeta plana a subcarpetas por prefijo del hash, por lotes"""
+    db_path = db_path or Config.get_database_path()
+    tamano_lote = tamano_lote or Config.TAMANO_LOTE_MIGRACION
+    conteo = {"movidos": 0, "faltantes": 0}
+    ultimo_rowid = 0
+
+    while True:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                SELECT rowid, sha256, ruta_archivo FROM blobs
+                WHERE rowid > ? ORDER BY rowid LIMIT ?
+            ''', (ultimo_rowid, tamano_lote))
+            filas = cursor.fetchall()
+            if not filas:
+                break
+
+            for rowid, sha256, ruta in filas:
+                ultimo_rowid = rowid
+                nueva_ruta = ruta_blob(sha256)
+                if ruta == nueva_ruta or es_ruta_archivada(ruta):
+                    continue
+                # Si una ejecución anterior movió el archivo pero no llegó al commit, solo se actualiza la fila
+                if os.path.exists(ruta):
+                    os.makedirs(os.path.dirname(nueva_ruta), exist_ok=True)
+                    os.replace(ruta, nueva_ruta)
+                elif not os.path.exists(nueva_ruta):
+                    conteo["faltantes"] += 1
+                    continue
+                cursor.execute('UPDATE blobs SET ruta_archivo = ? WHERE sha256 = ?', (nueva_ruta, sha256))
+                cursor.execute('UPDATE documentos SET ruta_archivo = ? WHERE blob_sha256 = ?', (nueva_ruta, sha256))
+                conteo["movidos"] += 1
+
+            conn.commit()
+        finally:
+            conn.close()
+
+    return conteo
+
+
+def migrar_documentos_sin_blob(db_path: str = None, tamano_lote: int = None) -> Dict[str, int]:
+    """Convierte los documentos guardados antes de los blobs (un archivo por documento) en blobs, por lotes"""
+    db_path = db_path or Config.get_database_path()
+    tamano_lote = tamano_lote or Config.TAMANO_LOTE_MIGRACION
+    conteo = {"migrados": 0, "faltantes": 0}
+    ultimo_rowid = 0
+
+    while True:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        originales = []
+        documentos = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                SELECT rowid, id, ruta_archivo FROM documentos
+                WHERE blob_sha256 IS NULL AND rowid > ? ORDER BY rowid LIMIT ?
+            ''', (ultimo_rowid, tamano_lote))
+            filas = cursor.fetchall()
+            if not filas:
+                break
+
+            for rowid, doc_id, ruta in filas:
+                ultimo_rowid = rowid
+                if not ruta or not os.path.exists(ruta):
+                    conteo["faltantes"] += 1
+                    continue
+
+                # El original se conserva hasta el commit: el blob se crea a partir de una copia
+                copia = f"{Config.get_upload_folder()}/.tmp-{doc_id}"
+                try:
+                    os.link(ruta, copia)
+                except OSError:
+                    shutil.copy2(ruta, copia)
+                documento = {
+                    "sha256": calcular_sha256(ruta),
+                    "tamano": os.path.getsize(ruta),
+                    "ruta_temporal": copia,
+                }
+                documentos.append(documento)
+                registrar_blobs(cursor, [documento])
+                cursor.execute('''
+                    UPDATE documentos SET ruta_archivo = ?, blob_sha256 = ? WHERE id = ?
+                ''', (documento["ruta"], documento["sha256"], doc_id))
+                originales.append(ruta)
+                conteo["migrados"] += 1
+
+            conn.commit()
+            guardar_blobs(documentos)
+        except Exception:
+            descartar_archivos(documentos)
+            raise
+        finally:
+            conn.close()
+
+        for ruta in originales:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    return conteo
+
+
+def archivar_sesiones_cerradas(db_path: str = None, horas: int = None, tamano_lote: int = None) -> Dict[str, int]:
+    """Comprime en un .zip por día los documentos que solo pertenecen a sesiones cerradas.
+
+    Una sesión está cerrada si ya no existe o no tuvo actividad en las últimas horas indicadas
+    (por defecto SESSION_TIMEOUT_HOURS). Los blobs compartidos con una sesión activa no se archivan.
+    Con SESION_BACKEND=redis las sesiones no están en SQLite y cuenta la fecha del último documento.
+    """
+    db_path = db_path or Config.get_database_path()
+    tamano_lote = tamano_lote or Config.TAMANO_LOTE_MIGRACION
+    limite = datetime.now() - timedelta(hours=horas if horas is not None else Config.SESSION_TIMEOUT_HOURS)
+    carpeta_archivo = f"{Config.get_upload_folder()}/{Config.CARPETA_ARCHIVO}"
+    conteo = {"archivados": 0, "faltantes": 0, "archivos_zip": 0}
+    ultimo_sha256 = ""
+    dias_usados = set()
+    if Config.SESION_BACKEND == "sqlite":
+        cerrado = "SUM(CASE WHEN s.id IS NOT NULL AND s.fecha_actualizacion >= ? THEN 1 ELSE 0 END) = 0"
+    else:
+        cerrado = "MAX(d.fecha_subida) < ?"
+
+    while True:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        archivados = []
+        try:
+            # El lock se mantiene mientras se escribe el lote para que ninguna subida reutilice un blob a medio archivar
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'''
+                SELECT b.sha256, b.ruta_archivo, MIN(d.fecha_subida)
+                FROM blobs b
+                JOIN documentos d ON d.blob_sha256 = b.sha256
+                LEFT JOIN sesiones s ON s.id = d.sesion_id
+                WHERE b.sha256 > ? AND b.ruta_archivo NOT LIKE ?
+                GROUP BY b.sha256
+                HAVING {cerrado}
+                ORDER BY b.sha256
+                LIMIT ?
+            ''', (ultimo_sha256, f"%{SEPARADOR_ARCHIVO}%", limite, tamano_lote))
+            filas = cursor.fetchall()
+            if not filas:
+                break
+
+            por_dia = defaultdict(list)
+            for sha256, ruta, fecha_subida in filas:
+                ultimo_sha256 = sha256
+                if not os.path.exists(ruta):
+                    conteo["faltantes"] += 1
+                    continue
+                por_dia[str(fecha_subida)[:10]].append((sha256, ruta))
+
+            os.makedirs(carpeta_archivo, exist_ok=True)
+            for dia, blobs in por_dia.items():
+                ruta_zip = f"{carpeta_archivo}/{dia}.zip"
+                with zipfile.ZipFile(ruta_zip, "a", compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+                    existentes = set(archivo_zip.namelist())
+                    for sha256, ruta in blobs:
+                        if sha256 not in existentes:
+                            archivo_zip.write(ruta, arcname=sha256)
+                dias_usados.add(dia)
+
+                for sha256, ruta in blobs:
+                    nueva_ruta = f"{ruta_zip}{SEPARADOR_ARCHIVO}{sha256}"
+                    cursor.execute('UPDATE blobs SET ruta_archivo = ? WHERE sha256 = ?', (nueva_ruta, sha256))
+                    cursor.execute('UPDATE documentos SET ruta_archivo = ? WHERE blob_sha256 = ?', (nueva_ruta, sha256))
+                    archivados.append(ruta)
+
+            conn.commit()
+        finally:
+            conn.close()
+
+        # Los originales se borran solo después del commit
+        for ruta in archivados:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        conteo["archivados"] += len(archivados)
+
+    conteo["archivos_zip"] = len(dias_usados)
+    return conteo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de la carpeta de documentos")
+    parser.add_argument("accion", choices=["migrar", "archivar"],
+                        help="migrar: mover a subcarpetas por hash; archivar: comprimir documentos de sesiones cerradas")
+    parser.add_argument("--lote", type=int, default=None, help="Filas por transacción")
+    parser.add_argument("--horas", type=int, default=None, help="Horas sin actividad para considerar cerrada una sesión")
+    args = parser.parse_args()
+
+    if args.accion == "migrar":
+        conteo = migrar_blobs(tamano_lote=args.lote)
+        print(f"✅ Blobs movidos a subcarpetas: {conteo['movidos']} (faltantes: {conteo['faltantes']})")
+        conteo = migrar_documentos_sin_blob(tamano_lote=args.lote)
+        print(f"✅ Documentos antiguos migrados: {conteo['migrados']} (faltantes: {conteo['faltantes']})")
+    else:
+        conteo = archivar_sesiones_cerradas(horas=args.horas, tamano_lote=args.lote)
+        print(f"✅ Documentos archivados: {conteo['archivados']} en {conteo['archivos_zip']} archivos .zip "
+              f"(faltantes: {conteo['faltantes']})")
@@ -0,0 +1,234 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from flask import Flask, request
+
+# Límites de los histogramas (segundos y bytes)
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class RegistroMetricas:
+    """Registro de métricas con un fragmento por hilo.
+
+    Cada hilo escribe solo en su propio diccionario, así el camino caliente no toma locks;
+    el lock solo se usa al registrar un hilo nuevo y al exportar.
+    """
+
+    def __init__(self):
+        self.metricas: Dict[str, Tuple[str, str, Tuple[str, ...], Tuple[float, ...]]] = {}
+        self.local = threading.local()
+        self.fragmentos: List[Tuple[threading.Thread, Dict]] = []
+        # Valores de los hilos que ya terminaron
+        self.retirados: Dict[Tuple, Any] = {}
+        self.lock = threading.Lock()
+
+    def fragmento(self) -> Dict:
+        """Retorna el fragmento del hilo actual, creándolo la primera vez"""
+        try:
+            return self.local.fragmento
+        except AttributeError:
+            fragmento = {}
+            self.local.fragmento = fragmento
+            with self.lock:
+                self.fragmentos.append((threading.current_thread(), fragmento))
+            return fragmento
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()) -> "Contador":
+        self.metricas[nombre] = ("counter", ayuda, etiquetas, ())
+        return Contador(self, nombre)
+
+    def gauge(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()) -> "Contador":
+        self.metricas[nombre] = ("gauge", ayuda, etiquetas, ())
+        return Contador(self, nombre)
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = (),
+                   buckets: Tuple[float, ...] = BUCKETS_LATENCIA) -> "Histograma":
+        self.metricas[nombre] = ("histogram", ayuda, etiquetas, buckets)
+        return Histograma(self, nombre, buckets)
+
+    @staticmethod
+    def sumar(destino: Dict, origen: Dict):
+        """Suma los valores de un fragmento en otro"""
+        for clave, valor in origen.items():
+            if isinstance(valor, list):
+                acumulado = destino.setdefault(clave, [0] * len(valor))
+                for indice, cantidad in enumerate(valor):
+                    acumulado[indice] += cantidad
+            else:
+                destino[clave] = destino.get(clave, 0) + valor
+
+    def consolidar(self) -> Dict:
+        """Suma los fragmentos de todos los hilos; los de hilos terminados se pasan a retirados"""
+        total: Dict = {}
+        with self.lock:
+            vivos = []
+            for hilo, fragmento in self.fragmentos:
+                # dict() copia el fragmento sin soltar el GIL
+                copia = {clave: list(valor) if isinstance(valor, list) else valor
+                         for clave, valor in dict(fragmento).items()}
+                if hilo.is_alive():
+                    vivos.append((hilo, fragmento))
+                    self.sumar(total, copia)
+                else:
+                    self.sumar(self.retirados, copia)
+            self.fragmentos = vivos
+            self.sumar(total, self.retirados)
+        return total
+
+    def exportar(self) -> str:
+        """Exporta todas las métricas en el formato de texto de Prometheus"""
+        valores = self.consolidar()
+        por_metrica: Dict[str, List] = {}
+        for (nombre, etiquetas), valor in valores.items():
+            por_metrica.setdefault(nombre, []).append((etiquetas, valor))
+
+        lineas = []
+        for nombre, (tipo, ayuda, nombres_etiquetas, buckets) in self.metricas.items():
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for etiquetas, valor in sorted(por_metrica.get(nombre, []), key=lambda item: item[0]):
+                pares = [f'{clave}="{escapar(str(v))}"' for clave, v in zip(nombres_etiquetas, etiquetas)]
+                if tipo != "histogram":
+                    lineas.append(f"{nombre}{formatear_etiquetas(pares)} {valor}")
+                    continue
+                acumulado = 0
+                for limite, cantidad in zip(buckets + (float("inf"),), valor):
+                    acumulado += cantidad
+                    le = "+Inf" if limite == float("inf") else repr(limite)
+                    par_le = f'le="{le}"'
+                    lineas.append(f"{nombre}_bucket{formatear_etiquetas(pares + [par_le])} {acumulado}")
+                lineas.append(f"{nombre}_sum{formatear_etiquetas(pares)} {valor[-2]}")
+                lineas.append(f"{nombre}_count{formatear_etiquetas(pares)} {valor[-1]}")
+        return "\n".join(lineas) + "\n"
+
+
+def escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def formatear_etiquetas(pares: List[str]) -> str:
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Contador:
+    """Contador o gauge; los valores de las etiquetas se pasan en el orden declarado"""
+
+    __slots__ = ("registro", "nombre")
+
+    def __init__(self, registro: RegistroMetricas, nombre: str):
+        self.registro = registro
+        self.nombre = nombre
+
+    def inc(self, *etiquetas, valor: float = 1):
+        fragmento = self.registro.fragmento()
+        clave = (self.nombre, etiquetas)
+        fragmento[clave] = fragmento.get(clave, 0) + valor
+
+    def dec(self, *etiquetas, valor: float = 1):
+        self.inc(*etiquetas, valor=-valor)
+
+
+class Histograma:
+    """Histograma con buckets fijos; guarda cantidades por bucket, suma y total"""
+
+    __slots__ = ("registro", "nombre", "buckets")
+
+    def __init__(self, registro: RegistroMetricas, nombre: str, buckets: Tuple[float, ...]):
+        self.registro = registro
+        self.nombre = nombre
+        self.buckets = buckets
+
+    def observe(self, valor: float, *etiquetas):
+        fragmento = self.registro.fragmento()
+        clave = (self.nombre, etiquetas)
+        conteos = fragmento.get(clave)
+        if conteos is None:
+            # Un conteo por bucket más +Inf, luego suma y total
+            conteos = fragmento[clave] = [0] * (len(self.buckets) + 3)
+        conteos[bisect_left(self.buckets, valor)] += 1
+        conteos[-2] += valor
+        conteos[-1] += 1
+
+
+# Registro global y métricas del sistema
+registro_metricas = RegistroMetricas()
+
+peticiones_http = registro_metricas.contador(
+    "chatbot_http_peticiones_total", "Peticiones HTTP atendidas", ("ruta", "metodo", "codigo"))
+errores_http = registro_metricas.contador(
+    "chatbot_http_errores_total", "Peticiones HTTP que terminaron con error 5xx o excepción", ("ruta", "metodo"))
+duracion_http = registro_metricas.histograma(
+    "chatbot_http_duracion_segundos", "Latencia de las peticiones HTTP", ("ruta", "metodo"))
+en_curso_http = registro_metricas.gauge(
+    "chatbot_http_en_curso", "Peticiones HTTP en curso", ("ruta",))
+bytes_respuesta_http = registro_metricas.histograma(
+    "chatbot_http_respuesta_bytes", "Tamaño del cuerpo de las respuestas HTTP", ("ruta",), BUCKETS_BYTES)
+
+mensajes_chatbot = registro_metricas.contador(
+    "chatbot_mensajes_total", "Mensajes procesados por estado de la sesión", ("estado",))
+transiciones_chatbot = registro_metricas.contador(
+    "chatbot_transiciones_total", "Cambios de estado de las sesiones", ("desde", "hacia"))
+documentos_chatbot = registro_metricas.contador(
+    "chatbot_documentos_total", "Documentos registrados")
+bytes_documentos_chatbot = registro_metricas.contador(
+    "chatbot_documentos_bytes_total", "Bytes de los documentos registrados")
+rechazos_limite = registro_metricas.contador(
+    "chatbot_limite_rechazos_total", "Peticiones rechazadas con 429 por presupuesto agotado", ("presupuesto",))
+logs_descartados = registro_metricas.contador(
+    "chatbot_logs_descartados_total", "Registros de log descartados porque la cola estaba llena")
+
+# Clave del environ donde la aplicación deja la regla de la ruta atendida
+CLAVE_RUTA = "chatbot.ruta"
+
+
+class MedicionPeticiones:
+    """Middleware WSGI que mide latencia, tamaño de respuesta y errores de cada petición"""
+
+    def __init__(self, aplicacion_wsgi: Callable):
+        self.aplicacion_wsgi = aplicacion_wsgi
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        inicio = time.perf_counter()
+        estado = {}
+
+        def start_response_medido(status: str, headers: List[Tuple[str, str]], exc_info=None):
+            estado["codigo"] = status.split(" ", 1)[0]
+            estado["tamano"] = next((valor for nombre, valor in headers if nombre.lower() == "content-length"), None)
+            return start_response(status, headers, exc_info)
+
+        metodo = environ.get("REQUEST_METHOD", "")
+        try:
+            respuesta = self.aplicacion_wsgi(environ, start_response_medido)
+        except Exception:
+            ruta = environ.get(CLAVE_RUTA, "sin_ruta")
+            errores_http.inc(ruta, metodo)
+            if CLAVE_RUTA in environ:
+                en_curso_http.dec(ruta)
+            raise
+
+        ruta = environ.get(CLAVE_RUTA, "sin_ruta")
+        codigo = estado.get("codigo", "500")
+        duracion_http.observe(time.perf_counter() - inicio, ruta, metodo)
+        peticiones_http.inc(ruta, metodo, codigo)
+        if codigo.startswith("5"):
+            errores_http.inc(ruta, metodo)
+        if CLAVE_RUTA in environ:
+            en_curso_http.dec(ruta)
+        if estado.get("tamano") is not None:
+            bytes_respuesta_http.observe(int(estado["tamano"]), ruta)
+        return respuesta
+
+
+def registrar_metricas_http(app: Flask):
+    """Instala el middleware de medición y anota la ruta de cada petición"""
+
+    @app.before_request
+    def anotar_ruta():
+        ruta = request.url_rule.rule if request.url_rule else "sin_ruta"
+        request.environ[CLAVE_RUTA] = ruta
+        en_curso_http.inc(ruta)
+
+    app.wsgi_app = MedicionPeticiones(app.wsgi_app)
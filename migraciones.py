@@ -0,0 +1,287 @@
+"""
+Migraciones versionadas del esquema SQLite.
+
+Cada migración tiene un número de versión y se aplica una sola vez, en orden, dentro de su propia
+transacción; las aplicadas quedan registradas en la tabla schema_version. Al arrancar basta una
+consulta para saber que no hay nada pendiente.
+
+Las migraciones también son idempotentes (IF NOT EXISTS, columnas que se agregan solo si faltan) para
+que las bases creadas antes de schema_version se pongan al día sin errores. Los rellenados de datos
+grandes se marcan por_lotes: corren en transacciones cortas para no bloquear a los workers que ya
+atienden y se registran al terminar; si el proceso muere a la mitad, el siguiente arranque continúa.
+"""
+
+import argparse
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Set
+
+from config import Config
+from bitacora import obtener_bitacora
+
+bitacora = obtener_bitacora("migraciones")
+
+MIGRACIONES: List[Dict[str, Any]] = []
+
+
+def migracion(version: int, nombre: str, por_lotes: bool = False):
+    """Registra una migración; aplicar recibe el cursor (o la conexión si es por lotes)"""
+    def registrar(aplicar: Callable):
+        MIGRACIONES.append({"version": version, "nombre": nombre, "aplicar": aplicar, "por_lotes": por_lotes})
+        return aplicar
+    return registrar
+
+
+def agregar_columna(cursor: sqlite3.Cursor, tabla: str, columna: str, tipo: str):
+    """ALTER TABLE ADD COLUMN solo si la columna no existe"""
+    cursor.execute(f"PRAGMA table_info({tabla})")
+    if columna not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}')
+        bitacora.info("columna_agregada", f"✅ Columna {columna} agregada a la tabla {tabla}",
+                      tabla=tabla, columna=columna)
+
+
+def rellenar_por_lotes(conn: sqlite3.Connection, tabla: str, asignacion: str, condicion: str,
+                       tamano_lote: int = None) -> int:
+    """UPDATE por rangos de rowid, una transacción por lote; retorna las filas actualizadas"""
+    tamano_lote = tamano_lote or Config.TAMANO_LOTE_MIGRACION
+    cursor = conn.cursor()
+    ultimo_rowid = 0
+    total = 0
+
+    while True:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(f'''
+            SELECT rowid FROM {tabla}
+            WHERE rowid > ? AND ({condicion}) ORDER BY rowid LIMIT ?
+        ''', (ultimo_rowid, tamano_lote))
+        rowids = [fila[0] for fila in cursor.fetchall()]
+        if not rowids:
+            conn.commit()
+            return total
+
+        cursor.execute(f'''
+            UPDATE {tabla} SET {asignacion}
+            WHERE rowid BETWEEN ? AND ? AND ({condicion})
+        ''', (rowids[0], rowids[-1]))
+        total += cursor.rowcount
+        conn.commit()
+        ultimo_rowid = rowids[-1]
+
+
+@migracion(1, "tablas_iniciales")
+def tablas_iniciales(cursor: sqlite3.Cursor):
+    # Tabla para sesiones de chat
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sesiones (
+            id TEXT PRIMARY KEY,
+            estado TEXT,
+            datos_contexto TEXT,
+            fecha_creacion TIMESTAMP,
+            fecha_actualizacion TIMESTAMP
+        )
+    ''')
+
+    # Tabla para documentos subidos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS documentos (
+            id TEXT PRIMARY KEY,
+            sesion_id TEXT,
+            tipo_documento TEXT,
+            nombre_archivo TEXT,
+            ruta_archivo TEXT,
+            estado TEXT,
+            fecha_subida TIMESTAMP,
+            FOREIGN KEY (sesion_id) REFERENCES sesiones (id)
+        )
+    ''')
+
+    # Tabla para requisitos por grado
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS requisitos_grado (
+            grado TEXT PRIMARY KEY,
+            requisitos TEXT,
+            descripcion TEXT
+        )
+    ''')
+
+    # Tabla para historial de conversación
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS historial_conversacion (
+            id TEXT PRIMARY KEY,
+            sesion_id TEXT,
+            mensaje_usuario TEXT,
+            respuesta_bot TEXT,
+            timestamp TIMESTAMP,
+            FOREIGN KEY (sesion_id) REFERENCES sesiones (id)
+        )
+    ''')
+
+
+@migracion(2, "datos_contacto_sesiones")
+def datos_contacto_sesiones(cursor: sqlite3.Cursor):
+    agregar_columna(cursor, 'sesiones', 'nombre_usuario', 'TEXT')
+    agregar_columna(cursor, 'sesiones', 'telefono_usuario', 'TEXT')
+
+
+@migracion(3, "blobs_por_contenido")
+def blobs_por_contenido(cursor: sqlite3.Cursor):
+    # Contenido de los documentos, direccionado por SHA-256 y con conteo de referencias
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY,
+            ruta_archivo TEXT,
+            tamano INTEGER,
+            referencias INTEGER,
+            fecha_creacion TIMESTAMP
+        )
+    ''')
+    agregar_columna(cursor, 'documentos', 'blob_sha256', 'TEXT')
+
+
+@migracion(4, "variantes_imagen")
+def variantes_imagen(cursor: sqlite3.Cursor):
+    for columna in ('tipo_real', 'ruta_revision', 'ruta_miniatura'):
+        agregar_columna(cursor, 'blobs', columna, 'TEXT')
+
+
+@migracion(5, "cola_revision")
+def cola_revision(cursor: sqlite3.Cursor):
+    # Lease del revisor, intentos y resultado de la revisión
+    for columna, tipo in (('revisor', 'TEXT'), ('lease_hasta', 'TIMESTAMP'), ('intentos', 'INTEGER DEFAULT 0'),
+                          ('motivo_rechazo', 'TEXT'), ('fecha_revision', 'TIMESTAMP')):
+        agregar_columna(cursor, 'documentos', columna, tipo)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_documentos_estado ON documentos (estado, lease_hasta)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_documentos_sesion ON documentos (sesion_id)')
+
+
+@migracion(6, "limites_tokens")
+def limites_tokens(cursor: sqlite3.Cursor):
+    # Límites de uso compartidos entre workers (limite_peticiones.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS limites_tokens (
+            clave TEXT PRIMARY KEY,
+            tokens REAL,
+            actualizado REAL
+        )
+    ''')
+
+
+@migracion(7, "requisitos_por_grado")
+def requisitos_por_grado(cursor: sqlite3.Cursor):
+    # Un grado nuevo en Config.GRADOS_DISPONIBLES necesita su propia migración
+    cursor.executemany('''
+        INSERT OR IGNORE INTO requisitos_grado (grado, requisitos, descripcion)
+        VALUES (?, ?, ?)
+    ''', [(grado, Config.get_requisitos(grado), f"{grado} de primaria") for grado in Config.get_grados()])
+
+
+@migracion(8, "indices_consultas")
+def indices_consultas(cursor: sqlite3.Cursor):
+    # /historial/<session_id> y la limpieza de sesiones
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_historial_sesion ON historial_conversacion (sesion_id, timestamp)')
+    # Sesiones activas en /estadisticas y sesiones cerradas al archivar documentos
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sesiones_actualizacion ON sesiones (fecha_actualizacion)')
+    # Duplicados en la revisión y actualización de rutas al migrar o archivar blobs
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_documentos_blob ON documentos (blob_sha256)')
+
+
+@migracion(9, "fechas_sesiones", por_lotes=True)
+def fechas_sesiones(conn: sqlite3.Connection):
+    # Una sesión sin fecha de actualización cuenta como cerrada al archivar y nunca como activa
+    rellenar_por_lotes(conn, 'sesiones', 'fecha_actualizacion = fecha_creacion',
+                       'fecha_actualizacion IS NULL AND fecha_creacion IS NOT NULL')
+    rellenar_por_lotes(conn, 'sesiones', "datos_contexto = '{}'", "datos_contexto IS NULL OR datos_contexto = ''")
+
+
+@migracion(10, "version_sesiones")
+def version_sesiones(cursor: sqlite3.Cursor):
+    # Concurrencia optimista del almacén de sesiones (almacen_sesiones.py)
+    agregar_columna(cursor, 'sesiones', 'version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+def versiones_aplicadas(cursor: sqlite3.Cursor) -> Set[int]:
+    try:
+        cursor.execute('SELECT version FROM schema_version')
+    except sqlite3.OperationalError:
+        # Base nueva o creada antes de las migraciones versionadas
+        return set()
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def registrar_version(cursor: sqlite3.Cursor, version: int, nombre: str, duracion_ms: float):
+    cursor.execute('''
+        INSERT OR IGNORE INTO schema_version (version, nombre, fecha_aplicacion, duracion_ms)
+        VALUES (?, ?, datetime('now'), ?)
+    ''', (version, nombre, duracion_ms))
+
+
+def aplicar_migraciones(db_path: str = None) -> List[int]:
+    """Aplica en orden las migraciones pendientes; retorna las versiones aplicadas"""
+    conn = sqlite3.connect(db_path or Config.get_database_path())
+    cursor = conn.cursor()
+    aplicadas: List[int] = []
+
+    try:
+        ya_aplicadas = versiones_aplicadas(cursor)
+        pendientes = [m for m in sorted(MIGRACIONES, key=lambda m: m["version"]) if m["version"] not in ya_aplicadas]
+        for m in pendientes:
+            inicio = time.perf_counter()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    nombre TEXT,
+                    fecha_aplicacion TIMESTAMP,
+                    duracion_ms REAL
+                )
+            ''')
+            # Otro worker pudo aplicarla mientras se esperaba el lock
+            if m["version"] in versiones_aplicadas(cursor):
+                conn.commit()
+                continue
+
+            if m["por_lotes"]:
+                conn.commit()
+                m["aplicar"](conn)
+                cursor.execute('BEGIN IMMEDIATE')
+            else:
+                m["aplicar"](cursor)
+            duracion_ms = round((time.perf_counter() - inicio) * 1000, 1)
+            registrar_version(cursor, m["version"], m["nombre"], duracion_ms)
+            conn.commit()
+
+            aplicadas.append(m["version"])
+            bitacora.info("migracion_aplicada", f"✅ Migración {m['version']} aplicada: {m['nombre']}",
+                          version=m["version"], nombre=m["nombre"], duracion_ms=duracion_ms)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return aplicadas
+
+
+def estado_migraciones(db_path: str = None) -> List[Dict[str, Any]]:
+    """Versión, nombre y si está aplicada cada migración conocida"""
+    conn = sqlite3.connect(db_path or Config.get_database_path())
+    try:
+        aplicadas = versiones_aplicadas(conn.cursor())
+    finally:
+        conn.close()
+    return [{"version": m["version"], "nombre": m["nombre"], "aplicada": m["version"] in aplicadas}
+            for m in sorted(MIGRACIONES, key=lambda m: m["version"])]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migraciones del esquema de la base de datos")
+    parser.add_argument("--estado", action="store_true", help="Solo mostrar las migraciones aplicadas y pendientes")
+    parser.add_argument("--db", default=None, help="Ruta de la base de datos (por defecto DATABASE_PATH)")
+    args = parser.parse_args()
+
+    if not args.estado:
+        aplicadas = aplicar_migraciones(args.db)
+        print(f"✅ Migraciones aplicadas: {aplicadas or 'ninguna, el esquema ya estaba al día'}")
+    for m in estado_migraciones(args.db):
+        print(f"{'✅' if m['aplicada'] else '⏳'} {m['version']:>3} {m['nombre']}")
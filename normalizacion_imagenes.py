@@ -0,0 +1,194 @@
+import importlib.util
+import os
+import queue
+import sqlite3
+import threading
+from functools import lru_cache
+from io import BytesIO
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from config import Config
+from almacenamiento_documentos import (
+    detectar_tipo_real, leer_cabecera, leer_documento, es_ruta_archivada, existe_documento
+)
+from bitacora import obtener_bitacora
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# HEIC (fotos de iPhone) requiere pillow-heif; sin él se registra el tipo pero no se generan variantes
+SOPORTA_HEIC = importlib.util.find_spec("pillow_heif") is not None
+
+TIPOS_IMAGEN = {"jpeg", "png", "gif", "bmp", "webp", "heic"}
+
+bitacora = obtener_bitacora("normalizacion")
+
+
+def rutas_variantes(ruta: str) -> Tuple[str, str]:
+    """Obtiene las rutas de la copia de revisión y la miniatura, junto al original"""
+    return f"{ruta}.revision.jpg", f"{ruta}.miniatura.jpg"
+
+
+def puede_generar_variantes(tipo_real: Optional[str]) -> bool:
+    """Indica si el tipo detectado es una imagen que se puede decodificar"""
+    return tipo_real in TIPOS_IMAGEN and (tipo_real != "heic" or SOPORTA_HEIC)
+
+
+@lru_cache(maxsize=None)
+def cargar_pillow():
+    """Importa Pillow (y el soporte HEIC) con el primer uso: al arrancar retrasa la primera respuesta"""
+    from PIL import Image, ImageOps
+    if SOPORTA_HEIC:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+    return Image, ImageOps
+
+
+def comprimir_jpeg(imagen: "Image.Image") -> bytes:
+    """Recomprime la imagen como JPEG"""
+    salida = BytesIO()
+    imagen.save(salida, "JPEG", quality=Config.CALIDAD_JPEG, optimize=True)
+    return salida.getvalue()
+
+
+def generar_variantes(contenido: bytes) -> Tuple[bytes, bytes]:
+    """Genera la copia de revisión y la miniatura de una imagen (trabajo de Pillow)"""
+    Image, ImageOps = cargar_pillow()
+    lado = Config.REVISION_LADO_MAX
+    with Image.open(BytesIO(contenido)) as original:
+        # Los JPEG se decodifican ya reducidos (escalado DCT), sin cargar la foto completa
+        original.draft("RGB", (lado, lado))
+        # Las fotos de celular guardan la orientación en EXIF
+        imagen = ImageOps.exif_transpose(original).convert("RGB")
+    imagen.thumbnail((lado, lado), Image.LANCZOS)
+    revision = comprimir_jpeg(imagen)
+
+    # La miniatura sale de la copia de revisión, no del original
+    imagen.thumbnail((Config.MINIATURA_LADO_MAX, Config.MINIATURA_LADO_MAX), Image.LANCZOS)
+    return revision, comprimir_jpeg(imagen)
+
+
+def dimensiones_imagen(ruta: str) -> Tuple[int, int]:
+    """Lee el ancho y alto de una imagen sin decodificarla completa"""
+    Image, _ = cargar_pillow()
+    origen = BytesIO(leer_documento(ruta)) if es_ruta_archivada(ruta) else ruta
+    with Image.open(origen) as imagen:
+        return imagen.size
+
+
+def escribir_variante(ruta: str, contenido: bytes):
+    """Escribe una variante de forma atómica (temporal y reemplazo)"""
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+
+class NormalizadorImagenes:
+    """Genera en segundo plano una copia de revisión y una miniatura de cada imagen guardada"""
+
+    def __init__(self, db_path: str = None, hilos: int = None, max_cola: int = None):
+        self.db_path = db_path or Config.get_database_path()
+        self.hilos = hilos or Config.NORMALIZACION_HILOS
+        self.cola: "queue.Queue[Tuple[str, str]]" = queue.Queue(maxsize=max_cola or Config.NORMALIZACION_COLA_MAX)
+        self.trabajadores: List[threading.Thread] = []
+        self.lock = threading.Lock()
+        self.descartadas = 0
+
+    def iniciar(self):
+        """Inicia los hilos trabajadores (una sola vez, en el proceso que los usa)"""
+        with self.lock:
+            if self.trabajadores:
+                return
+            for indice in range(self.hilos):
+                hilo = threading.Thread(target=self.trabajar, name=f"normalizacion-imagenes-{indice}", daemon=True)
+                hilo.start()
+                self.trabajadores.append(hilo)
+
+    def encolar(self, sha256: str, ruta: str) -> bool:
+        """Agrega un blob a la cola sin bloquear la petición; retorna False si la cola está llena"""
+        self.iniciar()
+        try:
+            self.cola.put_nowait((sha256, ruta))
+            return True
+        except queue.Full:
+            # El blob queda sin tipo_real y lo recoge procesar_pendientes
+            self.descartadas += 1
+            return False
+
+    def trabajar(self):
+        """Bucle de un hilo trabajador"""
+        while True:
+            sha256, ruta = self.cola.get()
+            try:
+                self.procesar(sha256, ruta)
+            except Exception as e:
+                bitacora.exception("error_normalizacion", f"❌ Error normalizando imagen {sha256}: {e}", sha256=sha256)
+            finally:
+                self.cola.task_done()
+
+    def procesar(self, sha256: str, ruta: str) -> Dict[str, Optional[str]]:
+        """Detecta el tipo real del blob y, si es una imagen, genera y registra sus variantes"""
+        tipo_real = detectar_tipo_real(leer_cabecera(ruta))
+        ruta_revision = ruta_miniatura = None
+
+        if puede_generar_variantes(tipo_real) and not es_ruta_archivada(ruta):
+            revision, miniatura = generar_variantes(leer_documento(ruta))
+            ruta_revision, ruta_miniatura = rutas_variantes(ruta)
+            escribir_variante(ruta_revision, revision)
+            escribir_variante(ruta_miniatura, miniatura)
+
+        resultado = {"tipo_real": tipo_real, "ruta_revision": ruta_revision, "ruta_miniatura": ruta_miniatura}
+        self.registrar_variantes(sha256, resultado)
+        return resultado
+
+    def registrar_variantes(self, sha256: str, resultado: Dict[str, Optional[str]]):
+        """Guarda el tipo real y las rutas de las variantes en la fila del blob"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            UPDATE blobs SET tipo_real = ?, ruta_revision = ?, ruta_miniatura = ?
+            WHERE sha256 = ?
+        ''', (resultado["tipo_real"] or "desconocido", resultado["ruta_revision"], resultado["ruta_miniatura"], sha256))
+        actualizadas = cursor.rowcount
+
+        conn.commit()
+        conn.close()
+
+        # El blob se liberó mientras se procesaba: sus variantes quedarían huérfanas
+        if actualizadas == 0:
+            for ruta in (resultado["ruta_revision"], resultado["ruta_miniatura"]):
+                if ruta and os.path.exists(ruta):
+                    os.remove(ruta)
+
+    def procesar_pendientes(self, limite: int = None) -> int:
+        """Procesa en el hilo actual los blobs que aún no tienen tipo real (cola llena o reinicio)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT sha256, ruta_archivo FROM blobs WHERE tipo_real IS NULL LIMIT ?
+        ''', (limite or -1,))
+        pendientes = cursor.fetchall()
+        conn.close()
+
+        procesados = 0
+        for sha256, ruta in pendientes:
+            if not existe_documento(ruta):
+                continue
+            self.procesar(sha256, ruta)
+            procesados += 1
+        return procesados
+
+    def esperar(self):
+        """Espera a que se procesen todas las imágenes encoladas"""
+        self.cola.join()
+
+
+# Instancia global del normalizador; los hilos se inician con la primera imagen encolada
+normalizador_imagenes = NormalizadorImagenes()
+
+
+if __name__ == "__main__":
+    procesados = normalizador_imagenes.procesar_pendientes()
+    print(f"✅ Blobs normalizados: {procesados}")
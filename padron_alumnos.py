@@ -0,0 +1,101 @@
+"""
+Padrón de alumnos leído de los CSV por grado: se carga una sola vez y queda de solo lectura.
+
+Con gunicorn --preload se carga en el proceso maestro y los workers comparten sus páginas de memoria
+(copy-on-write). Para que esas páginas sigan compartidas, las búsquedas por código usan un índice y no
+recorren el padrón completo: recorrerlo actualiza el contador de referencias de cada fila y obliga al
+sistema operativo a copiar en cada worker todas las páginas que tocó.
+
+Con arranque rápido (Config.ARRANQUE_RAPIDO) el padrón no se lee al importar la aplicación: lo carga un
+hilo de fondo o la primera búsqueda, lo que ocurra antes.
+"""
+
+import hashlib
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from chatbot_matricula import cargar_datos_varios_csv, ARCHIVOS_GRADOS
+
+COLUMNAS_CODIGO = ('Código modular (SIAGE)', 'codigo modular (SIAGE)')
+
+
+def codigo_alumno(alumno: Dict[str, Any]) -> Optional[str]:
+    cod = alumno.get(COLUMNAS_CODIGO[0]) or alumno.get(COLUMNAS_CODIGO[1])
+    return str(cod).strip() if cod else None
+
+
+def calcular_version(archivos) -> str:
+    """Versión del padrón según nombre, tamaño y fecha de modificación de los CSV"""
+    huella = hashlib.sha1()
+    for archivo in archivos:
+        if os.path.exists(archivo):
+            estado = os.stat(archivo)
+            huella.update(f"{os.path.basename(archivo)}:{estado.st_size}:{estado.st_mtime_ns};".encode("utf-8"))
+    return huella.hexdigest()[:12]
+
+
+class PadronAlumnos:
+    """Alumnos de los CSV con un índice por código modular"""
+
+    def __init__(self, archivos=None):
+        self.archivos = archivos or ARCHIVOS_GRADOS
+        self.alumnos: Tuple[Dict[str, str], ...] = ()
+        self.por_codigo: Dict[str, Dict[str, str]] = {}
+        self.version: Optional[str] = None
+        self.cargado = False
+        self.lock = threading.Lock()
+
+    def reiniciar_lock(self):
+        self.lock = threading.Lock()
+
+    def cargar(self) -> "PadronAlumnos":
+        """Lee los CSV y arma el índice, aunque ya estuviera cargado"""
+        with self.lock:
+            self.leer()
+        return self
+
+    def asegurar_cargado(self) -> "PadronAlumnos":
+        """Carga el padrón si todavía no se cargó; si otro hilo lo está cargando, espera a que termine"""
+        if not self.cargado:
+            with self.lock:
+                if not self.cargado:
+                    self.leer()
+        return self
+
+    def leer(self):
+        """Lee los CSV; los valores repetidos (grado, "Sí", "No") se guardan una sola vez"""
+        alumnos = cargar_datos_varios_csv(self.archivos)
+        valores: Dict[str, str] = {}
+        por_codigo: Dict[str, Dict[str, str]] = {}
+        for alumno in alumnos:
+            for columna, valor in alumno.items():
+                if isinstance(valor, str):
+                    alumno[columna] = valores.setdefault(valor, valor)
+            codigo = codigo_alumno(alumno)
+            # Igual que buscar_por_codigo: ante códigos repetidos gana la primera fila
+            if codigo:
+                por_codigo.setdefault(codigo, alumno)
+
+        # cargado se marca al final: quien lo ve en True encuentra el índice completo
+        self.alumnos = tuple(alumnos)
+        self.por_codigo = por_codigo
+        self.version = calcular_version(self.archivos)
+        self.cargado = True
+
+    def buscar_por_codigo(self, codigo: str) -> Optional[Dict[str, str]]:
+        return self.asegurar_cargado().por_codigo.get(codigo.strip())
+
+    def __len__(self) -> int:
+        """Alumnos cargados hasta ahora; no fuerza la carga"""
+        return len(self.alumnos)
+
+
+# Instancia global del padrón
+padron_alumnos = PadronAlumnos()
+
+if hasattr(os, "register_at_fork"):
+    # Un fork en medio de la carga dejaría el lock tomado para siempre en el hijo: se espera a que termine
+    os.register_at_fork(before=lambda: padron_alumnos.lock.acquire(),
+                        after_in_parent=lambda: padron_alumnos.lock.release(),
+                        after_in_child=padron_alumnos.reiniciar_lock)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Perfil del arranque en frío, con y sin arranque rápido (Config.ARRANQUE_RAPIDO): desglose del tiempo de
+importación por paquete (python -X importtime) y tiempo hasta la primera respuesta. Cada medición usa un
+intérprete nuevo sobre una copia de los datos, como un worker recién levantado en Render.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmark_servidores import RAIZ, preparar_carpeta
+
+# Se ejecuta en el intérprete nuevo; el lanzamiento cuenta desde que el proceso padre lo creó
+MEDICION = """
+import json, os, sys, time
+inicio = time.perf_counter()
+lanzado = time.time() - float(os.environ["PERFIL_LANZADO"])
+import wsgi
+importado = time.perf_counter()
+cliente = wsgi.app.test_client()
+cliente.get("/grados")
+primera = time.perf_counter()
+cliente.post("/verificar-matricula", json={"codigo": "00000000"})
+padron = time.perf_counter()
+cliente.post("/chatbot-inteligente", json={"mensaje": "¿cuánto cuesta la pensión?"})
+chat = time.perf_counter()
+sys.stderr.write("PERFIL " + json.dumps({
+    "interprete_s": lanzado,
+    "importacion_s": importado - inicio,
+    "primera_respuesta_s": primera - inicio,
+    "verificacion_matricula_s": padron - primera,
+    "primer_mensaje_s": chat - padron,
+}) + "\\n")
+"""
+
+
+def entorno(rapido: bool) -> dict:
+    # Los límites de uso rechazarían las peticiones repetidas desde la misma IP
+    return dict(os.environ, PYTHONPATH=RAIZ, ARRANQUE_RAPIDO="1" if rapido else "0",
+                LIMITES_ACTIVOS="0", LOG_NIVEL="WARNING")
+
+
+def medir_arranque(carpeta: str, rapido: bool) -> dict:
+    """Tiempos de un arranque en un intérprete nuevo"""
+    variables = dict(entorno(rapido), PERFIL_LANZADO=repr(time.time()))
+    proceso = subprocess.run([sys.executable, "-c", MEDICION], cwd=carpeta, env=variables,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    for linea in proceso.stderr.splitlines():
+        if linea.startswith("PERFIL "):
+            return json.loads(linea[len("PERFIL "):])
+    raise RuntimeError(f"La medición no reportó resultados:\n{proceso.stderr}")
+
+
+def desglose_importacion(carpeta: str, rapido: bool) -> list:
+    """Tiempo propio de importación en el hilo principal, agrupado por paquete"""
+    # Sin hilos de fondo: -X importtime no separa por hilo y mezclaría lo que importa el calentamiento
+    codigo = "import threading; threading.Thread.start = lambda hilo: None; import wsgi"
+    proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo], cwd=carpeta,
+                             env=entorno(rapido), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                             text=True, check=True)
+    por_paquete = {}
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:"):
+            continue
+        propio, _, nombre = linea[len("import time:"):].split("|", 2)
+        if not propio.strip().isdigit():
+            continue  # Encabezado
+        paquete = nombre.strip().split(".")[0]
+        por_paquete[paquete] = por_paquete.get(paquete, 0) + int(propio)
+
+    # En los módulos del proyecto el tiempo propio incluye lo que ejecutan al importarse (esquema, padrón)
+    return sorted(({"paquete": paquete, "ms": micros / 1000,
+                    "propio": os.path.exists(os.path.join(RAIZ, f"{paquete}.py"))}
+                   for paquete, micros in por_paquete.items()), key=lambda p: p["ms"], reverse=True)
+
+
+def perfilar(rapido: bool, repeticiones: int, modulos: int) -> dict:
+    carpeta = preparar_carpeta()
+    try:
+        # El primer arranque aplica el esquema de la base de datos; los siguientes solo leen su versión
+        primer_arranque = medir_arranque(carpeta, rapido)
+        mediciones = [medir_arranque(carpeta, rapido) for _ in range(repeticiones)]
+        paquetes = desglose_importacion(carpeta, rapido)
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    return {
+        "arranque_rapido": rapido,
+        "repeticiones": repeticiones,
+        "primer_arranque": primer_arranque,
+        "mediana": {clave: statistics.median(m[clave] for m in mediciones) for clave in mediciones[0]},
+        "importacion_total_ms": sum(p["ms"] for p in paquetes),
+        "paquetes": paquetes[:modulos],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Desglose del arranque en frío con y sin arranque rápido")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--modulos", type=int, default=12, help="Paquetes más lentos a mostrar")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado en JSON")
+    args = parser.parse_args()
+
+    resultados = [perfilar(rapido, args.repeticiones, args.modulos) for rapido in (False, True)]
+    if args.json:
+        json.dump(resultados, sys.stdout, indent=2)
+        print()
+        return
+
+    for r in resultados:
+        m = r["mediana"]
+        print(f"\n🚀 {'Arranque rápido' if r['arranque_rapido'] else 'Arranque normal'} "
+              f"(mediana de {r['repeticiones']} arranques)")
+        print(f"   intérprete {m['interprete_s'] * 1000:6.0f} ms | importación {m['importacion_s'] * 1000:6.0f} ms | "
+              f"primera respuesta {m['primera_respuesta_s'] * 1000:6.0f} ms | "
+              f"verificación {m['verificacion_matricula_s'] * 1000:5.0f} ms | "
+              f"primer mensaje {m['primer_mensaje_s'] * 1000:5.0f} ms")
+        print(f"   importación por paquete (-X importtime, total {r['importacion_total_ms']:.0f} ms):")
+        for paquete in r["paquetes"]:
+            print(f"     {paquete['ms']:7.1f} ms  {paquete['paquete']}{' (proyecto)' if paquete['propio'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga local con conversaciones de familias: recorridos guionados (saludo → matrícula → grado →
+subida, contacto con asesor, verificación de matrícula, ...) elegidos según la mezcla real de tráfico.
+
+La aplicación corre en el mismo proceso (cliente de pruebas de Flask, un hilo por usuario) o en un
+gunicorn local con gunicorn.conf.py, siempre sobre una copia temporal de la base de datos y los CSV.
+Reporta rendimiento y percentiles p50/p95/p99 por ruta y por estado del diálogo; con --salida guarda el
+resultado en JSON para comparar corridas.
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmark_servidores import RAIZ, preparar_carpeta, puerto_libre
+
+# Códigos que no están en el padrón: la familia se equivoca al escribirlo
+CODIGOS_INEXISTENTES = ["00000000", "12345678", "99999999"]
+
+
+def mensaje(texto: str, estado: str) -> Dict[str, Any]:
+    """Paso que envía un mensaje al chatbot; estado es el del diálogo cuando llega el mensaje"""
+    return {"metodo": "POST", "ruta": "/chatbot-inteligente", "estado": estado, "mensaje": texto}
+
+
+def subida(estado: str) -> Dict[str, Any]:
+    """Paso que envía un documento en base64 por /chatbot-inteligente, como la app móvil"""
+    return {"metodo": "POST", "ruta": "/chatbot-inteligente", "estado": estado, "archivo": True}
+
+
+def consulta(ruta: str, plantilla: str = None, metodo: str = "GET", cuerpo: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Paso fuera del diálogo (catálogos, verificación); plantilla agrupa rutas con parámetros"""
+    return {"metodo": metodo, "ruta": ruta, "plantilla": plantilla or ruta, "cuerpo": cuerpo}
+
+
+# estado_final: estado en que debe quedar la sesión; se comprueba al terminar cada recorrido
+RECORRIDOS: Dict[str, Dict[str, Any]] = {
+    "matricula_documentos": {
+        "estado_final": "post_matricula",
+        "pasos": [
+            consulta("/grados"),
+            mensaje("hola", "inicio"),
+            mensaje("matricula", "inicio"),
+            mensaje("requisitos", "opciones_matricula"),
+            mensaje("{grado}", "requisitos_grado"),
+            mensaje("sí", "requisitos_grado"),
+            subida("subiendo_documentos"),
+            mensaje("costos", "post_matricula"),
+        ],
+    },
+    "asesor": {
+        "estado_final": "conectando_asesor",
+        "pasos": [
+            mensaje("hola", "inicio"),
+            mensaje("matricula", "inicio"),
+            mensaje("asesor", "opciones_matricula"),
+            mensaje("Mi nombre es {nombre} y mi teléfono es {telefono}", "conectando_asesor"),
+        ],
+    },
+    "verificacion": {
+        "estado_final": "verificando_matricula",
+        "pasos": [
+            mensaje("matricula", "inicio"),
+            mensaje("verificar", "opciones_matricula"),
+            mensaje("{codigo}", "verificando_matricula"),
+            consulta("/verificar-matricula", metodo="POST", cuerpo={"codigo": "{codigo}"}),
+        ],
+    },
+    "sin_codigo": {
+        "estado_final": "redireccion_presencial",
+        "pasos": [
+            mensaje("hola", "inicio"),
+            mensaje("matricula", "inicio"),
+            mensaje("verificar", "opciones_matricula"),
+            mensaje("no tengo el código SIAGE", "verificando_matricula"),
+        ],
+    },
+    "requisitos": {
+        "estado_final": "requisitos_grado",
+        "pasos": [
+            mensaje("hola", "inicio"),
+            mensaje("requisitos", "inicio"),
+            mensaje("{grado}", "requisitos_grado"),
+            consulta("/requisitos/{grado}", plantilla="/requisitos/<grado>"),
+            consulta("/costos"),
+        ],
+    },
+    "consulta": {
+        "estado_final": "opciones_matricula",
+        "pasos": [
+            consulta("/grados"),
+            mensaje("¿cuánto cuesta la matrícula?", "inicio"),
+            consulta("/costos"),
+        ],
+    },
+}
+
+# Recorrido que corresponde a cada estado en que terminaron las sesiones reales
+RECORRIDO_POR_ESTADO = {
+    "post_matricula": "matricula_documentos",
+    "subiendo_documentos": "matricula_documentos",
+    "conectando_asesor": "asesor",
+    "recolectando_datos": "asesor",
+    "verificando_matricula": "verificacion",
+    "redireccion_presencial": "sin_codigo",
+    "requisitos_grado": "requisitos",
+    "inicio": "consulta",
+    "opciones_matricula": "consulta",
+}
+
+# Si la base no tiene sesiones: mezcla aproximada de producción
+PESOS_POR_DEFECTO = {"matricula_documentos": 10, "asesor": 35, "verificacion": 5, "sin_codigo": 30,
+                     "requisitos": 7, "consulta": 13}
+
+NOMBRES = ["Rosa Quispe Mamani", "Luis Huamán Flores", "María Condori Ramos", "José Rojas Chávez",
+           "Carmen Vásquez Torres", "Jorge Sánchez Díaz", "Ana Gutiérrez Cruz", "Pedro Mendoza Castillo"]
+
+
+def pesos_desde_base(db_path: str) -> Dict[str, float]:
+    """Mezcla de recorridos según el estado en que quedaron las sesiones de la base"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT estado, COUNT(*) FROM sesiones GROUP BY estado')
+        filas = cursor.fetchall()
+    except sqlite3.OperationalError:
+        filas = []
+    finally:
+        conn.close()
+
+    pesos: Dict[str, float] = {}
+    for estado, cantidad in filas:
+        recorrido = RECORRIDO_POR_ESTADO.get(estado)
+        if recorrido:
+            pesos[recorrido] = pesos.get(recorrido, 0) + cantidad
+    return pesos or dict(PESOS_POR_DEFECTO)
+
+
+def codigos_del_padron(limite: int = 50) -> List[str]:
+    """Códigos SIAGE reales de los CSV del repositorio, para que la verificación encuentre alumnos"""
+    from chatbot_matricula import ARCHIVOS_GRADOS
+    from padron_alumnos import PadronAlumnos
+
+    padron = PadronAlumnos([os.path.join(RAIZ, archivo) for archivo in ARCHIVOS_GRADOS]).cargar()
+    return list(padron.por_codigo)[:limite]
+
+
+def documento_prueba(kb: int) -> str:
+    """PDF mínimo de kb kilobytes, en base64"""
+    contenido = b"%PDF-1.4\n" + b"0" * max(0, kb * 1024 - 16) + b"\n%%EOF\n"
+    return base64.b64encode(contenido).decode()
+
+
+def percentil(ordenadas: List[float], p: float) -> float:
+    return ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))]
+
+
+def resumen_latencias(latencias: List[float], duracion: float = None) -> Dict[str, Any]:
+    """Cantidad, media y percentiles en milisegundos; con duración también peticiones por segundo"""
+    ordenadas = sorted(latencias)
+    resumen = {
+        "peticiones": len(ordenadas),
+        "media_ms": sum(ordenadas) / len(ordenadas) * 1000 if ordenadas else 0.0,
+        "p50_ms": percentil(ordenadas, 0.50) * 1000 if ordenadas else 0.0,
+        "p95_ms": percentil(ordenadas, 0.95) * 1000 if ordenadas else 0.0,
+        "p99_ms": percentil(ordenadas, 0.99) * 1000 if ordenadas else 0.0,
+    }
+    if duracion:
+        resumen["peticiones_por_segundo"] = len(ordenadas) / duracion
+    return resumen
+
+
+class ClienteEnProceso:
+    """Peticiones a la aplicación importada en este proceso, con el cliente de pruebas de Flask"""
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def enviar(self, metodo: str, ruta: str, cuerpo: Dict[str, Any] = None) -> Tuple[int, Optional[dict]]:
+        # wsgi.multithread como en gunicorn con hilos: varios usuarios comparten el proceso
+        respuesta = self.cliente.open(ruta, method=metodo, json=cuerpo,
+                                      environ_overrides={"wsgi.multithread": True})
+        return respuesta.status_code, respuesta.get_json(silent=True)
+
+    def cerrar(self):
+        pass
+
+
+class ClienteHTTP:
+    """Peticiones a un servidor local con una conexión persistente por usuario"""
+
+    def __init__(self, puerto: int):
+        self.puerto = puerto
+        self.conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=60)
+
+    def enviar(self, metodo: str, ruta: str, cuerpo: Dict[str, Any] = None) -> Tuple[int, Optional[dict]]:
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        encabezados = {"Content-Type": "application/json"} if datos is not None else {}
+        try:
+            self.conexion.request(metodo, urllib.request.quote(ruta, safe="/:?=&"), body=datos, headers=encabezados)
+            respuesta = self.conexion.getresponse()
+            contenido = respuesta.read()
+        except (OSError, http.client.HTTPException):
+            # El servidor cerró la conexión persistente: se reabre para el siguiente paso
+            self.conexion.close()
+            self.conexion = http.client.HTTPConnection("127.0.0.1", self.puerto, timeout=60)
+            return 0, None
+        try:
+            return respuesta.status, json.loads(contenido)
+        except ValueError:
+            return respuesta.status, None
+
+    def cerrar(self):
+        self.conexion.close()
+
+
+class PruebaCarga:
+    """Usuarios virtuales que repiten recorridos elegidos por peso hasta completar el total pedido"""
+
+    def __init__(self, crear_cliente, pesos: Dict[str, float], recorridos: int, concurrencia: int,
+                 pausa: float = 0.0, kb_archivo: int = 64, semilla: int = 1):
+        self.crear_cliente = crear_cliente
+        self.nombres = [nombre for nombre, peso in pesos.items() if peso > 0]
+        self.pesos = [pesos[nombre] for nombre in self.nombres]
+        self.total = recorridos
+        self.concurrencia = concurrencia
+        self.pausa = pausa
+        self.semilla = semilla
+        self.archivo = documento_prueba(kb_archivo)
+        codigos = codigos_del_padron()
+        # Siete de cada diez familias escriben un código que existe
+        self.codigos = codigos * 7 + CODIGOS_INEXISTENTES * max(1, len(codigos) // 3) if codigos else CODIGOS_INEXISTENTES
+        self.lock = threading.Lock()
+        self.iniciados = 0
+        self.muestras: List[Tuple[str, Optional[str], str, float, int]] = []
+        self.recorridos: List[Tuple[str, float, bool]] = []
+
+    def siguiente(self) -> bool:
+        with self.lock:
+            if self.iniciados >= self.total:
+                return False
+            self.iniciados += 1
+            return True
+
+    def ejecutar_recorrido(self, cliente, nombre: str, azar: random.Random) -> Tuple[List[tuple], bool]:
+        """Ejecuta los pasos de un recorrido; retorna las muestras y si la sesión terminó donde se esperaba"""
+        from config import Config
+
+        valores = {"grado": azar.choice(Config.get_grados()), "codigo": azar.choice(self.codigos),
+                   "nombre": azar.choice(NOMBRES), "telefono": f"9{azar.randrange(10 ** 8):08d}"}
+        muestras = []
+        session_id = None
+        completo = True
+        for paso in RECORRIDOS[nombre]["pasos"]:
+            if "mensaje" in paso or "archivo" in paso:
+                cuerpo = {"mensaje": paso.get("mensaje", "").format(**valores)}
+                if paso.get("archivo"):
+                    cuerpo["archivos"] = [{"nombre": "dni.pdf", "tipo": "dni", "contenido": self.archivo}]
+                if session_id:
+                    cuerpo["session_id"] = session_id
+                ruta = plantilla = paso["ruta"]
+            else:
+                cuerpo = json.loads(json.dumps(paso["cuerpo"]).replace("{codigo}", valores["codigo"])) \
+                    if paso["cuerpo"] else None
+                ruta, plantilla = paso["ruta"].format(**valores), paso["plantilla"]
+
+            inicio = time.perf_counter()
+            codigo_http, datos = cliente.enviar(paso["metodo"], ruta, cuerpo)
+            muestras.append((f"{paso['metodo']} {plantilla}", paso.get("estado"), nombre,
+                             time.perf_counter() - inicio, codigo_http))
+            if codigo_http != 200:
+                completo = False
+            elif "estado" in paso and datos:
+                session_id = datos.get("session_id", session_id)
+            if self.pausa:
+                time.sleep(azar.uniform(0, 2 * self.pausa))
+
+        # Fuera de la medición: el diálogo debe haber seguido el guion
+        if session_id:
+            codigo_http, sesion = cliente.enviar("GET", f"/sesion/{session_id}")
+            completo = completo and codigo_http == 200 and sesion.get("estado") == RECORRIDOS[nombre]["estado_final"]
+        return muestras, completo
+
+    def usuario(self, indice: int):
+        azar = random.Random(self.semilla * 1000 + indice)
+        cliente = self.crear_cliente()
+        try:
+            while self.siguiente():
+                nombre = azar.choices(self.nombres, self.pesos)[0]
+                inicio = time.perf_counter()
+                muestras, completo = self.ejecutar_recorrido(cliente, nombre, azar)
+                with self.lock:
+                    self.muestras.extend(muestras)
+                    self.recorridos.append((nombre, time.perf_counter() - inicio, completo))
+        finally:
+            cliente.cerrar()
+
+    def ejecutar(self) -> Dict[str, Any]:
+        hilos = [threading.Thread(target=self.usuario, args=(i,), name=f"usuario-{i}")
+                 for i in range(self.concurrencia)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        return self.resultado(duracion)
+
+    def resultado(self, duracion: float) -> Dict[str, Any]:
+        def agrupar(clave) -> Dict[str, Any]:
+            grupos: Dict[str, List[tuple]] = {}
+            for muestra in self.muestras:
+                if clave(muestra) is not None:
+                    grupos.setdefault(clave(muestra), []).append(muestra)
+            return {nombre: dict(resumen_latencias([m[3] for m in grupo], duracion),
+                                 errores=sum(1 for m in grupo if m[4] != 200))
+                    for nombre, grupo in sorted(grupos.items())}
+
+        por_recorrido = {}
+        for nombre in sorted({r[0] for r in self.recorridos}):
+            grupo = [r for r in self.recorridos if r[0] == nombre]
+            por_recorrido[nombre] = dict(resumen_latencias([r[1] for r in grupo]),
+                                         recorridos=len(grupo), desvios=sum(1 for r in grupo if not r[2]))
+            del por_recorrido[nombre]["peticiones"]
+
+        return {
+            "duracion_s": duracion,
+            "recorridos_por_segundo": len(self.recorridos) / duracion,
+            "total": dict(resumen_latencias([m[3] for m in self.muestras], duracion),
+                          errores=sum(1 for m in self.muestras if m[4] != 200)),
+            "por_ruta": agrupar(lambda m: m[0]),
+            "por_estado": agrupar(lambda m: m[1]),
+            "por_recorrido": por_recorrido,
+        }
+
+
+def iniciar_gunicorn(carpeta: str, puerto: int, workers: int, hilos: int) -> subprocess.Popen:
+    """gunicorn con la configuración del repositorio (preload, gc.freeze) sobre la carpeta temporal"""
+    comando = [sys.executable, "-m", "gunicorn", "wsgi:app", "-c", os.path.join(RAIZ, "gunicorn.conf.py"),
+               "--bind", f"127.0.0.1:{puerto}", "--workers", str(workers), "--threads", str(hilos)]
+    # Todas las peticiones salen de la misma IP: sin desactivar los límites se medirían respuestas 429
+    entorno = dict(os.environ, PYTHONPATH=RAIZ, LIMITES_ACTIVOS="0", LOG_NIVEL="WARNING")
+    proceso = subprocess.Popen(comando, cwd=carpeta, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    limite = time.time() + 60
+    while time.time() < limite:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{puerto}/health", timeout=1)
+            return proceso
+        except OSError:
+            time.sleep(0.2)
+    proceso.kill()
+    raise RuntimeError("gunicorn no respondió a tiempo")
+
+
+def leer_pesos(texto: str) -> Dict[str, float]:
+    """--pesos asesor=3,consulta=1"""
+    pesos = {}
+    for par in texto.split(","):
+        nombre, _, peso = par.partition("=")
+        if nombre.strip() not in RECORRIDOS:
+            raise argparse.ArgumentTypeError(f"Recorrido desconocido: {nombre} (disponibles: {', '.join(RECORRIDOS)})")
+        pesos[nombre.strip()] = float(peso)
+    return pesos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con conversaciones guionadas de familias")
+    parser.add_argument("--modo", choices=["proceso", "gunicorn"], default="proceso",
+                        help="proceso: cliente de pruebas de Flask en este proceso; gunicorn: servidor local")
+    parser.add_argument("--concurrencia", type=int, default=8, help="Usuarios simultáneos")
+    parser.add_argument("--recorridos", type=int, default=200, help="Recorridos completos en total")
+    parser.add_argument("--pesos", type=leer_pesos, default=None,
+                        help="Mezcla de recorridos (asesor=3,consulta=1); por defecto la de las sesiones de la base")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Segundos medios que la familia tarda entre pasos")
+    parser.add_argument("--kb-archivo", type=int, default=64, help="Tamaño del documento que se sube")
+    parser.add_argument("--workers", type=int, default=2, help="Workers de gunicorn (modo gunicorn)")
+    parser.add_argument("--hilos", type=int, default=4, help="Hilos por worker de gunicorn (modo gunicorn)")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado en JSON")
+    parser.add_argument("--salida", default=None, help="Guardar el resultado en un archivo JSON")
+    args = parser.parse_args()
+
+    # Antes de importar la aplicación: Config lee el entorno al importarse
+    os.environ["LIMITES_ACTIVOS"] = "0"
+    os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+    carpeta = preparar_carpeta()
+    pesos = args.pesos or pesos_desde_base(os.path.join(carpeta, "chatbot_db.sqlite"))
+    proceso = None
+    try:
+        if args.modo == "gunicorn":
+            puerto = puerto_libre()
+            proceso = iniciar_gunicorn(carpeta, puerto, args.workers, args.hilos)
+            crear_cliente = lambda: ClienteHTTP(puerto)
+        else:
+            # La base de datos, los documentos y los CSV se abren con rutas relativas a la carpeta temporal
+            os.chdir(carpeta)
+            sys.path.insert(0, RAIZ)
+            import wsgi
+            crear_cliente = lambda: ClienteEnProceso(wsgi.app)
+
+        prueba = PruebaCarga(crear_cliente, pesos, args.recorridos, args.concurrencia, args.pausa,
+                             args.kb_archivo, args.semilla)
+        resultado = {
+            "modo": args.modo,
+            "concurrencia": args.concurrencia,
+            "workers": args.workers if args.modo == "gunicorn" else None,
+            "hilos": args.hilos if args.modo == "gunicorn" else None,
+            "pausa_s": args.pausa,
+            "pesos": pesos,
+            **prueba.ejecutar(),
+        }
+    finally:
+        os.chdir(RAIZ)
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+    if args.json:
+        json.dump(resultado, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return
+
+    total = resultado["total"]
+    print(f"🚦 {args.modo}: {args.concurrencia} usuarios, {args.recorridos} recorridos en {resultado['duracion_s']:.1f} s "
+          f"({resultado['recorridos_por_segundo']:.1f} recorridos/s, {total['peticiones_por_segundo']:.1f} pet/s, "
+          f"{total['errores']} errores)")
+    for titulo, grupos in (("Por ruta", resultado["por_ruta"]), ("Por estado del diálogo", resultado["por_estado"])):
+        print(f"\n{titulo}:")
+        for nombre, r in grupos.items():
+            print(f"  {nombre:<32} {r['peticiones']:6d} pet | p50 {r['p50_ms']:7.1f} ms | p95 {r['p95_ms']:7.1f} ms | "
+                  f"p99 {r['p99_ms']:7.1f} ms | errores {r['errores']}")
+    print("\nPor recorrido:")
+    for nombre, r in resultado["por_recorrido"].items():
+        print(f"  {nombre:<32} {r['recorridos']:6d} | p50 {r['p50_ms']:7.1f} ms | p95 {r['p95_ms']:7.1f} ms | "
+              f"desvíos del guion {r['desvios']}")
+
+
+if __name__ == "__main__":
+    main()
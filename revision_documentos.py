@@ -0,0 +1,226 @@
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from almacenamiento_documentos import detectar_tipo_real, leer_cabecera, existe_documento
+from normalizacion_imagenes import cargar_pillow, dimensiones_imagen, SOPORTA_HEIC
+from bitacora import obtener_bitacora
+from eventos_sesion import publicar_evento
+
+TIPOS_PERMITIDOS = {"jpeg", "png", "gif", "bmp", "webp", "heic", "pdf"}
+
+bitacora = obtener_bitacora("revision")
+
+
+def validar_documento(documento: Dict[str, Any], cursor: sqlite3.Cursor) -> Optional[str]:
+    """Valida un documento reservado; retorna el motivo de rechazo o None si es válido"""
+    ruta = documento["ruta_archivo"]
+    if not ruta or not existe_documento(ruta):
+        return "Archivo no encontrado"
+
+    # Tipo real por los primeros bytes: el nombre y la extensión los elige el usuario
+    tipo_real = detectar_tipo_real(leer_cabecera(ruta))
+    if tipo_real not in TIPOS_PERMITIDOS:
+        return "El contenido no es una imagen ni un PDF"
+
+    tamano = documento["tamano"]
+    if tamano is None:
+        tamano = os.path.getsize(ruta)
+    if tamano < Config.REVISION_TAMANO_MIN:
+        return "Archivo demasiado pequeño para ser legible"
+    if tamano > Config.MAX_FILE_SIZE:
+        return f"Archivo demasiado grande. Máximo {Config.MAX_FILE_SIZE / (1024*1024)}MB"
+
+    if tipo_real != "pdf" and (tipo_real != "heic" or SOPORTA_HEIC):
+        Image, _ = cargar_pillow()
+        try:
+            ancho, alto = dimensiones_imagen(ruta)
+        except (OSError, Image.DecompressionBombError):
+            return "La imagen está dañada o no se puede abrir"
+        if min(ancho, alto) < Config.REVISION_LADO_MIN:
+            return f"Imagen de muy baja resolución ({ancho}x{alto})"
+        if ancho * alto > Config.REVISION_MAX_PIXELES:
+            return f"Imagen demasiado grande ({ancho}x{alto})"
+
+    # Duplicado: el mismo contenido ya se subió antes en la sesión y no fue rechazado
+    if documento["blob_sha256"]:
+        cursor.execute('''
+            SELECT COUNT(*) FROM documentos
+            WHERE sesion_id = ? AND blob_sha256 = ? AND rowid < ? AND estado != 'rechazado'
+        ''', (documento["sesion_id"], documento["blob_sha256"], documento["rowid"]))
+        if cursor.fetchone()[0] > 0:
+            return "Documento duplicado: ya se envió el mismo archivo"
+
+    return None
+
+
+def resumen_matricula(por_estado: Dict[str, int]) -> Dict[str, Any]:
+    """Estado de la matrícula según los documentos de la sesión"""
+    pendientes = por_estado.get("pendiente", 0)
+    rechazados = por_estado.get("rechazado", 0)
+    if pendientes:
+        estado = "en_revision"
+    elif rechazados:
+        estado = "documentos_observados"
+    else:
+        estado = "documentos_validados"
+    return {"estado": estado, "pendientes": pendientes, "validados": por_estado.get("validado", 0),
+            "rechazados": rechazados}
+
+
+class RevisorDocumentos:
+    """Pool de revisores que validan en segundo plano los documentos pendientes.
+
+    Cada revisor reserva un lote de documentos con un lease; si el proceso muere, el lease vence
+    y otro revisor (de este u otro proceso) vuelve a tomar los documentos.
+    """
+
+    def __init__(self, db_path: str = None, hilos: int = None, lote: int = None):
+        self.db_path = db_path or Config.get_database_path()
+        self.hilos = hilos or Config.REVISION_HILOS
+        self.lote = lote or Config.REVISION_LOTE
+        self.trabajadores: List[threading.Thread] = []
+        self.lock = threading.Lock()
+        self.aviso = threading.Event()
+
+    def iniciar(self):
+        """Inicia los hilos revisores (una sola vez, en el proceso que los usa)"""
+        with self.lock:
+            if self.trabajadores:
+                return
+            for indice in range(self.hilos):
+                hilo = threading.Thread(target=self.trabajar, name=f"revision-documentos-{indice}", daemon=True)
+                hilo.start()
+                self.trabajadores.append(hilo)
+
+    def avisar(self):
+        """Despierta a los revisores porque hay documentos nuevos"""
+        self.iniciar()
+        self.aviso.set()
+
+    def trabajar(self):
+        """Bucle de un hilo revisor"""
+        revisor = f"{os.getpid()}-{threading.current_thread().name}"
+        while True:
+            try:
+                revisados = self.revisar_lote(revisor)
+            except Exception as e:
+                bitacora.exception("error_revision", f"❌ Error revisando documentos: {e}", revisor=revisor)
+                revisados = 0
+            if revisados == 0:
+                self.aviso.wait(Config.REVISION_INTERVALO_SEGUNDOS)
+                self.aviso.clear()
+
+    def reservar_lote(self, revisor: str) -> List[Dict[str, Any]]:
+        """Reserva documentos pendientes sin lease vigente, en una transacción"""
+        ahora = datetime.now()
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                SELECT d.rowid, d.id, d.sesion_id, d.ruta_archivo, d.blob_sha256, d.intentos, b.tamano
+                FROM documentos d
+                LEFT JOIN blobs b ON b.sha256 = d.blob_sha256
+                WHERE d.estado = 'pendiente' AND (d.lease_hasta IS NULL OR d.lease_hasta < ?)
+                ORDER BY d.fecha_subida
+                LIMIT ?
+            ''', (ahora, self.lote))
+            columnas = ["rowid", "id", "sesion_id", "ruta_archivo", "blob_sha256", "intentos", "tamano"]
+            documentos = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+            cursor.executemany('''
+                UPDATE documentos SET revisor = ?, lease_hasta = ?, intentos = COALESCE(intentos, 0) + 1
+                WHERE id = ?
+            ''', [(revisor, ahora + timedelta(seconds=Config.REVISION_LEASE_SEGUNDOS), documento["id"])
+                  for documento in documentos])
+            conn.commit()
+        finally:
+            conn.close()
+
+        return documentos
+
+    def revisar_lote(self, revisor: str = None) -> int:
+        """Reserva, valida y actualiza un lote de documentos; retorna cuántos se revisaron"""
+        revisor = revisor or f"{os.getpid()}-{uuid.uuid4()}"
+        documentos = self.reservar_lote(revisor)
+        if not documentos:
+            return 0
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        resultados: List[Tuple[str, Optional[str]]] = []
+        for documento in documentos:
+            try:
+                motivo = validar_documento(documento, cursor)
+            except Exception as e:
+                # Se reintenta cuando venza el lease, salvo que ya se agotaron los intentos
+                if (documento["intentos"] or 0) + 1 < Config.REVISION_MAX_INTENTOS:
+                    bitacora.warning("error_validacion", f"⚠️ Error validando documento {documento['id']}: {e}",
+                                     documento_id=documento["id"], intentos=(documento["intentos"] or 0) + 1)
+                    continue
+                motivo = f"No se pudo validar el documento: {e}"
+            resultados.append((documento["id"], motivo))
+
+        # Solo se actualizan los documentos cuyo lease sigue siendo de este revisor
+        fecha_revision = datetime.now()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany('''
+                UPDATE documentos
+                SET estado = ?, motivo_rechazo = ?, fecha_revision = ?, revisor = NULL, lease_hasta = NULL
+                WHERE id = ? AND revisor = ? AND estado = 'pendiente'
+            ''', [("rechazado" if motivo else "validado", motivo, fecha_revision, doc_id, revisor)
+                  for doc_id, motivo in resultados])
+            conn.commit()
+            self.publicar_resultados(cursor, documentos, resultados)
+        finally:
+            conn.close()
+
+        return len(documentos)
+
+    def publicar_resultados(self, cursor: sqlite3.Cursor, documentos: List[Dict[str, Any]],
+                            resultados: List[Tuple[str, Optional[str]]]):
+        """Avisa a los clientes suscritos el resultado de cada documento y el estado de la matrícula"""
+        sesiones = {documento["id"]: documento["sesion_id"] for documento in documentos}
+        for doc_id, motivo in resultados:
+            publicar_evento(sesiones[doc_id], "documento", id=doc_id,
+                            estado="rechazado" if motivo else "validado", motivo_rechazo=motivo)
+
+        afectadas = sorted({sesiones[doc_id] for doc_id, _ in resultados if sesiones[doc_id]})
+        if not afectadas:
+            return
+        cursor.execute(f'''
+            SELECT sesion_id, estado, COUNT(*) FROM documentos
+            WHERE sesion_id IN ({",".join("?" * len(afectadas))})
+            GROUP BY sesion_id, estado
+        ''', afectadas)
+        conteos: Dict[str, Dict[str, int]] = {}
+        for sesion_id, estado, total in cursor.fetchall():
+            conteos.setdefault(sesion_id, {})[estado] = total
+        for sesion_id, por_estado in conteos.items():
+            publicar_evento(sesion_id, "matricula", **resumen_matricula(por_estado))
+
+    def revisar_pendientes(self) -> int:
+        """Revisa en el hilo actual todos los documentos pendientes disponibles"""
+        revisor = f"{os.getpid()}-{uuid.uuid4()}"
+        total = 0
+        while True:
+            revisados = self.revisar_lote(revisor)
+            if revisados == 0:
+                return total
+            total += revisados
+
+
+# Instancia global del revisor; los hilos se inician con el primer documento registrado
+revisor_documentos = RevisorDocumentos()
+
+
+if __name__ == "__main__":
+    total = revisor_documentos.revisar_pendientes()
+    print(f"✅ Documentos revisados: {total}")
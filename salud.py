@@ -0,0 +1,167 @@
+"""
+Sondas de salud del proceso.
+
+/health (vida) solo confirma que el proceso atiende: no abre la base de datos ni toca el disco.
+/health/listo (disponibilidad) reporta las comprobaciones profundas: base de datos escribible y con el
+esquema al día, padrón cargado, carpeta de documentos escribible con espacio libre, almacén de sesiones
+accesible y profundidad de las colas. Su resultado se guarda por SALUD_TTL_SEGUNDOS; cuando vence se
+responde con el último resultado y un hilo de fondo lo renueva, así las sondas frecuentes de Render y del
+monitor no compiten con las familias.
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+from padron_alumnos import padron_alumnos
+from normalizacion_imagenes import normalizador_imagenes
+from eventos_sesion import canal_eventos
+from migraciones import MIGRACIONES
+from chatbot_inteligente import chatbot
+from bitacora import obtener_bitacora, registros_en_cola
+
+bitacora = obtener_bitacora("salud")
+
+
+def comprobar_base_datos() -> Dict[str, Any]:
+    """Toma el lock de escritura sin escribir y revisa que no haya migraciones pendientes"""
+    conn = sqlite3.connect(Config.get_database_path(), timeout=Config.SALUD_TIMEOUT_DB_SEGUNDOS)
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT version FROM schema_version')
+        aplicadas = {fila[0] for fila in cursor.fetchall()}
+        cursor.execute("SELECT COUNT(*) FROM documentos WHERE estado = 'pendiente'")
+        documentos_pendientes = cursor.fetchone()[0]
+        conn.rollback()
+    finally:
+        conn.close()
+
+    pendientes = sorted(m["version"] for m in MIGRACIONES if m["version"] not in aplicadas)
+    return {
+        "ok": not pendientes,
+        "version_esquema": max(aplicadas, default=0),
+        "migraciones_pendientes": pendientes,
+        "documentos_pendientes": documentos_pendientes,
+    }
+
+
+def comprobar_padron() -> Dict[str, Any]:
+    # Con arranque rápido el padrón termina de cargarse en segundo plano
+    return {"ok": padron_alumnos.cargado, "registros": len(padron_alumnos), "version": padron_alumnos.version}
+
+
+def comprobar_almacenamiento() -> Dict[str, Any]:
+    """Escribe y borra un archivo en la carpeta de documentos y mide el espacio libre"""
+    carpeta = Config.get_upload_folder()
+    os.makedirs(carpeta, exist_ok=True)
+    descriptor, ruta = tempfile.mkstemp(prefix=".salud-", dir=carpeta)
+    try:
+        os.write(descriptor, b"ok")
+    finally:
+        os.close(descriptor)
+        os.remove(ruta)
+
+    libre_mb = shutil.disk_usage(carpeta).free / (1024 * 1024)
+    return {"ok": libre_mb >= Config.SALUD_ESPACIO_LIBRE_MIN_MB, "libre_mb": round(libre_mb, 1)}
+
+
+def comprobar_colas() -> Dict[str, Any]:
+    """Profundidad de las colas en memoria; informativa, no quita la disponibilidad"""
+    return {
+        "ok": True,
+        "normalizacion": normalizador_imagenes.cola.qsize(),
+        "normalizacion_max": normalizador_imagenes.cola.maxsize,
+        "normalizacion_descartadas": normalizador_imagenes.descartadas,
+        "logs": registros_en_cola(),
+        "logs_max": Config.LOG_COLA_MAX,
+        "conexiones_eventos": canal_eventos.conexiones(),
+    }
+
+
+def comprobar_almacen_sesiones() -> Dict[str, Any]:
+    """Con SESION_BACKEND=redis, que el servidor clave-valor responda"""
+    return chatbot.almacen.comprobar()
+
+
+COMPROBACIONES: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "base_datos": comprobar_base_datos,
+    "padron": comprobar_padron,
+    "almacenamiento": comprobar_almacenamiento,
+    "almacen_sesiones": comprobar_almacen_sesiones,
+    "colas": comprobar_colas,
+}
+
+
+class SondasSalud:
+    """Resultado en caché de las comprobaciones profundas, renovado en segundo plano al vencer"""
+
+    def __init__(self, comprobaciones: Dict[str, Callable[[], Dict[str, Any]]] = None, ttl: float = None):
+        self.comprobaciones = comprobaciones or COMPROBACIONES
+        self.ttl = ttl if ttl is not None else Config.SALUD_TTL_SEGUNDOS
+        self.resultado: Optional[Dict[str, Any]] = None
+        self.medido = 0.0
+        self.renovando = False
+        self.lock = threading.Lock()
+
+    def ejecutar(self) -> Dict[str, Any]:
+        """Corre todas las comprobaciones; una que falla con excepción cuenta como no disponible"""
+        detalle = {}
+        for nombre, comprobar in self.comprobaciones.items():
+            inicio = time.perf_counter()
+            try:
+                detalle[nombre] = comprobar()
+            except Exception as e:
+                detalle[nombre] = {"ok": False, "error": str(e)}
+            detalle[nombre]["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+
+        listo = all(c["ok"] for c in detalle.values())
+        if not listo:
+            bitacora.warning("no_listo", "⚠️ Comprobaciones de salud con fallas",
+                             fallas=[nombre for nombre, c in detalle.items() if not c["ok"]])
+        return {"listo": listo, "comprobaciones": detalle, "fecha": datetime.now().isoformat()}
+
+    def renovar(self) -> Dict[str, Any]:
+        try:
+            resultado = self.ejecutar()
+            with self.lock:
+                self.resultado = resultado
+                self.medido = time.monotonic()
+            return resultado
+        finally:
+            self.renovando = False
+
+    def estado(self) -> Dict[str, Any]:
+        """Último resultado; si venció se renueva en un hilo de fondo y se responde sin esperar"""
+        with self.lock:
+            resultado = self.resultado
+            edad = time.monotonic() - self.medido
+            renovar = resultado is not None and edad >= self.ttl and not self.renovando
+            if renovar:
+                self.renovando = True
+
+        if resultado is None:
+            # Primera sonda del proceso: no hay nada que devolver mientras tanto
+            resultado = self.renovar()
+            edad = 0.0
+        elif renovar:
+            threading.Thread(target=self.renovar, name="sondas-salud", daemon=True).start()
+        return dict(resultado, edad_segundos=round(edad, 1))
+
+    def reiniciar_tras_fork(self):
+        # El hilo que renovaba no existe en el hijo
+        self.lock = threading.Lock()
+        self.renovando = False
+
+
+# Instancia global de las sondas; el hilo de renovación se inicia con la primera sonda vencida
+sondas_salud = SondasSalud()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=sondas_salud.reiniciar_tras_fork)
@@ -0,0 +1,329 @@
+"""
+Servidor clave-valor local compatible con el protocolo de Redis (RESP2), para probar AlmacenRedis sin
+instalar Redis: python servidor_kv_local.py 6390 y SESION_KV_URL=redis://127.0.0.1:6390/0.
+
+Implementa solo los comandos que usa almacen_sesiones.py, con los datos en memoria. Los comandos se
+ejecutan de a uno bajo un lock global, como en Redis; WATCH/MULTI/EXEC se resuelven con un contador de
+modificaciones por clave. No es para producción: no persiste nada ni limita la memoria.
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class ErrorComando(Exception):
+    """Error que se responde al cliente como -ERR"""
+
+
+def puntaje(valor: str) -> tuple:
+    """Límite de ZCOUNT/ZREMRANGEBYSCORE: (valor, exclusivo)"""
+    if valor.startswith("("):
+        return float(valor[1:]), True
+    return float(valor), False
+
+
+def en_rango(score: float, minimo: tuple, maximo: tuple) -> bool:
+    return ((score > minimo[0]) if minimo[1] else (score >= minimo[0])) and \
+           ((score < maximo[0]) if maximo[1] else (score <= maximo[0]))
+
+
+class DatosKV:
+    """Claves en memoria con vencimiento perezoso y contador de modificaciones para WATCH"""
+
+    def __init__(self):
+        self.valores: Dict[str, Any] = {}
+        self.vencimientos: Dict[str, float] = {}
+        self.modificaciones: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def modificar(self, clave: str):
+        self.modificaciones[clave] = self.modificaciones.get(clave, 0) + 1
+
+    def obtener(self, clave: str, tipo: type, crear: bool = False):
+        vence = self.vencimientos.get(clave)
+        if vence is not None and vence <= time.time():
+            self.borrar(clave)
+        valor = self.valores.get(clave)
+        if valor is None:
+            if not crear:
+                return None
+            valor = self.valores[clave] = tipo()
+        if not isinstance(valor, tipo):
+            raise ErrorComando("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return valor
+
+    def borrar(self, clave: str) -> int:
+        self.vencimientos.pop(clave, None)
+        if self.valores.pop(clave, None) is None:
+            return 0
+        self.modificar(clave)
+        return 1
+
+    def version(self, clave: str) -> int:
+        # Una clave vencida cuenta como modificada
+        self.obtener(clave, object)
+        return self.modificaciones.get(clave, 0)
+
+    def ejecutar(self, comando: str, args: List[str]) -> Any:
+        metodo = getattr(self, f"cmd_{comando.lower()}", None)
+        if metodo is None:
+            raise ErrorComando(f"unknown command '{comando}'")
+        try:
+            return metodo(*args)
+        except TypeError:
+            raise ErrorComando(f"wrong number of arguments for '{comando.lower()}' command")
+
+    # Cadenas y contadores
+    def cmd_get(self, clave):
+        return self.obtener(clave, str)
+
+    def cmd_set(self, clave, valor):
+        self.borrar(clave)
+        self.valores[clave] = valor
+        self.modificar(clave)
+        return "OK"
+
+    def cmd_incrby(self, clave, incremento):
+        valor = int(self.obtener(clave, str) or 0) + int(incremento)
+        self.valores[clave] = str(valor)
+        self.modificar(clave)
+        return valor
+
+    def cmd_incr(self, clave):
+        return self.cmd_incrby(clave, 1)
+
+    def cmd_decr(self, clave):
+        return self.cmd_incrby(clave, -1)
+
+    def cmd_decrby(self, clave, decremento):
+        return self.cmd_incrby(clave, -int(decremento))
+
+    # Claves
+    def cmd_del(self, *claves):
+        return sum(self.borrar(clave) for clave in claves)
+
+    def cmd_expire(self, clave, segundos):
+        if self.obtener(clave, object) is None:
+            return 0
+        self.vencimientos[clave] = time.time() + int(segundos)
+        self.modificar(clave)
+        return 1
+
+    def cmd_flushall(self):
+        for clave in list(self.valores):
+            self.borrar(clave)
+        return "OK"
+
+    # Hashes
+    def cmd_hset(self, clave, *pares):
+        if not pares or len(pares) % 2:
+            raise TypeError
+        datos = self.obtener(clave, dict, crear=True)
+        nuevos = sum(1 for campo in pares[::2] if campo not in datos)
+        datos.update(zip(pares[::2], pares[1::2]))
+        self.modificar(clave)
+        return nuevos
+
+    def cmd_hget(self, clave, campo):
+        return (self.obtener(clave, dict) or {}).get(campo)
+
+    def cmd_hmget(self, clave, *campos):
+        datos = self.obtener(clave, dict) or {}
+        return [datos.get(campo) for campo in campos]
+
+    def cmd_hgetall(self, clave):
+        datos = self.obtener(clave, dict) or {}
+        return [elemento for par in datos.items() for elemento in par]
+
+    # Listas
+    def cmd_rpush(self, clave, *valores):
+        lista = self.obtener(clave, list, crear=True)
+        lista.extend(valores)
+        self.modificar(clave)
+        return len(lista)
+
+    def cmd_llen(self, clave):
+        return len(self.obtener(clave, list) or [])
+
+    def cmd_lrange(self, clave, inicio, fin):
+        lista = self.obtener(clave, list) or []
+        inicio, fin = int(inicio), int(fin)
+        inicio = max(len(lista) + inicio, 0) if inicio < 0 else inicio
+        fin = len(lista) + fin if fin < 0 else fin
+        return lista[inicio:fin + 1]
+
+    # Conjuntos ordenados
+    def cmd_zadd(self, clave, *pares):
+        if not pares or len(pares) % 2:
+            raise TypeError
+        conjunto = self.obtener(clave, dict, crear=True)
+        nuevos = 0
+        for score, miembro in zip(pares[::2], pares[1::2]):
+            nuevos += miembro not in conjunto
+            conjunto[miembro] = float(score)
+        self.modificar(clave)
+        return nuevos
+
+    def cmd_zrem(self, clave, *miembros):
+        conjunto = self.obtener(clave, dict) or {}
+        quitados = sum(1 for miembro in miembros if conjunto.pop(miembro, None) is not None)
+        if quitados:
+            self.modificar(clave)
+        return quitados
+
+    def cmd_zcount(self, clave, minimo, maximo):
+        minimo, maximo = puntaje(minimo), puntaje(maximo)
+        return sum(1 for score in (self.obtener(clave, dict) or {}).values() if en_rango(score, minimo, maximo))
+
+    def cmd_zremrangebyscore(self, clave, minimo, maximo):
+        minimo, maximo = puntaje(minimo), puntaje(maximo)
+        conjunto = self.obtener(clave, dict) or {}
+        quitar = [miembro for miembro, score in conjunto.items() if en_rango(score, minimo, maximo)]
+        for miembro in quitar:
+            del conjunto[miembro]
+        if quitar:
+            self.modificar(clave)
+        return len(quitar)
+
+
+class ManejadorKV(socketserver.StreamRequestHandler):
+    """Una conexión de cliente: lee comandos RESP y mantiene su propio estado de WATCH y MULTI"""
+
+    def setup(self):
+        super().setup()
+        self.vigiladas: Dict[str, int] = {}
+        self.transaccion: Optional[List[List[str]]] = None
+
+    def leer_comando(self) -> Optional[List[str]]:
+        linea = self.rfile.readline()
+        if not linea:
+            return None
+        if not linea.startswith(b"*"):
+            # Comando en línea (redis-cli, telnet)
+            return linea.decode().split()
+        argumentos = []
+        for _ in range(int(linea[1:])):
+            longitud = int(self.rfile.readline()[1:])
+            argumentos.append(self.rfile.read(longitud + 2)[:-2].decode())
+        return argumentos
+
+    def codificar(self, valor: Any) -> bytes:
+        if isinstance(valor, ErrorComando):
+            return f"-ERR {valor}\r\n".encode()
+        if valor is None:
+            return b"$-1\r\n"
+        if isinstance(valor, bool):
+            valor = int(valor)
+        if isinstance(valor, int):
+            return f":{valor}\r\n".encode()
+        if isinstance(valor, list):
+            return f"*{len(valor)}\r\n".encode() + b"".join(self.codificar(v) for v in valor)
+        if valor in ("OK", "QUEUED", "PONG"):
+            return f"+{valor}\r\n".encode()
+        datos = str(valor).encode()
+        return b"$%d\r\n%s\r\n" % (len(datos), datos)
+
+    def atender(self, argumentos: List[str]) -> bytes:
+        datos: DatosKV = self.server.datos
+        comando, args = argumentos[0].upper(), argumentos[1:]
+
+        if comando == "MULTI":
+            self.transaccion = []
+            return self.codificar("OK")
+        if comando == "DISCARD":
+            self.transaccion, self.vigiladas = None, {}
+            return self.codificar("OK")
+        if comando == "EXEC":
+            if self.transaccion is None:
+                return self.codificar(ErrorComando("EXEC without MULTI"))
+            cola, self.transaccion = self.transaccion, None
+            with datos.lock:
+                conflicto = any(datos.version(clave) != version for clave, version in self.vigiladas.items())
+                self.vigiladas = {}
+                if conflicto:
+                    # Una clave vigilada cambió: la transacción no se aplica
+                    return b"*-1\r\n"
+                resultados = []
+                for c in cola:
+                    try:
+                        resultados.append(datos.ejecutar(c[0], c[1:]))
+                    except ErrorComando as e:
+                        resultados.append(e)
+            return self.codificar(resultados)
+        if self.transaccion is not None:
+            self.transaccion.append(argumentos)
+            return self.codificar("QUEUED")
+
+        if comando == "WATCH":
+            with datos.lock:
+                for clave in args:
+                    self.vigiladas.setdefault(clave, datos.version(clave))
+            return self.codificar("OK")
+        if comando == "UNWATCH":
+            self.vigiladas = {}
+            return self.codificar("OK")
+        if comando == "PING":
+            return self.codificar(args[0] if args else "PONG")
+        if comando in ("CLIENT", "SELECT"):
+            # Nombre de la biblioteca del cliente y base 0: no cambian nada
+            return self.codificar("OK")
+
+        try:
+            with datos.lock:
+                return self.codificar(datos.ejecutar(comando, args))
+        except ErrorComando as e:
+            return self.codificar(e)
+
+    def handle(self):
+        while True:
+            try:
+                argumentos = self.leer_comando()
+            except (ConnectionError, ValueError):
+                return
+            if argumentos is None:
+                return
+            if argumentos:
+                self.wfile.write(self.atender(argumentos))
+
+
+class ServidorKVLocal(socketserver.ThreadingTCPServer):
+    """Servidor en un hilo de fondo; con puerto 0 el sistema elige uno libre"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", puerto: int = 0):
+        super().__init__((host, puerto), ManejadorKV)
+        self.datos = DatosKV()
+        self.hilo: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, puerto = self.server_address[:2]
+        return f"redis://{host}:{puerto}/0"
+
+    def iniciar(self) -> "ServidorKVLocal":
+        self.hilo = threading.Thread(target=self.serve_forever, name="servidor-kv-local", daemon=True)
+        self.hilo.start()
+        return self
+
+    def detener(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor clave-valor local compatible con Redis, para pruebas")
+    parser.add_argument("puerto", type=int, nargs="?", default=6390)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    servidor = ServidorKVLocal(args.host, args.puerto)
+    print(f"🧪 Servidor clave-valor de prueba en {servidor.url}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.server_close()
@@ -1,4 +1,6 @@
 from api_inteligente import app
+from revision_documentos import revisor_documentos
 
 if __name__ == "__main__":
+    revisor_documentos.iniciar()
     app.run() 
\ No newline at end of file